@@ -0,0 +1,41 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Benchmarks for NEMO (run with asv).
+
+NEMO reads its configuration when it is first imported, so the
+benchmark configuration must be in place before anything imports
+nemo. The trace paths in benchmarks/nemo.cfg are
+relative to the top of the tree; they are made absolute in a temporary
+copy so that the benchmarks do not depend on the working directory
+that asv uses.
+"""
+
+import atexit
+import configparser
+import os
+import tempfile
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _write_config():
+    """Write the benchmark configuration with absolute trace paths."""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(TOPDIR, 'benchmarks', 'nemo.cfg'))
+    for section in ['generation', 'demand']:
+        for option, value in config.items(section):
+            config.set(section, option, os.path.join(TOPDIR, value))
+    with tempfile.NamedTemporaryFile('w', suffix='.cfg', delete=False,
+                                     encoding='utf-8') as cfgfile:
+        config.write(cfgfile)
+    atexit.register(os.unlink, cfgfile.name)
+    return cfgfile.name
+
+
+os.environ['NEMORC'] = _write_config()
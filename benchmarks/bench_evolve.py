@@ -0,0 +1,83 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""Benchmarks for the optimiser (the evolve script)."""
+
+import os
+import sys
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+
+import numpy as np
+from deap import algorithms, base, cma, tools
+
+from benchmarks import TOPDIR
+
+import nemo  # pylint: disable=wrong-import-order
+
+
+def load_evolve(scenario):
+    """Load the evolve script as a module and initialise it."""
+    filename = os.path.join(TOPDIR, 'evolve')
+    loader = SourceFileLoader('evolve', filename)
+    spec = spec_from_loader('evolve', loader)
+    evolve = module_from_spec(spec)
+    loader.exec_module(evolve)
+    saved, sys.argv = sys.argv, ['evolve', '--ignore-gooey',
+                                 '-s', scenario, '--reserves', '1000']
+    try:
+        args = evolve.process_options()
+    finally:
+        sys.argv = saved
+    evolve.init_worker(args)
+    return evolve
+
+
+class Cost:
+    """Time the evolve objective function."""
+
+    params = ['ccgt', 're100']
+    param_names = ['scenario']
+    timeout = 300
+
+    def setup(self, scenario):
+        """Load evolve and run a simulation."""
+        self.evolve = load_evolve(scenario)
+        nemo.run(self.evolve.context)
+
+    def time_cost(self, _):
+        """Time evolve.cost()."""
+        self.evolve.cost(self.evolve.context)
+
+
+class Optimiser:
+    """Time a short CMA-ES run with a fixed seed."""
+
+    timeout = 600
+    number = 1
+    repeat = 1
+
+    def setup(self):
+        """Load evolve."""
+        self.evolve = load_evolve('ccgt')
+
+    def time_cmaes(self):
+        """Time two generations of CMA-ES with lambda=4."""
+        np.random.seed(1)
+        numparams = sum(len(gen.setters)
+                        for gen in self.evolve.context.generators)
+        strategy = cma.Strategy(centroid=[0] * numparams, sigma=2.0,
+                                lambda_=4)
+        toolbox = base.Toolbox()
+        toolbox.register("generate", strategy.generate,
+                         self.evolve.creator.Individual)
+        toolbox.register("update", strategy.update)
+        toolbox.register("evaluate", self.evolve.eval_func)
+        toolbox.register("map", map)
+        algorithms.eaGenerateUpdate(toolbox, ngen=2,
+                                    halloffame=tools.HallOfFame(1),
+                                    verbose=False)
@@ -0,0 +1,137 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""Benchmarks for the simulation core."""
+
+import os
+
+import numpy as np
+
+from benchmarks import TOPDIR
+
+# pylint: disable=wrong-import-order
+import nemo
+from nemo import generators, nem, network, penalties, polygons, scenarios
+
+SCENARIOS = ['ccgt', 're100', 're100SWHB_2']
+
+# Transmission networks to simulate over. With links of 2000 MW,
+# many links fill up (and have spare capacity again) every hour.
+NETWORKS = {
+    'existing': lambda: network.Network(polygons.existing_net),
+    'unlimited': lambda: network.Network.uniform(1e9),
+    'limited': lambda: network.Network.uniform(2000),
+}
+
+
+def make_context(scenario, seed=0):
+    """Return a context for scenario with repeatable capacities."""
+    ctx = nemo.Context()
+    scenarios.supply_scenarios[scenario](ctx)
+    numparams = sum(len(gen.setters) for gen in ctx.generators)
+    rng = np.random.default_rng(seed)
+    ctx.set_capacities(rng.uniform(0, 5, numparams))
+    return ctx
+
+
+class Simulation:
+    """Time a simulation run of each scenario."""
+
+    params = SCENARIOS
+    param_names = ['scenario']
+    timeout = 300
+
+    def setup(self, scenario):
+        """Set up the context."""
+        self.context = make_context(scenario)
+
+    def time_run(self, _):
+        """Time nemo.run()."""
+        nemo.run(self.context)
+
+    def peakmem_run(self, _):
+        """Measure the peak memory use of nemo.run()."""
+        nemo.run(self.context)
+
+
+class NetworkSimulation:
+    """Time a simulation run of re100 over each network."""
+
+    params = list(NETWORKS)
+    param_names = ['network']
+    timeout = 300
+
+    def setup(self, name):
+        """Set up the context and network."""
+        self.context = make_context('re100')
+        self.context.network = NETWORKS[name]()
+
+    def time_run(self, _):
+        """Time nemo.run()."""
+        nemo.run(self.context)
+
+
+class Penalties:
+    """Time the penalty functions on a completed run."""
+
+    params = SCENARIOS
+    param_names = ['scenario']
+    timeout = 300
+
+    class Args:  # pylint: disable=too-few-public-methods
+        """Stand-in for the evolve command line options."""
+
+        reserves = 1000
+        emissions_limit = 0
+        fossil_limit = 0.1
+        bioenergy_limit = 20
+        hydro_limit = 12
+
+    def setup(self, scenario):
+        """Run the simulation."""
+        self.context = make_context(scenario)
+        nemo.run(self.context)
+
+    def time_reserves(self, _):
+        """Time penalties.reserves()."""
+        penalties.reserves(self.context, self.Args)
+
+    def time_unserved(self, _):
+        """Time penalties.unserved()."""
+        penalties.unserved(self.context, self.Args)
+
+    def time_min_regional(self, _):
+        """Time penalties.min_regional()."""
+        self.context.min_regional_generation = 0.5
+        penalties.min_regional(self.context, self.Args)
+
+
+class TraceLoading:
+    """Time loading of the local trace and demand files."""
+
+    timeout = 120
+
+    def setup(self):
+        """Find the trace file."""
+        self.filename = os.path.join(TOPDIR, 'data', '1year',
+                                     '2020Wind.csv')
+
+    def time_csv_trace(self):
+        """Time CSVTraceGenerator loading a trace."""
+        # defeat the per-class cache
+        generators.Wind.csvfilename = None
+        generators.Wind(1, 0, self.filename, 0)
+
+    def peakmem_csv_trace(self):
+        """Measure the peak memory use of loading a trace."""
+        generators.Wind.csvfilename = None
+        generators.Wind(1, 0, self.filename, 0)
+
+    def time_demand(self):
+        """Time loading the demand trace."""
+        nem.clear_cache()
+        nem.load_demand()
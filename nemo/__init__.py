@@ -7,9 +7,9 @@
 
 """The National Electricity Market Optimiser (NEMO)."""
 
-import nemo.nem  # noqa: F401
 from nemo.context import Context
+from nemo.nem import load_demand
 from nemo.sim import run
 from nemo.utils import plot
 
-__all__ = ['Context', 'run', 'plot']
+__all__ = ['Context', 'load_demand', 'run', 'plot']
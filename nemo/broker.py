@@ -0,0 +1,291 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+A simple task broker for farming out evaluations to remote workers.
+
+The broker listens on a TCP port and hands out tasks to any number of
+worker processes that connect to it. Workers may run on the same host
+(useful for testing) or on other machines. Messages are pickled tuples
+exchanged over multiprocessing.connection, so the broker and all of
+the workers must share an authentication key.
+
+Workers send regular heartbeats while they are connected. A worker
+that disconnects, or that has not been heard from within the timeout
+period, is dropped and its outstanding tasks are dispatched again to
+the remaining workers. Workers may be started before the broker; they
+keep trying to connect for a while before giving up. Each worker is
+initialised just once when it connects, so any expensive state (eg, a
+simulation context and its traces) is kept warm between calls to
+map().
+"""
+
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import (AuthenticationError, Client,
+                                        Listener, wait)
+
+# Default interval between worker heartbeats (in seconds).
+HEARTBEAT = 5
+
+# Default time after which a silent worker is presumed lost (in seconds).
+TIMEOUT = 30
+
+# Default time a worker keeps trying to reach its broker (in seconds).
+CONNECT_TIMEOUT = 60
+
+# How often the broker wakes up to check on its workers (in seconds).
+_POLL = 0.1
+
+
+def parse_address(address):
+    """
+    Parse a HOST:PORT string into a (host, port) tuple.
+
+    >>> parse_address('localhost:9000')
+    ('localhost', 9000)
+    >>> parse_address(':9000')
+    ('', 9000)
+    """
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+
+class _WorkerHandle():
+    """The broker's record of a connected worker."""
+
+    def __init__(self, conn):
+        """Construct a worker handle for a connection."""
+        self.conn = conn
+        self.tasks = set()
+        self.last_seen = time.monotonic()
+
+
+class Broker():
+    """Dispatch tasks to workers connected over TCP."""
+
+    def __init__(self, address, authkey, initargs=(), timeout=TIMEOUT):
+        """
+        Construct a broker listening on address.
+
+        initargs are sent to every worker when it connects and are
+        passed to the worker's initializer function. A worker that is
+        silent for more than timeout seconds is presumed lost.
+        """
+        self.initargs = initargs
+        self.timeout = timeout
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self._workers = []
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._acceptor = threading.Thread(target=self._accept, daemon=True)
+        self._acceptor.start()
+
+    def __enter__(self):
+        """Enter the runtime context."""
+        return self
+
+    def __exit__(self, *exc):
+        """Exit the runtime context."""
+        self.close()
+
+    def _accept(self):
+        """Accept new workers until the listener is closed."""
+        while True:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError:
+                return
+            try:
+                conn.send(('init', self.initargs))
+            except OSError:
+                conn.close()
+                continue
+            with self._lock:
+                self._workers.append(_WorkerHandle(conn))
+
+    def num_workers(self):
+        """Return the number of connected workers."""
+        with self._lock:
+            return len(self._workers)
+
+    def _drop(self, worker, pending):
+        """Drop a lost worker and queue its tasks for dispatch again."""
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.conn.close()
+        for epoch, index in worker.tasks:
+            if epoch == self._epoch:
+                pending.appendleft(index)
+
+    def _assign(self, func, items, pending, done):
+        """Send pending tasks to idle workers."""
+        with self._lock:
+            idle = [w for w in self._workers if not w.tasks]
+        for worker in idle:
+            while pending and done[pending[0]]:
+                pending.popleft()
+            if not pending:
+                return
+            index = pending.popleft()
+            taskid = (self._epoch, index)
+            try:
+                worker.conn.send(('task', taskid, func, items[index]))
+            except OSError:
+                pending.appendleft(index)
+                self._drop(worker, pending)
+                continue
+            worker.tasks.add(taskid)
+            worker.last_seen = time.monotonic()
+
+    def _expire(self, pending):
+        """Drop any busy worker that has not been heard from in time."""
+        now = time.monotonic()
+        with self._lock:
+            silent = [w for w in self._workers
+                      if w.tasks and now - w.last_seen > self.timeout]
+        for worker in silent:
+            self._drop(worker, pending)
+
+    def map(self, func, iterable):
+        """
+        Apply func to every item of iterable using the workers.
+
+        Like Pool.map, the results are returned in order. This method
+        blocks until every item has been evaluated, waiting for
+        workers to (re)connect if necessary.
+        """
+        self._epoch += 1
+        items = list(iterable)
+        results = [None] * len(items)
+        done = [False] * len(items)
+        pending = deque(range(len(items)))
+        remaining = len(items)
+
+        while remaining:
+            self._assign(func, items, pending, done)
+            with self._lock:
+                workers = {w.conn: w for w in self._workers}
+            if not workers:
+                time.sleep(_POLL)
+                continue
+            for conn in wait(list(workers), timeout=_POLL):
+                worker = workers[conn]
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    self._drop(worker, pending)
+                    continue
+                worker.last_seen = time.monotonic()
+                if msg[0] in ('result', 'error'):
+                    _, taskid, value = msg
+                    worker.tasks.discard(taskid)
+                    epoch, index = taskid
+                    if epoch != self._epoch or done[index]:
+                        # a stale result from a presumed lost worker
+                        continue
+                    if msg[0] == 'error':
+                        raise value
+                    results[index] = value
+                    done[index] = True
+                    remaining -= 1
+            self._expire(pending)
+        return results
+
+    def close(self):
+        """Stop all of the workers and close the listener."""
+        self._listener.close()
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            try:
+                worker.conn.send(('stop',))
+            except OSError:
+                pass
+            worker.conn.close()
+
+
+class Worker():
+    """A worker process that evaluates tasks sent by a broker."""
+
+    def __init__(self, address, authkey, initializer=None,
+                 heartbeat=HEARTBEAT, connect_timeout=CONNECT_TIMEOUT):
+        """
+        Construct a worker for the broker at address.
+
+        When the broker sends its initargs, initializer (if given) is
+        called with them before any tasks are run. If the broker is
+        not listening yet, the worker retries for up to
+        connect_timeout seconds.
+        """
+        self.address = address
+        self.authkey = authkey
+        self.initializer = initializer
+        self.heartbeat = heartbeat
+        self.connect_timeout = connect_timeout
+        self._send_lock = threading.Lock()
+
+    def _connect(self):
+        """Connect to the broker, waiting for it to start listening."""
+        deadline = time.monotonic() + self.connect_timeout
+        delay = _POLL
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except ConnectionRefusedError:
+                if time.monotonic() + delay > deadline:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, self.heartbeat)
+
+    def _send(self, conn, msg):
+        """Send a message (the heartbeat thread shares the connection)."""
+        with self._send_lock:
+            conn.send(msg)
+
+    def _beat(self, conn, stopped):
+        """Send heartbeats until stopped."""
+        while not stopped.wait(self.heartbeat):
+            try:
+                self._send(conn, ('heartbeat',))
+            except OSError:
+                return
+
+    def run(self):
+        """Run tasks until the broker stops us or goes away."""
+        conn = self._connect()
+        stopped = threading.Event()
+        beater = threading.Thread(target=self._beat, args=(conn, stopped),
+                                  daemon=True)
+        beater.start()
+        try:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    break
+                if msg[0] == 'init':
+                    if self.initializer is not None:
+                        self.initializer(*msg[1])
+                elif msg[0] == 'task':
+                    _, taskid, func, item = msg
+                    # pylint: disable=broad-exception-caught
+                    try:
+                        reply = ('result', taskid, func(item))
+                    except Exception as exc:
+                        reply = ('error', taskid, exc)
+                    self._send(conn, reply)
+                elif msg[0] == 'stop':
+                    break
+        finally:
+            stopped.set()
+            conn.close()
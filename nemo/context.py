@@ -18,34 +18,86 @@ simulation runs.
 import numpy as np
 import pandas as pd
 
-from nemo import configfile, costs, generators, polygons, regions
-from nemo.nem import hourly_demand, hourly_regional_demand, startdate
-from nemo.utils import ureg
+from nemo import (configfile, costs, generators, nem, polygons, regions,
+                  reliability, utils)
 
 
 class Context():
     """All simulation state is kept in a Context object."""
 
     # pylint: disable=too-many-instance-attributes
-    def __init__(self):
-        """Initialise a default context."""
+    def __init__(self, demand=None):
+        """
+        Initialise a default context.
+
+        demand is a nem.DemandTrace or the path of a demand trace
+        file. By default, the demand trace named in the configuration
+        file is used.
+        """
         self.verbose = False
         self.regions = regions.All
-        self.startdate = startdate
-        # Number of timesteps is determined by the number of demand rows.
-        self.hours = len(hourly_regional_demand)
+        self.set_demand(demand)
 
         self.relstd = 0.002  # 0.002% unserved energy
         self.generators = [generators.CCGT(polygons.WILDCARD, 20000),
                            generators.OCGT(polygons.WILDCARD, 20000)]
         self.storages = None
-        self.demand = hourly_demand.copy()
         self.spill = pd.DataFrame()
         self.generation = pd.DataFrame()
         self.unserved = pd.DataFrame()
         # System non-synchronous penetration limit
         self.nsp_limit = float(configfile.get('limits', 'nonsync-penetration'))
         self.costs = costs.NullCosts()
+        # Set to a profiling.Profile object to instrument runs.
+        self.profile = None
+        # Set to a directory to memory-map the result matrices there.
+        self.scratch = None
+        # Set to a network.Network or network.RegionNetwork object to
+        # respect transfer limits.
+        self.network = None
+        self.flows = pd.DataFrame()
+
+    def set_demand(self, demand):
+        """Use demand (a nem.DemandTrace or a path) for the simulation."""
+        if not isinstance(demand, nem.DemandTrace):
+            demand = nem.load_demand(demand)
+        self.demand_trace = demand
+        self.startdate = demand.startdate
+        # Number of timesteps is determined by the number of demand rows.
+        self.hours = len(demand.hourly_regional_demand)
+        self.demand = demand.hourly_demand.copy()
+
+    @property
+    def generators(self):
+        """Return the list of generators."""
+        return self._generators
+
+    @generators.setter
+    def generators(self, gens):
+        """Set the list of generators and rebuild the region lookups."""
+        self._generators = gens
+        self.index_regions()
+
+    def index_regions(self):
+        """
+        Build the region lookups for the list of generators.
+
+        generator_region holds the region number of each generator
+        and region_generators[n] holds the indexes of the generators
+        in region number n. The lookups are rebuilt whenever the list
+        is replaced and at the start of every simulation run (in case
+        the list was changed in place).
+        """
+        polys = np.fromiter((g.polygon for g in self.generators), dtype=int,
+                            count=len(self.generators))
+        self.generator_region = polygons.polygon_region[polys]
+        self.region_generators = [np.flatnonzero(self.generator_region == n)
+                                  for n in range(regions.NUMREGIONS)]
+
+    def dispatched(self):
+        """Return the indexes of the generators in the regions of interest."""
+        return np.flatnonzero(np.isin(self.generator_region,
+                                      [rgn.num for rgn in self.regions]))
 
     def years(self):
         """Return the number of years from the number of simulation hours."""
@@ -67,6 +119,10 @@ class Context():
         """Return total surplus energy."""
         return self.spill.values.sum()
 
+    def unserved_events(self):
+        """Return the unserved energy events (see reliability.Events)."""
+        return reliability.find_events(self.unserved)
+
     def unserved_percent(self):
         """Return the total unserved energy as a percentage of total demand."""
         # We can't catch ZeroDivision because numpy emits a warning
@@ -102,9 +158,9 @@ class Context():
                 else:
                     string += '\n'
         string += f'Timesteps: {self.hours} h\n'
-        total_demand = (self.total_demand() * ureg.MWh).to_compact()
+        total_demand = (self.total_demand() * utils.ureg.MWh).to_compact()
         string += f'Demand energy: {total_demand}\n'
-        surplus_energy = (self.surplus_energy() * ureg.MWh).to_compact()
+        surplus_energy = (self.surplus_energy() * utils.ureg.MWh).to_compact()
         string += f'Unstored surplus energy: {surplus_energy}\n'
         if self.surplus_energy() > 0:
             spill_series = self.spill[self.spill.sum(axis=1) > 0]
@@ -118,22 +174,15 @@ class Context():
             if self.unserved_percent() > self.relstd * 1.001:
                 string += 'WARNING: reliability standard exceeded\n'
             string += f'Unserved total hours: {len(self.unserved)}\n'
-
-            # A subtle trick: generate a date range and then subtract
-            # it from the timestamps of unserved events.  This will
-            # produce a run of time deltas (for each consecutive hour,
-            # the time delta between this timestamp and the
-            # corresponding row from the range will be
-            # constant). Group by the deltas.
-            date_range = pd.date_range(self.unserved.index[0],
-                                       periods=len(self.unserved.index),
-                                       freq='h')
-            deltas = self.unserved.groupby(self.unserved.index - date_range)
-            unserved_events = [k for k, g in deltas]
+            events = self.unserved_events()
             string += 'Number of unserved energy events: '
-            string += f'{len(unserved_events)}\n'
+            string += f'{len(events)}\n'
+            string += 'Longest unserved energy event: '
+            string += f'{events.max_duration()} h\n'
             if not self.unserved.empty:
-                umin = (self.unserved.min() * ureg.MW).to_compact()
-                umax = (self.unserved.max() * ureg.MW).to_compact()
+                umin = (self.unserved.min() * utils.ureg.MW).to_compact()
+                umax = (self.unserved.max() * utils.ureg.MW).to_compact()
                 string += f'Shortfalls (min, max): ({umin}, {umax})'
+        if self.verbose and self.profile is not None:
+            string += f'\n{self.profile}'
         return string
@@ -14,6 +14,7 @@
 # pylint: disable=too-many-lines
 
 from collections import defaultdict
+from functools import partial
 
 from nemo import generators as tech
 
@@ -24,11 +25,12 @@ class NullCosts():
     # pylint: disable=unused-argument
     def __init__(self, discount=0, coal_price=0, gas_price=0, ccs_price=0):
         """Construct an all-zero costs object."""
-        self.capcost_per_kw = defaultdict(lambda: 0)
-        self.fixed_om_costs = defaultdict(lambda: 0)
-        self.opcost_per_mwh = defaultdict(lambda: 0)
+        # int() is 0; unlike lambdas, it can be pickled
+        self.capcost_per_kw = defaultdict(int)
+        self.fixed_om_costs = defaultdict(int)
+        self.opcost_per_mwh = defaultdict(int)
         # a dictionary of dictionary of zeros
-        self.totcost_per_kwh = defaultdict(lambda: defaultdict(lambda: 0))
+        self.totcost_per_kwh = defaultdict(partial(defaultdict, int))
         self.ccs_storage_per_t = 0
         self.bioenergy_price_per_gj = 0
         self.coal_price_per_gj = 0
@@ -0,0 +1,237 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Evolutionary algorithms built on the DEAP CMA-ES strategy.
+
+These complement DEAP's eaGenerateUpdate (which drives a single
+strategy) and share its conventions: the toolbox must provide map and
+evaluate, and a logbook of statistics is returned.
+"""
+
+import copy
+from contextlib import contextmanager
+from math import log
+
+import numpy as np
+from deap import cma, tools
+
+from nemo import utils
+
+
+def make_islands(centroid, sigma, count, lambda_=None):
+    """
+    Return a list of count CMA-ES strategies.
+
+    The initial step sizes are spread geometrically between sigma/2
+    and sigma*2 so that the islands explore at different scales.
+
+    >>> islands = make_islands([0, 0], 2.0, 3, lambda_=4)
+    >>> [island.sigma for island in islands]
+    [1.0, 2.0, 4.0]
+    """
+    strategies = []
+    for i in range(count):
+        factor = 2 ** (2 * i / (count - 1) - 1) if count > 1 else 1
+        kwargs = {} if lambda_ is None else {'lambda_': lambda_}
+        strategies.append(cma.Strategy(centroid=list(centroid),
+                                       sigma=sigma * factor, **kwargs))
+    return strategies
+
+
+@contextmanager
+def _rng_state(states, index):
+    """
+    Run a block with the global NumPy RNG set to an island's state.
+
+    DEAP draws its samples from the global NumPy generator, so each
+    island's generator state is swapped in and out around each use.
+    """
+    saved = np.random.get_state()
+    np.random.set_state(states[index])
+    try:
+        yield
+    finally:
+        states[index] = np.random.get_state()
+        np.random.set_state(saved)
+
+
+def _migrate(populations, migrants):
+    """
+    Copy the best individuals of each island to the next island.
+
+    The islands form a ring. On each island, the worst individuals are
+    replaced by the best individuals from the previous island.
+    """
+    best = [[copy.deepcopy(ind) for ind in tools.selBest(pop, migrants)]
+            for pop in populations]
+    for i, pop in enumerate(populations):
+        pop.sort(key=lambda ind: ind.fitness, reverse=True)
+        pop[len(pop) - migrants:] = best[i - 1]
+
+
+def ea_islands(strategies, ind_init, toolbox, ngen, halloffame=None,
+               stats=None, migration_interval=10, migrants=1, seeds=None,
+               verbose=__debug__):
+    """
+    Run several CMA-ES strategies (islands) side by side.
+
+    Each generation, the populations of all islands are evaluated
+    together in a single call to toolbox.map so that the workers stay
+    busy even when lambda is small. Every migration_interval
+    generations, the best migrants from each island replace the worst
+    individuals on the next island before the strategies are updated.
+
+    seeds (if given) is a list of seeds, one per island, for the
+    random number generator. Returns the final populations and a
+    logbook. Raises ValueError if migrants is not smaller than the
+    population of every island.
+    """
+    if len(strategies) > 1 and migration_interval > 0 and \
+       not 0 <= migrants < min(s.lambda_ for s in strategies):
+        raise ValueError('migrants must be between 0 and the smallest '
+                         'island population size')
+    if seeds is None:
+        seeds = [None] * len(strategies)
+    assert len(seeds) == len(strategies)
+    states = [np.random.RandomState(seed).get_state() for seed in seeds]
+
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+    for gen in range(ngen):
+        populations = []
+        for i, strategy in enumerate(strategies):
+            with _rng_state(states, i):
+                populations.append(strategy.generate(ind_init))
+
+        everyone = [ind for pop in populations for ind in pop]
+        fitnesses = toolbox.map(toolbox.evaluate, everyone)
+        for ind, fit in zip(everyone, fitnesses):
+            ind.fitness.values = fit
+
+        if halloffame is not None:
+            halloffame.update(everyone)
+
+        if len(strategies) > 1 and migration_interval > 0 and \
+           (gen + 1) % migration_interval == 0:
+            _migrate(populations, migrants)
+
+        for strategy, pop in zip(strategies, populations):
+            strategy.update(pop)
+
+        record = stats.compile(everyone) if stats is not None else {}
+        logbook.record(gen=gen, nevals=len(everyone), **record)
+        if verbose:
+            print(logbook.stream)
+
+    return populations, logbook
+
+
+def load_centroid(filename, numparams):
+    """
+    Return the parameters vector from a results file.
+
+    This allows a run to be warm-started from the result of a previous
+    run. The first bundle in the file is used.
+    """
+    for bundle in utils.read_bundles(filename):
+        params = bundle['parameters']
+        if len(params) != numparams:
+            msg = f'{filename}: expected {numparams} parameters, ' + \
+                f'found {len(params)}'
+            raise ValueError(msg)
+        return params
+    raise ValueError(f'{filename}: no parameters found')
+
+
+def _restart_params(regime, restart, lambda_, sigma, budgets):
+    """
+    Return the population size and step size for the next restart.
+
+    In the IPOP regime, the population size doubles with each
+    restart. BIPOP interleaves these large population runs with runs
+    using a small, randomised population size and step size, choosing
+    whichever regime has consumed fewer evaluations so far.
+    """
+    large_lambda = lambda_ * 2 ** (budgets['restarts'] + 1)
+    if regime == 'ipop' or restart == 0 or \
+       budgets['large'] <= budgets['small']:
+        budgets['restarts'] += 1
+        return large_lambda, sigma, 'large'
+    uniform = np.random.uniform()
+    last_large = lambda_ * 2 ** budgets['restarts']
+    exponent = uniform ** 2
+    small_lambda = int(lambda_ * (0.5 * last_large / lambda_) ** exponent)
+    return max(small_lambda, 2), sigma * 10 ** (-2 * uniform), 'small'
+
+
+def ea_restarts(centroid, sigma, ind_init, toolbox, ngen, halloffame=None,
+                stats=None, regime='ipop', stagnation=20, tolerance=1e-6,
+                lambda_=None, verbose=__debug__):
+    """
+    Run CMA-ES with IPOP or BIPOP restarts.
+
+    The search is restarted from the initial centroid when the best
+    (ie, lowest) fitness found by the current run has not improved by
+    more than the relative tolerance for stagnation generations. Each
+    run is judged on its own progress, not against the best of earlier
+    runs, so large populations have time to converge. Restarts
+    continue until ngen generations have been run in total. Returns
+    the final population and a logbook.
+    """
+    assert regime in ['ipop', 'bipop']
+    if halloffame is None:
+        halloffame = tools.HallOfFame(1)
+    if lambda_ is None:
+        # the DEAP default
+        lambda_ = int(4 + 3 * log(len(centroid)))
+
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'restart', 'lambda', 'nevals'] + \
+        (stats.fields if stats else [])
+
+    budgets = {'large': 0, 'small': 0, 'restarts': 0}
+    restart, run_lambda, run_sigma, kind = 0, lambda_, sigma, 'large'
+    strategy = cma.Strategy(centroid=list(centroid), sigma=run_sigma,
+                            lambda_=run_lambda)
+    best, since = None, 0
+
+    for gen in range(ngen):
+        population = strategy.generate(ind_init)
+        fitnesses = toolbox.map(toolbox.evaluate, population)
+        for ind, fit in zip(population, fitnesses):
+            ind.fitness.values = fit
+        halloffame.update(population)
+        strategy.update(population)
+        budgets[kind] += len(population)
+
+        record = stats.compile(population) if stats is not None else {}
+        record['lambda'] = run_lambda
+        logbook.record(gen=gen, restart=restart, nevals=len(population),
+                       **record)
+        if verbose:
+            print(logbook.stream)
+
+        fitness = min(ind.fitness.values[0] for ind in population)
+        if best is None or fitness < best - abs(best) * tolerance:
+            best, since = fitness, 0
+        else:
+            since += 1
+
+        if since >= stagnation:
+            run_lambda, run_sigma, kind = \
+                _restart_params(regime, restart, lambda_, sigma, budgets)
+            restart += 1
+            if verbose:
+                print(f'restart {restart} ({regime} {kind} regime):',
+                      f'lambda={run_lambda}, sigma={run_sigma:.3g}')
+            strategy = cma.Strategy(centroid=list(centroid), sigma=run_sigma,
+                                    lambda_=run_lambda)
+            best, since = None, 0
+
+    return population, logbook
@@ -0,0 +1,312 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Export simulation results in binary, columnar formats.
+
+After a simulation run, save() writes the hourly results of a context
+to a compressed NumPy archive (.npz) or, if pyarrow is installed, a
+Parquet file (.parquet). Both are much smaller and faster to write
+and read than CSV files. The time horizon is that of the simulation
+run, and the generator metadata (label, technology, polygon and
+capacity) is written alongside the arrays. The quantities are:
+
+  power    generation dispatched by each generator (MW)
+  spill    surplus generation that could not be stored (MW)
+  charge   energy stored by each storage-capable generator (MWh)
+  soc      state of charge of each storage-capable generator
+  demand   aggregate demand (MW)
+  unserved aggregate unserved energy (MW)
+
+In a Parquet file, there is a timestamp column, a column for each
+generator quantity named quantity/generator number (eg, power/0) and
+demand and unserved columns. The generator metadata is kept as JSON
+in the 'generators' entry of the schema metadata.
+
+For very long runs, a ResultSink can instead be passed to nemo.run()
+to write the hourly results incrementally, one chunk of timesteps at
+a time, as the simulation proceeds. Only one chunk of results is held
+in memory at a time:
+
+  nemo.run(context, sink=export.CSVSink('results.csv'))
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from nemo import generators
+
+# Quantities with one column per generator.
+GENERATOR_QUANTITIES = ['power', 'spill', 'charge', 'soc']
+
+# Generator series that are folded once they have been streamed.
+_SERIES = ['series_power', 'series_spilled', 'series_charge', 'series_soc']
+
+
+def _dispatched(context):
+    """Return the generators dispatched in the last run."""
+    return [context.generators[gidx] for gidx in context.dispatched()]
+
+
+def storage_array(gens, attr, timesteps=None, out=None):
+    """
+    Return a (timesteps, generators) array of storage series.
+
+    attr names the series (eg, 'series_soc'). If out is given, the
+    series are written into it (and other columns are left alone).
+    """
+    if out is None:
+        out = np.zeros((timesteps, len(gens)))
+    for col, gen in enumerate(gens):
+        if not isinstance(gen, generators.Storage):
+            continue
+        series = getattr(gen, attr)
+        hours = np.fromiter(series.keys(), dtype=int, count=len(series))
+        out[hours, col] = np.fromiter(series.values(), dtype=float,
+                                      count=len(series))
+    return out
+
+
+def _storage_rows(gens, start, stop, attr):
+    """Return storage series for timesteps start to stop (exclusive)."""
+    array = np.zeros((stop - start, len(gens)))
+    for col, gen in enumerate(gens):
+        if not isinstance(gen, generators.Storage):
+            continue
+        series = getattr(gen, attr)
+        for hour in range(start, stop):
+            if hour in series:
+                array[hour - start, col] = series[hour]
+    return array
+
+
+def columns(numgens):
+    """Return the column names of flat (CSV or Parquet) output."""
+    return [f'{quantity}/{num}' for quantity in GENERATOR_QUANTITIES
+            for num in range(numgens)] + ['demand', 'unserved']
+
+
+def _metadata(gens):
+    """Return the generator metadata as a list of dicts."""
+    return [{'label': g.label, 'technology': type(g).__name__,
+             'polygon': int(g.polygon), 'capacity': float(g.capacity)}
+            for g in gens]
+
+
+def _parquet_schema(gens):
+    """Return the Arrow schema of a Parquet results file."""
+    # pylint: disable=import-outside-toplevel
+    import pyarrow as pa
+    fields = [pa.field('timestamp', pa.timestamp('ns'))] + \
+        [pa.field(name, pa.float64()) for name in columns(len(gens))]
+    return pa.schema(fields,
+                     metadata={'generators': json.dumps(_metadata(gens))})
+
+
+def _parquet_table(schema, timestamps, data):
+    """Return an Arrow table of rows of data (one per timestamp)."""
+    # pylint: disable=import-outside-toplevel
+    import pyarrow as pa
+    arrays = [pa.array(np.asarray(timestamps, dtype='datetime64[ns]'))] + \
+        [pa.array(column) for column in data.T]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def results(context):
+    """
+    Return the results of the last run of context as a dict of arrays.
+
+    Arrays of generator quantities have one row per timestep and one
+    column per dispatched generator.
+    """
+    gens = _dispatched(context)
+    timestamps = context.generation.index
+    timesteps = len(timestamps)
+    if timesteps == 0:
+        raise ValueError('context has not been run')
+    demand = context.demand.loc[timestamps].sum(axis=1)
+    unserved = context.unserved.reindex(timestamps, fill_value=0)
+    return {'timestamps': timestamps.values,
+            'label': np.array([g.label for g in gens], dtype=str),
+            'technology': np.array([type(g).__name__ for g in gens],
+                                   dtype=str),
+            'polygon': np.array([g.polygon for g in gens], dtype=int),
+            'capacity': np.array([g.capacity for g in gens], dtype=float),
+            'power': context.generation.values[:, :len(gens)],
+            'spill': context.spill.values[:, :len(gens)],
+            'charge': storage_array(gens, 'series_charge', timesteps),
+            'soc': storage_array(gens, 'series_soc', timesteps),
+            'demand': demand.values,
+            'unserved': unserved.values}
+
+
+def save_npz(context, filename):
+    """Save the results of context to a compressed NumPy archive."""
+    np.savez_compressed(filename, **results(context))
+
+
+def save_parquet(context, filename):
+    """
+    Save the results of context to a Parquet file.
+
+    The file has the same layout as one written by a ParquetSink.
+    """
+    # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq
+    arrays = results(context)
+    quantities = [arrays[quantity] for quantity in GENERATOR_QUANTITIES]
+    data = np.column_stack(quantities + [arrays['demand'],
+                                         arrays['unserved']])
+    schema = _parquet_schema(_dispatched(context))
+    pq.write_table(_parquet_table(schema, arrays['timestamps'], data),
+                   filename)
+
+
+FORMATS = {'.npz': save_npz, '.parquet': save_parquet}
+
+
+def save(context, filename):
+    """Save the results of context in the format given by the suffix."""
+    suffix = os.path.splitext(filename)[1].lower()
+    try:
+        saver = FORMATS[suffix]
+    except KeyError as exc:
+        raise ValueError(f'unsupported export format: {filename}') from exc
+    saver(context, filename)
+
+
+class ResultSink():
+    """
+    Base class for writing hourly results during a simulation run.
+
+    The simulation calls open() before the first timestep and then
+    dispatches into the generation and spill buffers of the sink,
+    which hold chunksize timesteps. After every chunksize timesteps
+    (and after the last timestep), it calls write() to write out and
+    clear the buffers, and it calls close() at the end of the run.
+    Subclasses implement _write().
+    """
+
+    chunksize = 24 * 7
+    """Number of timesteps in each chunk."""
+
+    def __init__(self, filename):
+        """Construct a sink that writes to filename."""
+        self.filename = filename
+        self.timestamps = None
+        self.gens = None
+        self.generation = None
+        self.spill = None
+
+    def columns(self):
+        """Return the column names of the output."""
+        return columns(len(self.gens))
+
+    def open(self, context, timestamps, gens):
+        """Prepare to receive the results of a run."""
+        # pylint: disable=unused-argument
+        self.timestamps = timestamps
+        self.gens = gens
+        self.generation = np.zeros((self.chunksize, len(gens)))
+        self.spill = np.zeros((self.chunksize, len(gens)))
+
+    def write(self, start, stop, demand):
+        """
+        Write out the buffered results for timesteps start to stop.
+
+        The first row of the buffers holds timestep start and stop is
+        exclusive. demand is the aggregate demand for the whole run.
+        Once written, the buffers are cleared and the generator series
+        are folded (see generators.HourlySeries), so the generators
+        only hold the hours of the current chunk.
+        """
+        rows = stop - start
+        power = self.generation[:rows]
+        chunk_demand = demand[start:stop]
+        unserved = chunk_demand - power.sum(axis=1)
+        # Ignore unserved energy very close to 0 (rounding errors)
+        unserved[np.isclose(unserved, 0)] = 0
+        data = np.hstack([power, self.spill[:rows],
+                          _storage_rows(self.gens, start, stop,
+                                        'series_charge'),
+                          _storage_rows(self.gens, start, stop,
+                                        'series_soc'),
+                          chunk_demand[:, np.newaxis],
+                          unserved[:, np.newaxis]])
+        self._write(self.timestamps[start:stop], data)
+        self.generation[:rows] = 0
+        self.spill[:rows] = 0
+        for gen in self.gens:
+            for attr in _SERIES:
+                if hasattr(gen, attr):
+                    getattr(gen, attr).fold()
+
+    def _write(self, timestamps, data):
+        """Write rows of data (one per timestamp)."""
+        raise NotImplementedError
+
+    def close(self):
+        """Finish writing the results."""
+
+
+class CSVSink(ResultSink):
+    """Write hourly results to a CSV file."""
+
+    def __init__(self, filename):
+        """Construct a CSV sink."""
+        ResultSink.__init__(self, filename)
+        self.file = None
+
+    def open(self, context, timestamps, gens):
+        """Open the CSV file and write the header."""
+        ResultSink.open(self, context, timestamps, gens)
+        # pylint: disable=consider-using-with
+        self.file = open(self.filename, 'w', encoding='utf-8', newline='')
+        self.file.write(','.join(['timestamp'] + self.columns()) + '\n')
+
+    def _write(self, timestamps, data):
+        """Append rows to the CSV file."""
+        frame = pd.DataFrame(data, index=timestamps)
+        frame.to_csv(self.file, header=False)
+
+    def close(self):
+        """Close the CSV file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ParquetSink(ResultSink):
+    """Write hourly results to a Parquet file, one row group per chunk."""
+
+    def __init__(self, filename):
+        """Construct a Parquet sink."""
+        ResultSink.__init__(self, filename)
+        self.writer = None
+        self.schema = None
+
+    def open(self, context, timestamps, gens):
+        """Open the Parquet file."""
+        # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet as pq
+        ResultSink.open(self, context, timestamps, gens)
+        self.schema = _parquet_schema(gens)
+        self.writer = pq.ParquetWriter(self.filename, self.schema)
+
+    def _write(self, timestamps, data):
+        """Write the rows as a row group."""
+        self.writer.write_table(_parquet_table(self.schema, timestamps,
+                                               data))
+
+    def close(self):
+        """Close the Parquet file."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
@@ -0,0 +1,230 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Battery fleets.
+
+Scenarios often place a run of Battery and BatteryLoad generators
+next to each other in the merit order (see scenarios.re100SWHB_2).
+Stepping each of them every hour, and offering every spill to each
+of them in turn, is slow. During a simulation, a BatteryFleet stands
+in for such a run. It keeps the storage levels, capacities, round
+trip efficiencies and discharge hours of the whole run in flat
+tables, and discharges or charges the whole fleet in one call with
+the same arithmetic as the generators themselves. Once no battery
+can take any more energy in an hour, further spills in that hour are
+turned away at once. The results are written back to the generators
+at the end of the run.
+"""
+
+from nemo.generators import Battery, BatteryLoad
+
+# Charging capacity up to this (in MW) is treated as zero, as in
+# generators.Storage.charge_capacity().
+_EPSILON = 1e-6
+
+
+class BatteryFleet():
+    """A run of Battery and BatteryLoad generators."""
+
+    synchronous_p = True
+    """Batteries are synchronous generators."""
+
+    vectorised_p = False
+    """A fleet is stepped hour by hour."""
+
+    def __init__(self, members, columns, generation):
+        """
+        Construct a fleet from a run of generators in merit order.
+
+        columns[i] is the column of members[i] in the generation
+        matrix, which the fleet fills in as it is dispatched.
+        """
+        self.members = members
+        self.generation = generation
+        self.polygon = members[0].polygon
+        self.batteries = [g for g in members if isinstance(g, Battery)]
+        self.loads = [g for g in members if isinstance(g, BatteryLoad)]
+        self.storage_p = len(self.loads) > 0
+        self.columns = [col for col, gen in zip(columns, members)
+                        if isinstance(gen, Battery)]
+
+        # the BatteryStorage objects, in order of first appearance
+        self.stores = list({id(g.battery): g.battery
+                            for g in members}.values())
+        index = {id(store): i for i, store in enumerate(self.stores)}
+        self.storage = [store.storage for store in self.stores]
+        self.maxstorage = [store.maxstorage for store in self.stores]
+
+        # For each hour of the day, the batteries that may discharge
+        # and the loads that may charge, in merit order.
+        self._discharging = [
+            [(col, index[id(gen.battery)], gen.capacity)
+             for col, gen in zip(self.columns, self.batteries)
+             if hr in gen.discharge_hours]
+            for hr in range(24)]
+        self._charging = [
+            [(i, index[id(gen.battery)], gen.capacity, gen.rte)
+             for i, gen in enumerate(self.loads)
+             if hr not in gen.discharge_hours]
+            for hr in range(24)]
+
+        # energy charged by each load in self._hour (None if none)
+        self._hour = None
+        self._charged = None
+        # True once no load can take any more energy in self._hour
+        self._saturated = False
+
+    def step(self, hour, demand):
+        """
+        Discharge the batteries in merit order to meet demand.
+
+        Returns the demand left over.
+        """
+        storage = self.storage
+        generation = self.generation
+        for col, sidx, capacity in self._discharging[hour % 24]:
+            level = storage[sidx]
+            if level == 0:
+                continue
+            power = min(level, capacity, demand)
+            storage[sidx] = max(0, level - power)
+            if power > 0:
+                generation[hour, col] = power
+                # discharging makes room for charging
+                self._saturated = False
+            demand -= power
+            demand = demand if demand > 0 else 0
+        return demand
+
+    def store(self, hour, spl):
+        """
+        Charge the batteries in merit order from spl MW of spills.
+
+        Returns the spill left over.
+        """
+        if hour != self._hour:
+            self._hour = hour
+            self._charged = [None] * len(self.loads)
+            self._saturated = False
+        if self._saturated:
+            return spl
+        storage = self.storage
+        charged = self._charged
+        exhausted = 0
+        for i, sidx, capacity, rte in self._charging[hour % 24]:
+            level = storage[sidx]
+            maxstorage = self.maxstorage[sidx]
+            if level == maxstorage:
+                exhausted += 1
+                continue
+            if charged[i] is None:
+                headroom = capacity
+            else:
+                headroom = capacity - charged[i]
+                if headroom <= _EPSILON:
+                    exhausted += 1
+                    continue
+            power = min(headroom, spl, capacity)
+            energy = power * rte
+            stored = min(maxstorage - level, energy) / rte
+            level = min(maxstorage, level + energy)
+            storage[sidx] = level
+            if power > 0:
+                charged[i] = stored if charged[i] is None \
+                    else charged[i] + stored
+                self.loads[i].series_charge[hour] = charged[i]
+                self.loads[i].series_soc[hour] = level / maxstorage
+            if level == maxstorage or charged[i] is None or \
+               capacity - charged[i] <= _EPSILON:
+                exhausted += 1
+            spl -= stored
+            if -_EPSILON <= spl < 0:
+                spl = 0
+            assert spl >= 0
+            if spl == 0:
+                return spl
+        if exhausted == len(self._charging[hour % 24]):
+            self._saturated = True
+        return spl
+
+    def finish(self):
+        """Write the results of a run back to the generators."""
+        for store, level in zip(self.stores, self.storage):
+            store.storage = level
+        for gen, col in zip(self.batteries, self.columns):
+            power = self.generation[:, col]
+            gen.series_power.update(enumerate(power.tolist()))
+            gen.series_spilled.update(enumerate([0] * len(power)))
+            gen.runhours += int((power > 0).sum())
+
+    def __str__(self):
+        """Return a short string representation of the fleet."""
+        return f'fleet of {len(self.members)} batteries'
+
+
+def _eligible(run, gens):
+    """
+    Return True if a run of generators can be replaced by a fleet.
+
+    The run must not share its storage with generators outside it,
+    and no two batteries (or loads) may share storage.
+    """
+    if len(run) < 2:
+        return False
+    inside = [id(g.battery) for g in run]
+    outside = {id(g.battery) for g in gens
+               if hasattr(g, 'battery') and all(g is not m for m in run)}
+    if outside.intersection(inside):
+        return False
+    for cls in [Battery, BatteryLoad]:
+        stores = [id(g.battery) for g in run if isinstance(g, cls)]
+        if len(stores) != len(set(stores)):
+            return False
+    return True
+
+
+def assemble(gens, generation, same_polygon=False):
+    """
+    Replace each run of batteries in gens with a BatteryFleet.
+
+    Returns the list of units to dispatch, the column in the
+    generation matrix of each unit (None for a fleet, which fills in
+    its own columns) and the list of fleets. If there are no fleets,
+    gens is returned with no columns. If same_polygon is true, as
+    dispatch over a network requires, runs are also broken where the
+    polygon changes.
+    """
+    units, columns, fleets = [], [], []
+    run = []
+    for gidx, gen in enumerate(gens + [None]):
+        # subclasses may behave differently, so only these two
+        # pylint: disable=unidiomatic-typecheck
+        battery_p = type(gen) in (Battery, BatteryLoad)
+        moved_p = battery_p and same_polygon and run and \
+            gen.polygon != gens[run[0]].polygon
+        if battery_p and not moved_p:
+            run.append(gidx)
+            continue
+        members = [gens[i] for i in run]
+        if _eligible(members, gens):
+            fleet = BatteryFleet(members, run, generation)
+            units.append(fleet)
+            columns.append(None)
+            fleets.append(fleet)
+        else:
+            units += members
+            columns += run
+        run = []
+        if battery_p:
+            run.append(gidx)
+        elif gen is not None:
+            units.append(gen)
+            columns.append(gidx)
+    if not fleets:
+        return gens, None, []
+    return units, columns, fleets
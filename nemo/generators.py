@@ -17,11 +17,8 @@ from math import inf, isclose
 
 import numpy as np
 import pandas as pd
-import requests
-from matplotlib.patches import Patch
-
-from nemo import polygons, storage
-from nemo.utils import currency, thousands, ureg
+from nemo import polygons, storage, utils
+from nemo.utils import HourlySeries, LazyPatch, currency, thousands
 
 
 class Generator():
@@ -37,6 +34,12 @@ class Generator():
     storage_p = False
     """A generator is not capable of storage by default."""
 
+    vectorised_p = False
+    """Can this generator be stepped over all hours at once?"""
+
+    stateless_p = False
+    """Does each hour of step() depend only on the demand in that hour?"""
+
     def __init__(self, polygon, capacity, label=None):
         """
         Construct a base Generator.
@@ -54,8 +57,8 @@ class Generator():
         assert 0 < polygon <= polygons.NUMPOLYGONS, polygon
 
         # Time series of dispatched power and spills
-        self.series_power = {}
-        self.series_spilled = {}
+        self.series_power = HourlySeries()
+        self.series_spilled = HourlySeries()
 
     def series(self):
         """Return generation and spills series."""
@@ -66,6 +69,16 @@ class Generator():
         """Step the generator by one hour."""
         raise NotImplementedError
 
+    def step_all(self, demand):
+        """
+        Step the generator over all hours at once.
+
+        demand[hour] is the demand offered to the generator in each
+        hour from hour 0. Returns arrays of power and spills, as if
+        step() were called for each hour in turn.
+        """
+        raise NotImplementedError
+
     def region(self):
         """Return the region the generator is in."""
         return polygons.region(self.polygon)
@@ -115,13 +128,13 @@ class Generator():
     def summary(self, context):
         """Return a summary of the generator activity."""
         costs = context.costs
-        supplied = sum(self.series_power.values()) * ureg.MWh
+        supplied = sum(self.series_power.values()) * utils.ureg.MWh
         string = f'supplied {supplied.to_compact()}'
         if self.capacity > 0:
             if self.capfactor() > 0:
                 string += f', CF {self.capfactor():.1f}%'
         if sum(self.series_spilled.values()) > 0:
-            spilled = sum(self.series_spilled.values()) * ureg.MWh
+            spilled = sum(self.series_spilled.values()) * utils.ureg.MWh
             string += f', surplus {spilled.to_compact()}'
         if self.capcost(costs) > 0:
             string += f', capcost {currency(self.capcost(costs))}'
@@ -139,7 +152,7 @@ class Generator():
     def __str__(self):
         """Return a short string representation of the generator."""
         return f'{self.label} ({self.region()}:{self.polygon}), ' + \
-            str(self.capacity * ureg.MW)
+            str(self.capacity * utils.ureg.MW)
 
     def __repr__(self):
         """Return a representation of the generator."""
@@ -158,8 +171,8 @@ class Storage():
     def __init__(self):
         """Storage constructor."""
         # Time series of charges
-        self.series_charge = {}
-        self.series_soc = {}
+        self.series_charge = HourlySeries()
+        self.series_soc = HourlySeries()
 
     def soc(self):
         """Return the storage SOC (state of charge)."""
@@ -207,6 +220,12 @@ class Storage():
 class TraceGenerator(Generator):
     """A generator that gets its hourly dispatch from a trace."""
 
+    vectorised_p = True
+    """Can this generator be stepped over all hours at once?"""
+
+    stateless_p = True
+    """Does each hour of step() depend only on the demand in that hour?"""
+
     def __init__(self, polygon, capacity, label=None, build_limit=None):
         """Construct a generator with a specified trace file."""
         Generator.__init__(self, polygon, capacity, label)
@@ -228,6 +247,16 @@ class TraceGenerator(Generator):
         self.series_spilled[hour] = spilled
         return power, spilled
 
+    def step_all(self, demand):
+        """Step method for any generator using traces over all hours."""
+        # pylint: disable=no-member
+        generation = self.generation[:len(demand)] * self.capacity
+        power = np.where(generation < demand, generation, demand)
+        spilled = generation - power
+        self.series_power.update(enumerate(power.tolist()))
+        self.series_spilled.update(enumerate(spilled.tolist()))
+        return power, spilled
+
 
 class CSVTraceGenerator(TraceGenerator):
     """A generator that gets its hourly dispatch from a CSV trace file."""
@@ -247,6 +276,8 @@ class CSVTraceGenerator(TraceGenerator):
                 # Local file path
                 traceinput = filename
             else:
+                # pylint: disable=import-outside-toplevel
+                import requests
                 try:
                     resp = requests.request('GET', filename, timeout=5)
                 except requests.exceptions.Timeout as exc:
@@ -270,7 +301,7 @@ class CSVTraceGenerator(TraceGenerator):
 class Wind(CSVTraceGenerator):
     """Wind power."""
 
-    patch = Patch(facecolor='#417505')
+    patch = LazyPatch(facecolor='#417505')
     """Patch for plotting"""
     synchronous_p = False
     """Is this a synchronous generator?"""
@@ -279,7 +310,7 @@ class Wind(CSVTraceGenerator):
 class WindOffshore(Wind):
     """Offshore wind power."""
 
-    patch = Patch(facecolor='darkgreen')
+    patch = LazyPatch(facecolor='darkgreen')
     """Colour for plotting"""
 
 
@@ -293,22 +324,25 @@ class PV(CSVTraceGenerator):
 class PV1Axis(PV):
     """Single-axis tracking PV."""
 
-    patch = Patch(facecolor='#FBBA06')
+    patch = LazyPatch(facecolor='#FBBA06')
     """Colour for plotting"""
 
 
 class Behind_Meter_PV(PV):
     """Behind the meter PV."""
 
-    patch = Patch(facecolor='#F9EE00')
+    patch = LazyPatch(facecolor='#F9EE00')
 
 
 class CST(CSVTraceGenerator):
     """Concentrating solar thermal (CST) model."""
 
-    patch = Patch(facecolor='orange')
+    patch = LazyPatch(facecolor='orange')
     """Colour for plotting"""
 
+    stateless_p = False
+    """CST plant carries stored heat from hour to hour."""
+
     def __init__(self, polygon, capacity, solarmult, shours, filename,
                  column, label=None, build_limit=None):
         """
@@ -362,6 +396,24 @@ class CST(CSVTraceGenerator):
         generation = min(generation, demand)
         return generation, 0
 
+    def step_all(self, demand):
+        """Step method for CST generators over all hours."""
+        generation = \
+            self.generation[:len(demand)] * self.capacity * self.solarmult
+        remainder = np.minimum(self.capacity, demand)
+        surplus = generation - remainder
+        drawn, self.stored = _cst_storage(surplus.tolist(),
+                                          (remainder - generation).tolist(),
+                                          self.stored, self.maxstorage)
+        generation = np.where(surplus > 0, generation - surplus,
+                              generation + drawn)
+        self.series_power.update(enumerate(generation.tolist()))
+        self.series_spilled.update(enumerate([0] * len(demand)))
+
+        # This can happen due to rounding errors.
+        power = np.where(demand < generation, demand, generation)
+        return power, np.zeros(len(demand))
+
     def reset(self):
         """Reset the generator."""
         Generator.reset(self)
@@ -374,6 +426,30 @@ class CST(CSVTraceGenerator):
             f', {self.shours}h storage'
 
 
+def _cst_storage(surplus, deficit, stored, maxstorage):
+    """
+    Run the thermal store of a CST plant over all hours.
+
+    surplus[hour] is the energy available to store and deficit[hour]
+    (its negation) is the energy wanted from the store. The store
+    level saturates at 0 and maxstorage, so each hour depends on the
+    last; this loop over plain floats repeats the arithmetic of
+    CST.step() exactly. Returns the energy drawn from the store each
+    hour and the final store level.
+    """
+    drawn = [0.0] * len(surplus)
+    for hour, to_storage in enumerate(surplus):
+        if to_storage > 0:
+            stored += to_storage
+            stored = stored if stored < maxstorage else maxstorage
+        else:
+            wanted = deficit[hour]
+            from_storage = wanted if wanted < stored else stored
+            drawn[hour] = from_storage
+            stored -= from_storage
+    return drawn, stored
+
+
 class ParabolicTrough(CST):
     """Parabolic trough CST generator.
 
@@ -419,7 +495,7 @@ class Fuelled(Generator):
 class Hydro(Fuelled):
     """Hydro power stations."""
 
-    patch = Patch(facecolor='#4582b4')
+    patch = LazyPatch(facecolor='#4582b4')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, label=None):
@@ -432,7 +508,7 @@ class Hydro(Fuelled):
 class PumpedHydroPump(Storage, Generator):
     """Pumped hydro (pump side) model."""
 
-    patch = Patch(facecolor='darkblue')
+    patch = LazyPatch(facecolor='darkblue')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, reservoirs, rte=0.8, label=None):
@@ -487,7 +563,7 @@ class PumpedHydroPump(Storage, Generator):
 
     def summary(self, context):
         """Return a summary of the generator activity."""
-        stg = (self.reservoirs.maxstorage * ureg.MWh).to_compact()
+        stg = (self.reservoirs.maxstorage * utils.ureg.MWh).to_compact()
         return Generator.summary(self, context) + \
             f', charged {thousands(len(self.series_charge))} hours' + \
             f', {stg} storage'
@@ -496,7 +572,7 @@ class PumpedHydroPump(Storage, Generator):
 class PumpedHydroTurbine(Hydro):
     """Pumped storage hydro (generator side) model."""
 
-    patch = Patch(facecolor='powderblue')
+    patch = LazyPatch(facecolor='powderblue')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, reservoirs, label=None):
@@ -527,7 +603,7 @@ class PumpedHydroTurbine(Hydro):
 class Biofuel(Fuelled):
     """Model of open cycle gas turbines burning biofuel."""
 
-    patch = Patch(facecolor='wheat')
+    patch = LazyPatch(facecolor='wheat')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, label=None):
@@ -552,7 +628,7 @@ class Biofuel(Fuelled):
 class Biomass(Fuelled):
     """Model of steam turbine burning solid biomass."""
 
-    patch = Patch(facecolor='#1d7a7a')
+    patch = LazyPatch(facecolor='#1d7a7a')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, label=None, heatrate=0.3):
@@ -570,7 +646,7 @@ class Biomass(Fuelled):
 class Fossil(Fuelled):
     """Base class for GHG emitting power stations."""
 
-    patch = Patch(facecolor='grey')
+    patch = LazyPatch(facecolor='grey')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, intensity, label=None):
@@ -584,6 +660,7 @@ class Fossil(Fuelled):
 
     def summary(self, context):
         """Return a summary of the generator activity."""
+        ureg = utils.ureg
         generation = sum(self.series_power.values()) * ureg.MWh
         emissions = generation * self.intensity * (ureg.t / ureg.MWh)
         return Fuelled.summary(self, context) + \
@@ -593,7 +670,7 @@ class Fossil(Fuelled):
 class Black_Coal(Fossil):
     """Black coal power stations with no CCS."""
 
-    patch = Patch(facecolor='#121212')
+    patch = LazyPatch(facecolor='#121212')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, intensity=0.773, label=None):
@@ -611,7 +688,7 @@ class Black_Coal(Fossil):
 class OCGT(Fossil):
     """Open cycle gas turbine (OCGT) model."""
 
-    patch = Patch(facecolor='#ffcd96')
+    patch = LazyPatch(facecolor='#ffcd96')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, intensity=0.7, label=None):
@@ -629,7 +706,7 @@ class OCGT(Fossil):
 class CCGT(Fossil):
     """Combined cycle gas turbine (CCGT) model."""
 
-    patch = Patch(facecolor='#fdb462')
+    patch = LazyPatch(facecolor='#fdb462')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, intensity=0.4, label=None):
@@ -658,6 +735,7 @@ class CCS(Fossil):
 
     def summary(self, context):
         """Return a summary of the generator activity."""
+        ureg = utils.ureg
         generation = sum(self.series_power.values()) * ureg.MWh
         emissions = generation * self.intensity * (ureg.t / ureg.MWh)
         captured = emissions * self.capture
@@ -714,7 +792,7 @@ class CCGT_CCS(CCS):
 class Diesel(Fossil):
     """Diesel genset model."""
 
-    patch = Patch(facecolor='#f35020')
+    patch = LazyPatch(facecolor='#f35020')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, intensity=1.0, kwh_per_litre=3.3,
@@ -735,7 +813,7 @@ class Diesel(Fossil):
 class BatteryLoad(Storage, Generator):
     """Battery storage (load side)."""
 
-    patch = Patch(facecolor='#800080')
+    patch = LazyPatch(facecolor='#800080')
     """Colour for plotting"""
     synchronous_p = False
     """Is this a synchronous generator?"""
@@ -809,7 +887,7 @@ class BatteryLoad(Storage, Generator):
 
     def summary(self, context):
         """Return a summary of the generator activity."""
-        mwh = self.battery.maxstorage * ureg.MWh
+        mwh = self.battery.maxstorage * utils.ureg.MWh
         return Generator.summary(self, context) + \
             f', charged {thousands(len(self.series_charge))} hours' + \
             f', {mwh.to_compact()} storage'
@@ -821,7 +899,7 @@ class Battery(Generator):
     # Lifespan of the battery in years
     lifetime = 15
 
-    patch = Patch(facecolor='#f51ddf')
+    patch = LazyPatch(facecolor='#f51ddf')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, shours, battery,
@@ -906,7 +984,7 @@ class Battery(Generator):
 class Geothermal(CSVTraceGenerator):
     """Geothermal power plant."""
 
-    patch = Patch(facecolor='indianred')
+    patch = LazyPatch(facecolor='indianred')
     """Colour for plotting"""
 
     def step(self, hour, demand):
@@ -920,6 +998,14 @@ class Geothermal(CSVTraceGenerator):
         self.series_spilled[hour] = 0
         return power, 0
 
+    def step_all(self, demand):
+        """Step method for geothermal generators over all hours."""
+        generation = self.generation[:len(demand)] * self.capacity
+        power = np.where(demand < generation, demand, generation)
+        self.series_power.update(enumerate(power.tolist()))
+        self.series_spilled.update(enumerate([0] * len(demand)))
+        return power, np.zeros(len(demand))
+
 
 class Geothermal_HSA(Geothermal):
     """Hot sedimentary aquifer (HSA) geothermal model."""
@@ -936,7 +1022,7 @@ class DemandResponse(Generator):
     >>> dr = DemandResponse(polygons.WILDCARD, 500, 1500)
     """
 
-    patch = Patch(facecolor='white')
+    patch = LazyPatch(facecolor='white')
     """Colour for plotting"""
 
     def __init__(self, polygon, capacity, cost_per_mwh, label=None):
@@ -990,7 +1076,7 @@ class DemandResponse(Generator):
 class Block(Generator):
     """A simple block generator."""
 
-    patch = Patch(facecolor='darkgreen')
+    patch = LazyPatch(facecolor='darkgreen')
     """Colour for plotting"""
 
     def step(self, hour, demand):
@@ -1004,7 +1090,7 @@ class Block(Generator):
 class Electrolyser(Storage, Generator):
     """A hydrogen electrolyser."""
 
-    patch = Patch(facecolor='teal')
+    patch = LazyPatch(facecolor='teal')
     """Colour for plotting"""
 
     def __init__(self, tank, polygon, capacity, efficiency=0.8, label=None):
@@ -1053,7 +1139,7 @@ class Electrolyser(Storage, Generator):
 class HydrogenGT(Fuelled):
     """A combustion turbine fuelled by hydrogen."""
 
-    patch = Patch(facecolor='violet')
+    patch = LazyPatch(facecolor='violet')
     """Colour for plotting"""
 
     def __init__(self, tank, polygon, capacity, efficiency=0.36, label=None):
@@ -6,60 +6,138 @@
 # the Free Software Foundation; either version 3 of the License, or
 # (at your option) any later version.
 
-"""A National Electricity Market (NEM) simulation."""
+"""
+A National Electricity Market (NEM) simulation.
+
+Demand traces are loaded when first needed (eg, when the first
+Context is created) rather than when this module is imported. Traces
+are cached by path, so one process can simulate many demand scenarios
+back to back, each being read just once:
+
+  s1 = load_demand('data/1year/2020demand_S1_Base.csv')
+  ctx = nemo.Context(demand=s1)
+"""
 
 import io
 
 import numpy as np
 import pandas as pd
-import requests
 
 from nemo import configfile, polygons, regions
 
-# Demand is in 30 minute intervals. NOTE: the number of rows in the
-# demand file now dictates the number of timesteps in the simulation.
+# Date formats found in demand traces.
+_DATE_FORMATS = ['%d/%m/%Y %H:%M:%S', '%Y/%m/%d %H:%M:%S']
+
+# Loaded demand traces, keyed by path.
+_cache = {}
+
+
+class DemandTrace():
+    """Hourly demand from a demand trace file."""
+
+    def __init__(self, path, demand):
+        """
+        Construct an hourly demand trace.
+
+        demand is the half-hourly regional demand read from path.
+        Demand is in 30 minute intervals. NOTE: the number of rows in
+        the demand file dictates the number of timesteps in the
+        simulation.
+        """
+        # Check for date, time and n demand columns (for n regions).
+        assert len(demand.columns) == regions.NUMREGIONS
+        # The number of rows must be even.
+        assert len(demand) % 2 == 0, \
+            "odd number of rows in half-hourly demand data"
+
+        # Check demand data starts at midnight
+        self.path = path
+        self.startdate = demand.index[0]
+        assert (self.startdate.hour, self.startdate.minute,
+                self.startdate.second) == (0, 30, 0), \
+            'demand data must start at midnight'
+
+        # Calculate hourly demand, averaging half-hours n and n+1.
+        self.hourly_regional_demand = \
+            demand.resample('h', closed='right').mean()
+
+        # Now put the demand into polygon resolution according to the
+        # load apportioning figures given in each region's polygons
+        # field.
+        numsteps = len(self.hourly_regional_demand)
+        self.hourly_demand = \
+            pd.DataFrame(index=self.hourly_regional_demand.index,
+                         data=np.zeros((numsteps, polygons.NUMPOLYGONS)))
+
+        for rgn, weights in [(r.id, r.polygons) for r in regions.All]:
+            for polygon, share in weights.items():
+                self.hourly_demand[polygon - 1] = \
+                    self.hourly_regional_demand[rgn] * share
 
-url = configfile.get('demand', 'demand-trace')
+    def __repr__(self):
+        """Return a representation of the trace."""
+        return f'DemandTrace({self.path!r})'
 
-if not url.startswith('http'):
-    # Local file path
-    traceinput = url
-else:
+
+def _parse_dates(demand):
+    """Return the Date and Time columns of demand as datetimes."""
+    datetimes = demand['Date'] + ' ' + demand['Time']
+    for fmt in _DATE_FORMATS[:-1]:
+        try:
+            return pd.to_datetime(datetimes, format=fmt)
+        except ValueError:
+            pass
+    return pd.to_datetime(datetimes, format=_DATE_FORMATS[-1])
+
+
+def _read(path):
+    """Read half-hourly regional demand from a file or URL."""
+    if not path.startswith('http'):
+        # Local file path
+        traceinput = path
+    else:
+        # pylint: disable=import-outside-toplevel
+        import requests
+        try:
+            resp = requests.request('GET', path, timeout=5)
+        except requests.exceptions.Timeout as exc:
+            raise TimeoutError(f'timeout fetching {path}') from exc
+        if not resp.ok:
+            raise ConnectionError(f'HTTP {resp.status_code}: {path}')
+        traceinput = io.StringIO(resp.text)
+
+    demand = pd.read_csv(traceinput, comment='#', sep=',')
+    # combine Date and Time columns into a new Date_Time column, make this
+    # the index column and then drop the original Date and Time columns
+    demand['Date_Time'] = _parse_dates(demand)
+    demand.set_index('Date_Time', inplace=True)
+    demand.drop(columns=['Date', 'Time'], inplace=True)
+    return demand
+
+
+def load_demand(path=None):
+    """
+    Return the DemandTrace for path.
+
+    If path is None, the demand trace named in the configuration file
+    is used. Each trace is read only once per process.
+    """
+    if path is None:
+        path = configfile.get('demand', 'demand-trace')
     try:
-        resp = requests.request('GET', url, timeout=5)
-    except requests.exceptions.Timeout as exc:
-        raise TimeoutError(f'timeout fetching {url}') from exc
-    if not resp.ok:
-        raise ConnectionError(f'HTTP {resp.status_code}: {url}')
-    traceinput = io.StringIO(resp.text)
-
-demand = pd.read_csv(traceinput, comment='#', sep=',')
-# combine Date and Time columns into a new Date_Time column, make this
-# the index column and then drop the original Date and Time columns
-demand['Date_Time'] = \
-    pd.to_datetime(demand['Date'] + ' ' + demand['Time'], format='%d/%m/%Y %H:%M:%S')
-demand.set_index('Date_Time', inplace=True)
-demand.drop(columns=['Date', 'Time'], inplace=True)
-
-# Check for date, time and n demand columns (for n regions).
-assert len(demand.columns) == regions.NUMREGIONS
-# The number of rows must be even.
-assert len(demand) % 2 == 0, "odd number of rows in half-hourly demand data"
-
-# Check demand data starts at midnight
-startdate = demand.index[0]
-assert (startdate.hour, startdate.minute, startdate.second) == (0, 30, 0), \
-    'demand data must start at midnight'
-
-# Calculate hourly demand, averaging half-hours n and n+1.
-hourly_regional_demand = demand.resample('h', closed='right').mean()
-
-# Now put the demand into polygon resolution according to the load
-# apportioning figures given in each region's polygons field.
-numsteps = len(hourly_regional_demand)
-hourly_demand = pd.DataFrame(index=hourly_regional_demand.index,
-                             data=np.zeros((numsteps, polygons.NUMPOLYGONS)))
-
-for rgn, weights in [(r.id, r.polygons) for r in regions.All]:
-    for polygon, share in weights.items():
-        hourly_demand[polygon - 1] = hourly_regional_demand[rgn] * share
+        return _cache[path]
+    except KeyError:
+        trace = _cache[path] = DemandTrace(path, _read(path))
+        return trace
+
+
+def clear_cache():
+    """Discard all loaded demand traces."""
+    _cache.clear()
+
+
+def __getattr__(name):
+    """Provide the default demand trace as module attributes."""
+    if name in ['startdate', 'hourly_regional_demand', 'hourly_demand']:
+        return getattr(load_demand(), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
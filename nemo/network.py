@@ -0,0 +1,656 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Transmission network constraints for dispatch.
+
+By default, the simulation treats the NEM as a copper plate: any
+generator can meet demand anywhere. Setting the network attribute of
+a context to a Network object makes dispatch respect the transfer
+limits between polygons each hour:
+
+  context.network = network.Network(polygons.existing_net)
+
+Each hour, generators are dispatched in merit order as usual, but a
+generator is only offered the demand it can reach: the residual
+demand in its own polygon, plus demand in other polygons reachable
+over links with spare capacity. Power is moved along shortest (fewest
+hop) paths with spare capacity, one augmenting path at a time, as in
+a max-flow algorithm. The capacity reserved for the offer is released
+again if the generator produces less than it was offered. Spilled
+energy can only be stored by storage it can reach in the same way.
+The searches for the shortest paths from each polygon are kept, and
+only taken back as far as a link that fills up or has spare capacity
+again changes them.
+
+A RegionNetwork is a lighter alternative: each region is a copper
+plate and the regions are joined by interconnectors with transfer
+limits (by default, regions.interconnectors):
+
+  context.network = network.RegionNetwork()
+
+These are greedy transport models: they do not reroute earlier flows
+to make room for later generators and they do not model losses.
+"""
+
+from collections import deque
+
+import numpy as np
+
+from nemo import polygons, regions
+
+# Flows and demands smaller than this (in MW) are treated as zero.
+_EPSILON = 1e-6
+
+
+class _Transport():
+    """
+    Base class for transport models.
+
+    Subclasses implement begin(), _route(), _move() and flows().
+    """
+
+    def __init__(self, links, limits):
+        """Construct a transport model with limits on each link."""
+        self.links = links
+        self.limits = np.asarray(limits, dtype=float)
+        # Per-hour state, set by begin().
+        self.residual = None
+        self.capacity = None
+        self.unmet = 0
+
+    def begin(self, demand):
+        """
+        Start a new hour with demand (one value per polygon).
+
+        demand[0] is the demand in polygon 1, and so on.
+        """
+        raise NotImplementedError
+
+    def _route(self, source, limit, dest):
+        """
+        Reserve up to limit MW from polygon source.
+
+        If dest is None, reserve demand reachable from source.
+        Otherwise, reserve transfer capacity from source to dest.
+        Returns the amount reserved and the moves made.
+        """
+        raise NotImplementedError
+
+    def _move(self, path, amount, serve):
+        """Move amount along path, serving demand at the end if serve."""
+        raise NotImplementedError
+
+    def flows(self):
+        """Return the flow on each link (in MW) in the current hour."""
+        raise NotImplementedError
+
+    def linked_p(self, polygon):
+        """Can power from polygon meet demand in other polygons?"""
+        return True
+
+    def supply(self, polygon, limit):
+        """
+        Reserve up to limit MW of demand for a generator in polygon.
+
+        Returns the amount of demand reserved and a list of moves to
+        pass to release() if less is produced.
+        """
+        if self.unmet <= _EPSILON:
+            return 0, []
+        return self._route(polygon, limit, None)
+
+    def transfer(self, source, dest, limit):
+        """
+        Reserve up to limit MW of transfer capacity from source to dest.
+
+        Returns the amount reserved and a list of moves to pass to
+        release() if less is used.
+        """
+        if source == dest:
+            return limit, []
+        return self._route(source, limit, dest)
+
+    def spare(self, source, dest, limit):
+        """
+        Return how much of limit MW could be transferred from source to dest.
+
+        Nothing is reserved: call transfer() for the amount used.
+        """
+        amount, moves = self.transfer(source, dest, limit)
+        self.release(moves, amount)
+        return amount
+
+    def release(self, moves, amount):
+        """Release amount MW of a reservation, most recent moves first."""
+        if amount <= _EPSILON:
+            return
+        for path, moved, serve in reversed(moves):
+            undo = min(amount, moved)
+            self._move(path, -undo, serve)
+            amount -= undo
+            if amount <= _EPSILON:
+                break
+
+
+class _Search():
+    """
+    A breadth first search for the shortest paths from a polygon.
+
+    Sets of polygons are kept as bit masks (bit p for polygon p), one
+    for each level of the search. The search only goes as far as it
+    is asked to (see grow()).
+    """
+
+    def __init__(self, source):
+        """Start a search from polygon source."""
+        self.source = source
+        # levels[i] is the mask of polygons i links from the source
+        self.levels = [1 << source]
+        self.reached = 1 << source
+        self.finished = False
+
+    def grow(self, links):
+        """
+        Add the next level of the search and return it.
+
+        links[p] is the mask of polygons that the links from polygon p
+        with spare capacity lead to.
+        """
+        frontier = self.levels[-1]
+        new = 0
+        while frontier:
+            bit = frontier & -frontier
+            frontier ^= bit
+            new |= links[bit.bit_length() - 1]
+        new &= ~self.reached
+        if new:
+            self.levels.append(new)
+            self.reached |= new
+        else:
+            self.finished = True
+        return new
+
+    def path(self, depth, targets, links, into):
+        """
+        Return the first shortest path to one of targets.
+
+        targets is a mask of polygons depth levels from the source.
+        into[p] is the mask of polygons with links to polygon p with
+        spare capacity. Of the shortest paths, the first when they are
+        compared polygon by polygon is the one a breadth first search
+        that visits polygons in order would find.
+        """
+        levels = self.levels
+        # masks[i] is the polygons at depth i + 1 on a shortest path
+        # to one of targets
+        masks = [targets]
+        for level in range(depth - 1, 0, -1):
+            ahead = masks[-1]
+            behind = 0
+            while ahead:
+                bit = ahead & -ahead
+                ahead ^= bit
+                behind |= into[bit.bit_length() - 1]
+            masks.append(behind & levels[level])
+        node = self.source
+        path = [node]
+        for mask in reversed(masks):
+            mask &= links[node]
+            node = (mask & -mask).bit_length() - 1
+            path.append(node)
+        return path
+
+    def rewind(self, depth):
+        """Return a copy of the search with its first depth levels."""
+        search = _Search(self.source)
+        search.levels = self.levels[:depth]
+        for level in search.levels:
+            search.reached |= level
+        return search
+
+
+class Network(_Transport):
+    """A transmission network between polygons with transfer limits."""
+
+    def __init__(self, limits):
+        """
+        Construct a network from a matrix of transfer limits.
+
+        limits[p1, p2] is the transfer limit (in MW) from polygon p1
+        to polygon p2. Row and column 0 are unused (there is no
+        polygon 0); zero or NaN means there is no link.
+        """
+        limits = np.nan_to_num(np.asarray(limits, dtype=float))
+        if limits.shape != (polygons.NUMPOLYGONS + 1,) * 2:
+            raise ValueError(f'limits must be a {polygons.NUMPOLYGONS + 1}'
+                             ' square matrix')
+        if (limits < 0).any():
+            raise ValueError('transfer limits must be non-negative')
+        limits[0] = limits[:, 0] = 0
+        links = [(int(p1), int(p2)) for p1, p2 in zip(*np.nonzero(limits))]
+        _Transport.__init__(self, links, [limits[link] for link in links])
+        self._adjacency = [{} for _ in range(polygons.NUMPOLYGONS + 1)]
+        # _links[p] is the mask of polygons that the links from
+        # polygon p with spare capacity lead to, and _into[p] is the
+        # mask of polygons with such links to polygon p
+        self._links = [0] * (polygons.NUMPOLYGONS + 1)
+        self._into = [0] * (polygons.NUMPOLYGONS + 1)
+        for (p1, p2), limit in zip(self.links, self.limits):
+            self._adjacency[p1][p2] = float(limit)
+            if limit > _EPSILON:
+                self._links[p1] |= 1 << p2
+                self._into[p2] |= 1 << p1
+        self._start_links = list(self._links)
+        self._start_into = list(self._into)
+        # the mask of polygons with residual demand
+        self._demand = 0
+        # _trees[source] holds the search for the shortest paths from
+        # source (see _Search) until they change. Every hour starts
+        # with the same spare links, so the searches finished before
+        # any link fills up in an hour are kept in _start.
+        self._trees = [None] * (polygons.NUMPOLYGONS + 1)
+        self._start = [None] * (polygons.NUMPOLYGONS + 1)
+        self._changed = False
+        # _paths[source] caches the paths found from source until a
+        # link that fills up or has spare capacity again could change
+        # them (see _path, _fill and _reopen), and
+        # _start_paths those found before then in every hour.
+        self._start_paths = [{} for _ in range(polygons.NUMPOLYGONS + 1)]
+        self._paths = self._start_paths
+
+    def linked_p(self, polygon):
+        """Can power from polygon meet demand in other polygons?"""
+        return len(self._adjacency[polygon]) > 0
+
+    @classmethod
+    def uniform(cls, limit):
+        """Return the proposed network (polygons.net) with equal limits."""
+        limits = np.zeros((polygons.NUMPOLYGONS + 1,) * 2)
+        for p1, neighbours in polygons.net.items():
+            for p2 in neighbours:
+                limits[p1, p2] = limit
+        return cls(limits)
+
+    def begin(self, demand):
+        """
+        Start a new hour with demand (one value per polygon).
+
+        demand[0] is the demand in polygon 1, and so on.
+        """
+        self.residual = [0.0] + [float(d) for d in demand]
+        self.unmet = sum(self.residual)
+        self.capacity = [dict(adj) for adj in self._adjacency]
+        self._links = list(self._start_links)
+        self._into = list(self._start_into)
+        self._demand = 0
+        for polygon, residual in enumerate(self.residual):
+            if residual > _EPSILON:
+                self._demand |= 1 << polygon
+        self._trees = list(self._start)
+        self._changed = False
+        self._paths = self._start_paths
+
+    def _search(self, source):
+        """
+        Start a search for the shortest paths from source.
+
+        Before any link fills up in an hour, the search is finished at
+        once and kept for the next hour.
+        """
+        search = _Search(source)
+        self._trees[source] = search
+        self._paths[source] = {}
+        if not self._changed:
+            while not search.finished:
+                search.grow(self._links)
+            self._start[source] = search
+        return search
+
+    def _path(self, source, dest=None):
+        """
+        Return the shortest path with spare capacity from source.
+
+        The path ends at dest, or if dest is None, at the nearest
+        polygon with residual demand. Returns None if there is no
+        such path.
+        """
+        search = self._trees[source]
+        if search is None:
+            search = self._search(source)
+        if dest is None:
+            targets = self._demand & ~(1 << source)
+        else:
+            targets = 1 << dest
+        levels = search.levels
+        depth = 1
+        while True:
+            if depth == len(levels):
+                if search.finished or not search.grow(self._links):
+                    return None
+            found = levels[depth] & targets
+            if found:
+                break
+            depth += 1
+        paths = self._paths[source]
+        path = paths.get(found)
+        if path is None:
+            path = search.path(depth, found, self._links, self._into)
+            paths[found] = path
+        return path
+
+    def spare(self, source, dest, limit):
+        """
+        Return how much of limit MW could be transferred from source to dest.
+
+        Nothing is reserved: call transfer() for the amount used.
+        """
+        if source == dest:
+            return limit
+        path = self._path(source, dest)
+        if path is None:
+            return 0
+        capacity = self.capacity
+        if all(capacity[p1][p2] >= limit
+               for p1, p2 in zip(path, path[1:])):
+            return limit
+        # Most transfers fit on the first path. If not, the paths that
+        # transfer() would take are found with a copy of the spare
+        # links, so that no link fills up (and empties again) and the
+        # searches are left as they are.
+        left = {}
+        links = into = None
+        bit = 1 << dest
+        total = 0
+        while path is not None:
+            amount = limit - total
+            for p1, p2 in zip(path, path[1:]):
+                amount = min(amount, left.get((p1, p2), capacity[p1][p2]))
+            total += amount
+            if limit - total <= _EPSILON:
+                break
+            if links is None:
+                links, into = list(self._links), list(self._into)
+            for p1, p2 in zip(path, path[1:]):
+                room = left.get((p1, p2), capacity[p1][p2])
+                left[p1, p2] = room - amount
+                if room > _EPSILON >= room - amount:
+                    links[p1] &= ~(1 << p2)
+                    into[p2] &= ~(1 << p1)
+            search = _Search(source)
+            while not search.reached & bit and search.grow(links):
+                pass
+            path = None
+            if search.reached & bit:
+                path = search.path(len(search.levels) - 1, bit, links, into)
+        return total
+
+    def _move(self, path, amount, serve):
+        """Move amount along path, serving demand at the end if serve."""
+        for p1, p2 in zip(path, path[1:]):
+            spare = self.capacity[p1][p2]
+            self.capacity[p1][p2] = spare - amount
+            if spare > _EPSILON >= spare - amount:
+                self._links[p1] &= ~(1 << p2)
+                self._into[p2] &= ~(1 << p1)
+                self._fill(p1, p2)
+            elif spare - amount > _EPSILON >= spare:
+                self._links[p1] |= 1 << p2
+                self._into[p2] |= 1 << p1
+                self._reopen(p1, p2)
+        if serve:
+            dest = path[-1]
+            self.residual[dest] -= amount
+            self.unmet -= amount
+            if self.residual[dest] <= _EPSILON:
+                self._demand &= ~(1 << dest)
+            elif amount < 0:
+                self._demand |= 1 << dest
+
+    def _change(self):
+        """Note that a link has changed and return the paths to update."""
+        if not self._changed:
+            self._changed = True
+            self._paths = list(self._start_paths)
+        return self._paths
+
+    def _fill(self, p1, p2):
+        """
+        Take back the searches that the full link from p1 to p2 changes.
+
+        The link only changes a search if p2 is in the level after p1
+        and no other link to p2 from the level of p1 has spare
+        capacity, in which case p2 and the polygons after it are
+        further from the source than they were. Either way, the paths
+        found from the source may have used the link and are dropped.
+        """
+        paths = self._change()
+        into = self._into[p2]
+        both = 1 << p1 | 1 << p2
+        trees = self._trees
+        for source, search in enumerate(trees):
+            if search is None or search.reached & both != both:
+                continue
+            levels = search.levels
+            depth = 0
+            while not levels[depth] >> p1 & 1:
+                depth += 1
+            if depth + 1 < len(levels) and levels[depth + 1] >> p2 & 1:
+                paths[source] = {}
+                if not into & levels[depth]:
+                    trees[source] = search.rewind(depth + 1)
+
+    def _reopen(self, p1, p2):
+        """
+        Take back the searches that the link from p1 to p2 would change.
+
+        The link only changes a search that has searched from p1
+        without reaching p2 by the level after p1. If p2 is in the
+        level after p1, the search stays as it is, but the paths found
+        from the source may now go over the link and are dropped.
+        """
+        paths = self._change()
+        bit = 1 << p2
+        trees = self._trees
+        for source, search in enumerate(trees):
+            if search is None or not search.reached >> p1 & 1:
+                continue
+            levels = search.levels
+            depth = 0
+            reached = levels[0]
+            while not levels[depth] >> p1 & 1:
+                depth += 1
+                reached |= levels[depth]
+            if depth + 1 < len(levels):
+                if levels[depth + 1] & bit:
+                    paths[source] = {}
+                    continue
+                reached |= levels[depth + 1]
+            elif not search.finished:
+                continue
+            if not reached & bit:
+                paths[source] = {}
+                trees[source] = search.rewind(depth + 1)
+
+    def _route(self, source, limit, dest):
+        """
+        Reserve up to limit MW from polygon source.
+
+        If dest is None, reserve demand reachable from source.
+        Otherwise, reserve transfer capacity from source to dest.
+        Returns the amount reserved and the moves made.
+        """
+        moves = []
+        total = 0
+        serve = dest is None
+        if serve and self.residual[source] > _EPSILON:
+            amount = min(limit, self.residual[source])
+            self._move([source], amount, True)
+            moves.append(([source], amount, True))
+            total += amount
+        while limit - total > _EPSILON:
+            path = self._path(source, dest)
+            if path is None:
+                break
+            amount = limit - total
+            for p1, p2 in zip(path, path[1:]):
+                amount = min(amount, self.capacity[p1][p2])
+            if serve:
+                amount = min(amount, self.residual[path[-1]])
+            self._move(path, amount, serve)
+            moves.append((path, amount, serve))
+            total += amount
+        return total, moves
+
+    def flows(self):
+        """Return the flow on each link (in MW) in the current hour."""
+        return self.limits - np.array([self.capacity[p1][p2]
+                                       for p1, p2 in self.links])
+
+
+class RegionNetwork(_Transport):
+    """
+    Regions joined by interconnectors with transfer limits.
+
+    The residual demand and the spare interconnector capacity are
+    kept in lists indexed by region number and link number. Power is
+    moved along the route with the fewest interconnectors.
+    """
+
+    def __init__(self, limits=None):
+        """
+        Construct a network from a dict of interconnector limits.
+
+        limits maps (region, region) pairs to the transfer limit (in
+        MW) from the first region to the second. The default is
+        regions.interconnectors.
+        """
+        if limits is None:
+            limits = regions.interconnectors
+        for (rgn1, rgn2), limit in limits.items():
+            if rgn1 not in regions.All or rgn2 not in regions.All:
+                raise ValueError(f'unknown region in link {rgn1}-{rgn2}')
+            if rgn1 == rgn2:
+                raise ValueError(f'link from {rgn1} to itself')
+            if limit < 0:
+                raise ValueError('transfer limits must be non-negative')
+        _Transport.__init__(self,
+                            [(rgn1.id, rgn2.id) for rgn1, rgn2 in limits],
+                            list(limits.values()))
+        self._region = polygons.polygon_region.tolist()
+        # _routes[src] lists (dest, links on route) for each region
+        # reachable from src, nearest first, and _route_to[src] maps
+        # each of those regions to its route
+        self._routes = [self._shortest_routes(src, list(limits))
+                        for src in range(regions.NUMREGIONS)]
+        self._route_to = [dict(routes) for routes in self._routes]
+
+    @staticmethod
+    def _shortest_routes(source, links):
+        """Return the routes with the fewest links from region source."""
+        previous = {source: None}
+        routes = [(source, ())]
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for lidx, (rgn1, rgn2) in enumerate(links):
+                if rgn1.num != node or rgn2.num in previous:
+                    continue
+                previous[rgn2.num] = (node, lidx)
+                route = [lidx]
+                while previous[links[route[-1]][0].num] is not None:
+                    route.append(previous[links[route[-1]][0].num][1])
+                routes.append((rgn2.num, tuple(route[::-1])))
+                queue.append(rgn2.num)
+        return routes
+
+    def linked_p(self, polygon):
+        """Can power from polygon meet demand in other polygons?"""
+        return len(self._routes[self._region[polygon]]) > 1
+
+    def begin(self, demand):
+        """
+        Start a new hour with demand (one value per polygon).
+
+        demand[0] is the demand in polygon 1, and so on.
+        """
+        self.residual = np.bincount(self._region[1:], weights=demand,
+                                    minlength=regions.NUMREGIONS).tolist()
+        self.unmet = sum(self.residual)
+        self.capacity = self.limits.tolist()
+
+    def _move(self, path, amount, serve):
+        """Move amount along path, serving demand at the end if serve."""
+        dest, route = path
+        capacity = self.capacity
+        for lidx in route:
+            capacity[lidx] -= amount
+        if serve:
+            self.residual[dest] -= amount
+            self.unmet -= amount
+
+    def spare(self, source, dest, limit):
+        """
+        Return how much of limit MW could be transferred from source to dest.
+
+        Nothing is reserved: call transfer() for the amount used.
+        """
+        if source == dest:
+            return limit
+        route = self._route_to[self._region[source]].get(self._region[dest])
+        if route is None:
+            return 0
+        capacity = self.capacity
+        for lidx in route:
+            limit = min(limit, capacity[lidx])
+        return limit if limit > _EPSILON else 0
+
+    def _route(self, source, limit, dest):
+        """
+        Reserve up to limit MW from polygon source.
+
+        If dest is None, reserve demand reachable from source.
+        Otherwise, reserve transfer capacity from source to dest.
+        Returns the amount reserved and the moves made.
+        """
+        src = self._region[source]
+        if dest is not None:
+            route = self._route_to[src].get(self._region[dest])
+            if route is None:
+                return 0, []
+            amount = self.spare(source, dest, limit)
+            if amount == 0:
+                return 0, []
+            path = (self._region[dest], route)
+            self._move(path, amount, False)
+            return amount, [(path, amount, False)]
+        residual = self.residual
+        if residual[src] >= limit:
+            # local demand takes it all: no interconnectors are used
+            path = (src, ())
+            self._move(path, limit, True)
+            return limit, [(path, limit, True)]
+        moves = []
+        total = 0
+        capacity = self.capacity
+        for path in self._routes[src]:
+            rgn, route = path
+            amount = min(limit - total, residual[rgn])
+            for lidx in route:
+                amount = min(amount, capacity[lidx])
+            if amount <= _EPSILON:
+                continue
+            self._move(path, amount, True)
+            moves.append((path, amount, True))
+            total += amount
+            if limit - total <= _EPSILON:
+                break
+        return total, moves
+
+    def flows(self):
+        """Return the flow on each link (in MW) in the current hour."""
+        return self.limits - self.capacity
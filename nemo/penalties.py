@@ -7,10 +7,13 @@
 
 """Penalty functions for the optimisation."""
 
-from nemo import generators
+import numpy as np
+
+from nemo import generators, regions
 
 _reason_labels = ['unserved', 'emissions', 'fossil', 'bioenergy',
-                  'hydro', 'reserves', 'min-regional-gen']
+                  'hydro', 'reserves', 'min-regional-gen',
+                  'unserved-events', 'unserved-duration']
 
 reasons = {}
 for i, label in enumerate(_reason_labels):
@@ -28,6 +31,25 @@ def unserved(ctx, _):
     return pow(use, 3), reason
 
 
+def unserved_events(ctx, args):
+    """Penalty: number of unserved energy events per year."""
+    events = ctx.unserved_events()
+    excess = len(events) - int(args.max_unserved_events * ctx.years())
+    if excess <= 0:
+        return 0, 0
+    # the energy of the smallest events (the easiest to eliminate)
+    energy = np.sort(events.energy)[:excess].sum()
+    return pow(energy, 3), reasons['unserved-events']
+
+
+def unserved_duration(ctx, args):
+    """Penalty: unserved energy events longer than the limit (hours)."""
+    events = ctx.unserved_events()
+    energy = events.energy[events.durations > args.max_unserved_hours].sum()
+    reason = reasons['unserved-duration'] if energy > 0 else 0
+    return pow(energy, 3), reason
+
+
 def _calculate_reserve(gen, time):
     """Calculate headroom for each generator.
 
@@ -59,13 +81,12 @@ def reserves(ctx, args):
     return pen, reas
 
 
-def _regional_generation(region, gens):
-    """Sum generation in a given region."""
-    regional_generation = 0
-    for gen in gens:
-        if gen.region() is region:
-            regional_generation += sum(gen.series_power.values())
-    return regional_generation
+def _regional_generation(ctx):
+    """Sum generation in each region (indexed by region number)."""
+    totals = np.array([sum(gen.series_power.values())
+                       for gen in ctx.generators])
+    return np.bincount(ctx.generator_region, weights=totals,
+                       minlength=regions.NUMREGIONS)
 
 
 def _regional_demand(region, demand):
@@ -79,9 +100,10 @@ def _regional_demand(region, demand):
 def min_regional(ctx, _):
     """Penalty: minimum share of regional generation."""
     shortfall = 0
+    generation = _regional_generation(ctx)
     for rgn in ctx.regions:
         regional_demand = _regional_demand(rgn, ctx.demand)
-        regional_generation = _regional_generation(rgn, ctx.generators)
+        regional_generation = generation[rgn]
         min_regional_generation = regional_demand * ctx.min_regional_generation
         shortfall += max(0, min_regional_generation - regional_generation)
 
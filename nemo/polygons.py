@@ -7,11 +7,9 @@
 
 """Support code for the 43 polygons of the AEMO study."""
 
-from math import atan2, cos, radians, sin, sqrt
-
 import numpy as np
 
-from nemo import regions
+from nemo import configfile, regions
 
 # The fraction of a region's load in each polygon.
 regions.nsw.polygons = {21: 0, 22: 0, 23: 0, 24: .05, 28: 0, 29: 0,
@@ -383,6 +381,11 @@ for rgn in [regions.nsw, regions.qld, regions.sa, regions.tas, regions.vic]:
     for poly in rgn.polygons:
         _region_table[poly] = rgn
 
+# Region number of each polygon (-1 for the unused polygon 0).
+polygon_region = np.full(NUMPOLYGONS + 1, -1)
+for poly, rgn in _region_table.items():
+    polygon_region[poly] = rgn.num
+
 
 def region(polygon):
     """
@@ -428,22 +431,67 @@ rooftop_limit = [None, 2.3, 0.1, 0.1, 3.5, 0, 0.1, 1.7, 0.1, 0, 0, 2.3,
 offshore_wind_limit = {31: 10, 36: 10, 38: 10, 40: 10}
 
 
-def _centroid(vertices):
-    """Find the centroid of a polygon."""
+def polygon_centroids(polys):
+    """
+    Find the centroids of a list of closed polygons.
+
+    Each polygon is a sequence of (longitude, latitude) vertices.
+    Returns an array of (latitude, longitude) points, one per polygon,
+    for use with haversine().
+    """
     # pylint: disable=invalid-name
-    # Ensure the polygon is closed
-    assert vertices[0] == vertices[-1]
-    thesum = 0
-    vsum = (0, 0)
-    for i in range(len(vertices) - 1):
-        v1 = vertices[i]
-        v2 = vertices[i + 1]
-        cross = v1[0] * v2[1] - v1[1] * v2[0]
-        thesum += cross
-        vsum = (((v1[0] + v2[0]) * cross) + vsum[0],
-                ((v1[1] + v2[1]) * cross) + vsum[1])
-        z = 1. / (3. * thesum)
-    return (vsum[0] * z, vsum[1] * z)
+    verts = [np.asarray(vertices, dtype=float) for vertices in polys]
+    # Ensure the polygons are closed
+    assert all((v[0] == v[-1]).all() for v in verts)
+    # The edges of all polygons, end to end
+    v1 = np.concatenate([v[:-1] for v in verts])
+    v2 = np.concatenate([v[1:] for v in verts])
+    first = np.cumsum([0] + [len(v) - 1 for v in verts[:-1]])
+    cross = v1[:, 0] * v2[:, 1] - v1[:, 1] * v2[:, 0]
+    z = 1. / (3. * np.add.reduceat(cross, first))
+    centroids_ = np.add.reduceat((v1 + v2) * cross[:, np.newaxis], first) * \
+        z[:, np.newaxis]
+    return centroids_[:, ::-1]
+
+
+def haversine(points1, points2):
+    """
+    Return the great circle distances (in km) between two sets of points.
+
+    Points are (latitude, longitude) pairs in degrees along the last
+    axis, and the two sets are broadcast against each other. For
+    example, for all pairs of points in an (N, 2) array:
+
+    >>> points = np.array([[-33.87, 151.21], [-37.81, 144.96]])
+    >>> haversine(points[:, np.newaxis], points).round()
+    array([[  0., 713.],
+           [713.,   0.]])
+    """
+    # Code adapted from Chris Veness
+    # pylint: disable=invalid-name
+    radius = 6371  # km
+    points1 = np.radians(points1)
+    points2 = np.radians(points2)
+    lat1, lat2 = points1[..., 0], points2[..., 0]
+    dlat = lat1 - lat2
+    dlon = points1[..., 1] - points2[..., 1]
+    a = np.sin(dlat / 2) ** 2 + \
+        np.sin(dlon / 2) ** 2 * np.cos(lat1) * np.cos(lat2)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return radius * c
+
+
+# Centroids of the polygons as (latitude, longitude) pairs, with a
+# row of NaNs for the unused polygon 0.
+centroid_array = np.full((NUMPOLYGONS + 1, 2), np.nan)
+centroid_array[1:] = polygon_centroids([_polygons[poly] for poly in
+                                        range(1, NUMPOLYGONS + 1)])
+centroids = {poly: tuple(centroid_array[poly].tolist())
+             for poly in range(1, NUMPOLYGONS + 1)}
+
+# Distances (in whole km) between polygon centroids.
+distances = np.trunc(haversine(centroid_array[:, np.newaxis],
+                               centroid_array))
 
 
 def dist(poly1, poly2):
@@ -456,25 +504,8 @@ def dist(poly1, poly2):
     >>> dist(1,43) == distances[1,43]
     True
     """
-    # Code adapted from Chris Veness
-    # pylint: disable=invalid-name
-    radius = 6371  # km
-    point1 = centroids[poly1]
-    point2 = centroids[poly2]
-    dlat = radians(point1[0] - point2[0])
-    dlon = radians(point1[1] - point2[1])
-    lat1 = radians(point1[0])
-    lat2 = radians(point2[0])
-    a = sin(dlat / 2) ** 2 + \
-        sin(dlon / 2) ** 2 * cos(lat1) * cos(lat2)
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return int(radius * c)
-
-
-centroids = {}
-for _i, _vertices in _polygons.items():
-    _lon, _lat = _centroid(_vertices)
-    centroids[_i] = (_lat, _lon)
+    return int(distances[poly1, poly2])
+
 
 # A proposed transmission network.
 
@@ -517,7 +548,7 @@ net = {
     23: {16: dist(23, 16), 22: dist(23, 22), 24: dist(23, 24),
          30: dist(23, 30)},
     24: {16: dist(24, 16), 17: dist(24, 17), 23: dist(24, 23),
-         31: dist(23, 31)},
+         31: dist(24, 31)},
     25: {18: dist(25, 18), 26: dist(25, 26)},
     26: {19: dist(26, 19), 25: dist(26, 25), 27: dist(26, 27)},
     27: {
@@ -570,15 +601,6 @@ net = {
     43: {41: dist(43, 41), 42: dist(43, 42)},
 }
 
-distances = np.zeros((NUMPOLYGONS + 1, NUMPOLYGONS + 1))
-# mark row 0 and column 0 as unused (there is no polygon #0)
-distances[0] = np.nan
-distances[::, 0] = np.nan
-rows, cols = NUMPOLYGONS + 1, NUMPOLYGONS + 1
-for p1 in range(1, rows):
-    for p2 in range(1, cols):
-        distances[p1, p2] = dist(p1, p2)
-
 existing_net = np.zeros((NUMPOLYGONS + 1, NUMPOLYGONS + 1))
 # mark row 0 and column 0 as unused (there is no polygon #0)
 existing_net[0] = np.nan
@@ -597,3 +619,9 @@ for (p1, p2, limit) in \
     assert p1 in list(net[p2].keys()), (p2, p1)
     assert p2 in list(net[p1].keys()), (p1, p2)
     existing_net[p1, p2] = limit
+
+# Install the topology named in the configuration file, if any.
+if configfile.has_option_p('topology', 'file'):
+    # pylint: disable=cyclic-import,import-outside-toplevel
+    from nemo import topology
+    topology.install(topology.load(configfile.get('topology', 'file')))
@@ -0,0 +1,79 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Lightweight instrumentation of the simulation engine.
+
+A general purpose profiler adds overhead to every function call, which
+distorts the timing of the tight dispatch loop. Instead, setting the
+profile attribute of a context to a Profile object makes the
+simulation record the cumulative time and number of calls to step()
+and store() for each generator class, the time spent storing spilled
+energy, and the time spent in each phase of a run:
+
+>>> profile = Profile()
+>>> with profile.phase('setup'):
+...     pass
+>>> profile.phases['setup'] >= 0
+True
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class Profile():
+    """Cumulative timings for one or more simulation runs."""
+
+    def __init__(self):
+        """Construct an empty profile."""
+        self.runs = 0
+        # phase name -> seconds
+        self.phases = {}
+        # (method, class name) -> [seconds, calls]
+        self.calls = {}
+
+    def reset(self):
+        """Discard all timings."""
+        self.runs = 0
+        self.phases.clear()
+        self.calls.clear()
+
+    def add_phase(self, name, elapsed):
+        """Record elapsed seconds spent in the named phase."""
+        self.phases[name] = self.phases.get(name, 0) + elapsed
+
+    @contextmanager
+    def phase(self, name):
+        """Accumulate the time spent running a block as a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add(self, method, obj, elapsed):
+        """Record a call to method on obj that took elapsed seconds."""
+        key = (method, type(obj).__name__)
+        try:
+            entry = self.calls[key]
+        except KeyError:
+            entry = self.calls[key] = [0, 0]
+        entry[0] += elapsed
+        entry[1] += 1
+
+    def __str__(self):
+        """Return a human-readable report."""
+        string = f'Profile ({self.runs} runs):\n'
+        string += '\tPhases: ' + ', '.join(f'{name} {secs:.3f}s'
+                                           for name, secs in
+                                           self.phases.items())
+        for (method, clsname), (secs, calls) in \
+                sorted(self.calls.items(), key=lambda item: -item[1][0]):
+            string += f'\n\t{method} {clsname}: {secs:.3f}s ' + \
+                f'({calls} calls, {secs / calls * 1e6:.1f} us/call)'
+        return string
@@ -48,3 +48,11 @@ tas = Region(4, 'TAS1', 'Tasmania')
 vic = Region(5, 'VIC1', 'Victoria')
 All = [nsw, qld, sa, snowy, tas, vic]
 NUMREGIONS = len(All)
+
+# Approximate nominal transfer limits (MW) of the interconnectors
+# between regions, combining parallel interconnectors (eg, QNI and
+# Terranora) between the same pair of regions.
+interconnectors = {(qld, nsw): 1185, (nsw, qld): 810,
+                   (vic, nsw): 1700, (nsw, vic): 1350,
+                   (vic, sa): 870, (sa, vic): 850,
+                   (tas, vic): 594, (vic, tas): 478}
@@ -0,0 +1,80 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Reliability analysis of simulation results.
+
+An unserved energy event is a run of consecutive hours with unserved
+energy. find_events() locates the events in an unserved energy series
+(as kept in context.unserved) using array operations only:
+
+>>> import pandas as pd
+>>> hours = pd.to_datetime(['2020-01-01 01:00', '2020-01-01 02:00',
+...                         '2020-01-01 05:00'])
+>>> events = find_events(pd.Series([10., 20., 5.], index=hours))
+>>> len(events)
+2
+>>> events.durations.tolist()
+[2, 1]
+>>> events.energy.tolist()
+[30.0, 5.0]
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Events():
+    """Unserved energy events."""
+
+    def __init__(self, starts, durations, peaks, energy):
+        """
+        Construct a set of events.
+
+        starts are the timestamps of the first hour of each event,
+        durations are in hours, peaks are the largest shortfall in
+        each event (MW) and energy is the unserved energy of each
+        event (MWh).
+        """
+        self.starts = starts
+        self.durations = durations
+        self.peaks = peaks
+        self.energy = energy
+
+    def __len__(self):
+        """Return the number of events."""
+        return len(self.durations)
+
+    def max_duration(self):
+        """Return the duration of the longest event (in hours)."""
+        return self.durations.max() if len(self) > 0 else 0
+
+    def __repr__(self):
+        """Return a representation of the events."""
+        return f'Events({len(self)} events, ' + \
+            f'{self.energy.sum():.1f} MWh unserved)'
+
+
+def find_events(unserved):
+    """
+    Return the events in an hourly unserved energy series.
+
+    unserved holds the shortfall (in MW) for each hour with unserved
+    energy, indexed by timestamp.
+    """
+    if len(unserved) == 0:
+        return Events(pd.DatetimeIndex([]), np.zeros(0, dtype=int),
+                      np.zeros(0), np.zeros(0))
+    values = np.asarray(unserved.values, dtype=float)
+    times = unserved.index.values
+    # an event starts wherever the gap to the previous hour is not 1 h
+    gaps = np.diff(times) != np.timedelta64(1, 'h')
+    first = np.concatenate(([0], np.flatnonzero(gaps) + 1))
+    durations = np.diff(np.append(first, len(values)))
+    return Events(unserved.index[first], durations,
+                  np.maximum.reduceat(values, first),
+                  np.add.reduceat(values, first))
@@ -10,13 +10,11 @@
 
 """Supply side scenarios."""
 
-from nemo import configfile, regions
+from nemo import configfile, polygons, regions
 from nemo.generators import (CCGT, CCGT_CCS, CST, OCGT, Biofuel, Black_Coal,
                              CentralReceiver, Coal_CCS, DemandResponse, Hydro,
                              PumpedHydroPump, PumpedHydroTurbine, PV1Axis, Behind_Meter_PV,
                              Wind, WindOffshore, Battery, BatteryLoad)
-from nemo.polygons import (WILDCARD, cst_limit, offshore_wind_limit, pv_limit, rooftop_limit,
-                           wind_limit)
 from nemo.storage import (PumpedHydroStorage, BatteryStorage)
 from nemo.types import UnreachableError
 
@@ -35,9 +33,9 @@ class DualSetter:
 
 def _demand_response():
     """Return a list of DR 'generators'."""
-    dr1 = DemandResponse(WILDCARD, 1000, 100, "DR100")
-    dr2 = DemandResponse(WILDCARD, 1000, 500, "DR500")
-    dr3 = DemandResponse(WILDCARD, 1000, 1000, "DR1000")
+    dr1 = DemandResponse(polygons.WILDCARD, 1000, 100, "DR100")
+    dr2 = DemandResponse(polygons.WILDCARD, 1000, 500, "DR500")
+    dr3 = DemandResponse(polygons.WILDCARD, 1000, 1000, "DR1000")
     return [dr1, dr2, dr3]
 
 
@@ -80,33 +78,33 @@ def _hydro():
 def replacement(context):
     """Replace the current NEM fleet, more or less."""
     context.generators = \
-        [Black_Coal(WILDCARD, 0)] + _pumped_hydro() + _hydro() + \
-        [OCGT(WILDCARD, 0)]
+        [Black_Coal(polygons.WILDCARD, 0)] + _pumped_hydro() + _hydro() + \
+        [OCGT(polygons.WILDCARD, 0)]
 
 
 def _one_ccgt(context):
     """One CCGT only."""
-    context.generators = [CCGT(WILDCARD, 0)]
+    context.generators = [CCGT(polygons.WILDCARD, 0)]
 
 
 def ccgt(context):
     """All gas scenario."""
-    context.generators = [CCGT(WILDCARD, 0)] + _pumped_hydro() + \
-        _hydro() + [OCGT(WILDCARD, 0)]
+    context.generators = [CCGT(polygons.WILDCARD, 0)] + _pumped_hydro() + \
+        _hydro() + [OCGT(polygons.WILDCARD, 0)]
 
 
 def ccgt_ccs(context):
     """CCGT CCS scenario."""
     # pylint: disable=redefined-outer-name
-    ccgt = CCGT_CCS(WILDCARD, 0)
-    ocgt = OCGT(WILDCARD, 0)
+    ccgt = CCGT_CCS(polygons.WILDCARD, 0)
+    ocgt = OCGT(polygons.WILDCARD, 0)
     context.generators = [ccgt] + _pumped_hydro() + _hydro() + [ocgt]
 
 
 def coal_ccs(context):
     """Coal CCS scenario."""
-    coal = Coal_CCS(WILDCARD, 0)
-    ocgt = OCGT(WILDCARD, 0)
+    coal = Coal_CCS(polygons.WILDCARD, 0)
+    ocgt = OCGT(polygons.WILDCARD, 0)
     context.generators = [coal] + _pumped_hydro() + _hydro() + [ocgt]
 
 
@@ -121,17 +119,17 @@ def _every_poly(gentype):
         elif gentype == PV1Axis:
             cfg = configfile.get('generation', 'pv1axis-trace')
             result.append(gentype(poly, 0, cfg, poly - 1,
-                                  build_limit=pv_limit[poly],
+                                  build_limit=polygons.pv_limit[poly],
                                   label=f'polygon {poly} PV'))
         elif gentype == Behind_Meter_PV:
             cfg = configfile.get('generation', 'rooftop-pv-trace')
             result.append(gentype(poly, 0, cfg, poly - 1,
-                                  build_limit=rooftop_limit[poly],
+                                  build_limit=polygons.rooftop_limit[poly],
                                   label=f'polygon {poly} rooftop'))
         elif gentype == Wind:
             cfg = configfile.get('generation', 'wind-trace')
             result.append(gentype(poly, 0, cfg, poly - 1,
-                                  build_limit=wind_limit[poly],
+                                  build_limit=polygons.wind_limit[poly],
                                   label=f'polygon {poly} wind'))
     return result
 
@@ -150,7 +148,7 @@ def re100(context):
             cfg = configfile.get('generation', 'offshore-wind-trace')
             for column, poly in enumerate([31, 36, 38, 40]):
                 result.append(g(poly, 0, cfg, column,
-                                build_limit=offshore_wind_limit[poly],
+                                build_limit=polygons.offshore_wind_limit[poly],
                                 label=f'polygon {poly} offshore'))
         elif g in [Biofuel, PV1Axis, CentralReceiver, Wind]:
             result += _every_poly(g)
@@ -565,15 +563,15 @@ def _one_per_poly(region):
     for poly in region.polygons:
         wind.append(Wind(poly, 0, wind_cfg,
                          poly - 1,
-                         build_limit=wind_limit[poly],
+                         build_limit=polygons.wind_limit[poly],
                          label=f'poly {poly} wind'))
         pv.append(PV1Axis(poly, 0, pv_cfg,
                           poly - 1,
-                          build_limit=pv_limit[poly],
+                          build_limit=polygons.pv_limit[poly],
                           label=f'poly {poly} PV'))
         cst.append(CentralReceiver(poly, 0, 2.5, 8, cst_cfg,
                                    poly - 1,
-                                   build_limit=cst_limit[poly],
+                                   build_limit=polygons.cst_limit[poly],
                                    label=f'poly {poly} CST'))
     return wind, pv, cst
 
@@ -583,26 +581,26 @@ def re100_one_region(context, region):
     re100(context)
     context.regions = [region]
     wind, pv, cst = _one_per_poly(region)
+    regional = [context.generators[gidx]
+                for gidx in context.region_generators[region]]
     newlist = wind
     newlist += pv
-    newlist += [g for g in context.generators if
-                isinstance(g, Hydro) and g.region() is region]
+    newlist += [g for g in regional if isinstance(g, Hydro)]
     newlist += cst
-    newlist += [g for g in context.generators if
-                isinstance(g, Biofuel) and g.region() is region]
+    newlist += [g for g in regional if isinstance(g, Biofuel)]
     context.generators = newlist
 
 
 def re_plus_ccs(context):
     """Mostly renewables with fossil and CCS augmentation."""
     re100(context)
-    coal = Black_Coal(WILDCARD, 0)
+    coal = Black_Coal(polygons.WILDCARD, 0)
     # pylint: disable=redefined-outer-name
-    coal_ccs = Coal_CCS(WILDCARD, 0)
+    coal_ccs = Coal_CCS(polygons.WILDCARD, 0)
     # pylint: disable=redefined-outer-name
-    ccgt = CCGT(WILDCARD, 0)
-    ccgt_ccs = CCGT_CCS(WILDCARD, 0)
-    ocgt = OCGT(WILDCARD, 0)
+    ccgt = CCGT(polygons.WILDCARD, 0)
+    ccgt_ccs = CCGT_CCS(polygons.WILDCARD, 0)
+    ocgt = OCGT(polygons.WILDCARD, 0)
     context.generators = [coal, coal_ccs, ccgt, ccgt_ccs] + \
         context.generators[:-4] + [ocgt]
 
@@ -611,8 +609,8 @@ def re_plus_fossil(context):
     """Mostly renewables with some fossil augmentation."""
     re100(context)
     context.generators = \
-        [Black_Coal(WILDCARD, 0), CCGT(WILDCARD, 0)] + \
-        context.generators[:-4] + [OCGT(WILDCARD, 0)]
+        [Black_Coal(polygons.WILDCARD, 0), CCGT(polygons.WILDCARD, 0)] + \
+        context.generators[:-4] + [OCGT(polygons.WILDCARD, 0)]
 
 
 def re100_dsp(context):
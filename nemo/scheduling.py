@@ -0,0 +1,152 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Cost-aware dispatch of evaluations to a process pool.
+
+Pool.map splits its input into a few large chunks up front. When the
+cost of evaluating candidates varies widely (eg, candidates with large
+storage fleets spend much longer storing spilled energy), one slow
+chunk can leave the other workers idle at the end of a generation.
+
+The Scheduler instead hands out candidates in small chunks with
+Pool.imap_unordered, so idle workers take the next chunk as soon as
+they finish. Candidates that look expensive are dispatched first so
+that the stragglers are not left until last. The Scheduler also
+measures how busy the workers were during each call to map() and
+collects any telemetry recorded by the workers.
+"""
+
+import os
+import statistics
+import time
+
+from nemo import generators, telemetry
+
+
+def _timed_call(task):
+    """Call func(item) and return the result with timing details."""
+    func, index, item = task
+    start = time.perf_counter()
+    result = func(item)
+    elapsed = time.perf_counter() - start
+    return index, result, elapsed, os.getpid(), telemetry.collect(), \
+        telemetry.max_rss()
+
+
+def storage_key(gens):
+    """
+    Return a function estimating the relative cost of a candidate.
+
+    Storage (including batteries) is the most expensive part of a
+    simulation, so the estimate is the total capacity of the
+    storage-capable generators in the candidate.
+    """
+    weights = []
+    for gen in gens:
+        weight = 1 if isinstance(gen, (generators.Storage,
+                                       generators.Battery)) else 0
+        weights += [weight] * len(gen.setters)
+
+    def key(individual):
+        return sum(max(gene, 0) for gene, weight in zip(individual, weights)
+                   if weight)
+    return key
+
+
+class Utilisation():
+    """Worker utilisation statistics for one call to map()."""
+
+    def __init__(self, wall, durations, busy, workers, timings=None,
+                 rss=None):
+        """
+        Construct a utilisation record.
+
+        wall is the elapsed time of the map() call, durations is a
+        list of task durations and busy is a dict mapping worker PIDs
+        to their total busy time (all in seconds). timings is a list
+        of the telemetry phase times for each task and rss is a dict
+        mapping worker PIDs to their peak resident set size.
+        """
+        self.wall = wall
+        self.durations = durations
+        self.busy = busy
+        self.workers = workers
+        self.timings = timings if timings is not None else []
+        self.rss = rss if rss is not None else {}
+
+    def utilisation(self):
+        """Return the fraction of available worker time spent busy."""
+        if self.wall == 0 or self.workers == 0:
+            return 0
+        return sum(self.busy.values()) / (self.wall * self.workers)
+
+    def __str__(self):
+        """Return a one-line summary."""
+        if not self.durations:
+            return 'utilisation: no tasks'
+        busiest = max(self.busy.values())
+        idlest = min(self.busy.values()) if len(self.busy) == self.workers \
+            else 0
+        return f'utilisation: {self.utilisation():.0%} of ' + \
+            f'{self.workers} workers over {self.wall:.2f}s, ' + \
+            f'tasks {statistics.median(self.durations):.2f}s median ' + \
+            f'{max(self.durations):.2f}s max, ' + \
+            f'worker busy {idlest:.2f}s-{busiest:.2f}s'
+
+
+class Scheduler():
+    """Dispatch evaluations to a pool in small, cost-ordered chunks."""
+
+    def __init__(self, pool, workers, chunksize=1, key=None, report=None):
+        """
+        Construct a scheduler for pool (which has workers processes).
+
+        key (if given) estimates the cost of evaluating an item;
+        higher cost items are dispatched first. report (if given) is
+        called with a Utilisation object after each call to map().
+        """
+        assert chunksize > 0
+        self.pool = pool
+        self.workers = workers
+        self.chunksize = chunksize
+        self.key = key
+        self.report = report
+        self.history = []
+
+    def order(self, items):
+        """Return the indices of items in dispatch order."""
+        indices = list(range(len(items)))
+        if self.key is not None:
+            indices.sort(key=lambda i: self.key(items[i]), reverse=True)
+        return indices
+
+    def map(self, func, iterable):
+        """
+        Apply func to every item of iterable using the pool.
+
+        Like Pool.map, the results are returned in order.
+        """
+        items = list(iterable)
+        results = [None] * len(items)
+        durations, timings = [], []
+        busy, rss = {}, {}
+        tasks = [(func, i, items[i]) for i in self.order(items)]
+        start = time.perf_counter()
+        for index, result, elapsed, pid, phases, maxrss in \
+                self.pool.imap_unordered(_timed_call, tasks, self.chunksize):
+            results[index] = result
+            durations.append(elapsed)
+            timings.append(phases)
+            busy[pid] = busy.get(pid, 0) + elapsed
+            rss[pid] = maxrss
+        stats = Utilisation(time.perf_counter() - start, durations, busy,
+                            self.workers, timings, rss)
+        self.history.append(stats)
+        if self.report is not None:
+            self.report(stats)
+        return results
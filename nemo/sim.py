@@ -7,15 +7,155 @@
 
 """The core of the simulation engine."""
 
+import os
+from contextlib import nullcontext
 from math import isclose
+from time import perf_counter
 
 import numpy as np
 import pandas as pd
 
-from nemo import regions
-
-
-def _sim(context, date_range):
+from nemo import export, fleet, regions
+
+
+def _phase(context, name):
+    """Return a context manager that times a phase when profiling."""
+    if context.profile is None:
+        return nullcontext()
+    return context.profile.phase(name)
+
+
+def _matrix(context, name, shape):
+    """
+    Return a matrix of zeros.
+
+    If context.scratch is set, the matrix is memory-mapped to the file
+    name.npy in that directory.
+    """
+    if context.scratch is None:
+        return np.zeros(shape)
+    os.makedirs(context.scratch, exist_ok=True)
+    filename = os.path.join(context.scratch, f'{name}.npy')
+    # Remove any file from an earlier run first so that its data
+    # frames (which may still map that file) are left intact.
+    if os.path.exists(filename):
+        os.remove(filename)
+    return np.lib.format.open_memmap(filename, mode='w+', dtype=float,
+                                     shape=shape)
+
+
+def _sim(context, date_range, sink=None):
+    with _phase(context, 'setup'):
+        gens, demand_copy, residual_demand = _setup(context)
+        if sink is None:
+            shape = (len(date_range), len(context.generators))
+            generation = _matrix(context, 'generation', shape)
+            spill = _matrix(context, 'spill', shape)
+        else:
+            # Dispatch into the buffers of the sink, one chunk at a
+            # time, keeping only the hourly totals of the whole run.
+            sink.open(context, date_range, gens)
+            generation, spill = sink.generation, sink.spill
+            totals = np.zeros((len(date_range), 2))
+            chunk_start = 0
+
+    network = context.network
+    if network is not None:
+        flows = np.zeros((len(date_range), len(network.links)))
+
+    prefix = 0
+    dispatch_demand = residual_demand
+    units, columns, fleets = gens, None, []
+    if not context.verbose and sink is None:
+        units, columns, fleets = fleet.assemble(gens, generation,
+                                                network is not None)
+        context.storages = [u for u in units if u.storage_p]
+        with _phase(context, 'prepass'):
+            if network is None:
+                prefix, dispatch_demand, async_demand = \
+                    _prepass(context, units, generation, spill,
+                             residual_demand[:len(date_range)])
+            else:
+                prefix, first, dispatch_demand, async_demand, potential = \
+                    _prepass_network(context, units, generation, spill,
+                                     demand_copy[:len(date_range)])
+
+    with _phase(context, 'hour loop'):
+        for hour in range(len(date_range)):
+            hour_demand = demand_copy[hour]
+            residual_hour_demand = dispatch_demand[hour]
+            row = hour if sink is None else hour - chunk_start
+
+            if context.verbose:
+                print('STEP:', date_range[hour])
+                print('DEMAND:', {a: round(b, 2) for a, b in
+                                  enumerate(hour_demand)})
+
+            if network is None:
+                if prefix:
+                    _store_prepass_spills(context, hour, units, prefix,
+                                          spill[row])
+                    _dispatch(context, hour, residual_hour_demand, units,
+                              generation[row], spill[row], prefix,
+                              async_demand[hour], columns)
+                else:
+                    _dispatch(context, hour, residual_hour_demand, units,
+                              generation[row], spill[row], columns=columns)
+            elif prefix:
+                network.begin(dispatch_demand[hour])
+                _store_prepass_spills(context, hour, units, first[hour],
+                                      spill[row])
+                _dispatch_network(context, hour, units, generation[row],
+                                  spill[row], first[hour],
+                                  float(async_demand[hour]),
+                                  potential[hour].tolist(), columns)
+                flows[hour] = network.flows()
+            else:
+                network.begin(hour_demand)
+                _dispatch_network(context, hour, units, generation[row],
+                                  spill[row], columns=columns)
+                flows[hour] = network.flows()
+
+            if context.verbose:
+                print('ENDSTEP:', date_range[hour])
+
+            if sink is not None and \
+               (row + 1 == sink.chunksize or hour + 1 == len(date_range)):
+                with _phase(context, 'sink'):
+                    totals[chunk_start:hour + 1, 0] = \
+                        generation[:row + 1].sum(axis=1)
+                    totals[chunk_start:hour + 1, 1] = \
+                        spill[:row + 1].sum(axis=1)
+                    sink.write(chunk_start, hour + 1, residual_demand)
+                chunk_start = hour + 1
+
+    for batteries in fleets:
+        batteries.finish()
+
+    with _phase(context, 'dataframes'):
+        # Change the numpy arrays to dataframes for human consumption
+        if sink is not None:
+            generation, spill = totals[:, :1], totals[:, 1:]
+        context.generation = pd.DataFrame(index=date_range, data=generation,
+                                          copy=False)
+        context.spill = pd.DataFrame(index=date_range, data=spill,
+                                     copy=False)
+        if network is not None:
+            context.flows = pd.DataFrame(
+                index=date_range, data=flows,
+                columns=pd.MultiIndex.from_tuples(network.links,
+                                                  names=['from', 'to']))
+        if context.scratch is not None and sink is None:
+            for name, attr in [('charge', 'series_charge'),
+                               ('soc', 'series_soc')]:
+                matrix = _matrix(context, name, generation.shape)
+                export.storage_array(gens, attr, out=matrix)
+                matrix.flush()
+
+
+def _setup(context):
+    """Prepare the context and the demand for a simulation run."""
+    # pylint: disable=unused-argument
     # reset generator internal state
     for gen in context.generators:
         gen.reset()
@@ -23,12 +163,9 @@ def _sim(context, date_range):
     # clear possible cached value
     context.storages = None
 
-    timesteps = len(date_range)
-    generation = np.zeros((timesteps, len(context.generators)))
-    spill = np.zeros((timesteps, len(context.generators)))
-
     # Extract generators in the regions of interest.
-    gens = [g for g in context.generators if g.region() in context.regions]
+    context.index_regions()
+    gens = [context.generators[gidx] for gidx in context.dispatched()]
 
     # Zero out polygon demands we don't care about.
     for rgn in [r for r in regions.All if r not in context.regions]:
@@ -38,24 +175,132 @@ def _sim(context, date_range):
     # We are free to scribble all over demand_copy. Use ndarray for speed.
     demand_copy = context.demand.copy().values
     residual_demand = demand_copy.sum(axis=1)
+    return gens, demand_copy, residual_demand
 
-    for hour in range(timesteps):
-        hour_demand = demand_copy[hour]
-        residual_hour_demand = residual_demand[hour]
 
-        if context.verbose:
-            print('STEP:', date_range[hour])
-            print('DEMAND:', {a: round(b, 2) for a, b in
-                              enumerate(hour_demand)})
+def _prepass(context, gens, generation, spill, residual_demand):
+    """
+    Dispatch the leading vectorised generators over all hours at once.
 
-        _dispatch(context, hour, residual_hour_demand, gens, generation, spill)
+    The generators at the top of the merit order see the same demand
+    each hour whatever comes after them, so if they can be stepped
+    over all hours at once (see Generator.vectorised_p), they are
+    dispatched before the hour loop. Their spills are stored in the
+    hour loop to keep the order in which storage is charged.
 
-        if context.verbose:
-            print('ENDSTEP:', date_range[hour])
+    Returns the number of generators dispatched and the residual
+    demand and non-synchronous demand left for the rest.
+    """
+    prefix = 0
+    async_demand = residual_demand * context.nsp_limit
+    profile = context.profile
 
-    # Change the numpy arrays to dataframes for human consumption
-    context.generation = pd.DataFrame(index=date_range, data=generation)
-    context.spill = pd.DataFrame(index=date_range, data=spill)
+    for gidx, generator in enumerate(gens):
+        if not generator.vectorised_p:
+            break
+        if generator.synchronous_p:
+            demand = residual_demand
+        else:
+            demand = np.where(async_demand < residual_demand, async_demand,
+                              residual_demand)
+        if profile is None:
+            gen, spl = generator.step_all(demand)
+        else:
+            start = perf_counter()
+            gen, spl = generator.step_all(demand)
+            profile.add('step_all', generator, perf_counter() - start)
+        generation[:, gidx] = gen
+        spill[:, gidx] = spl
+
+        if not generator.synchronous_p:
+            async_demand = async_demand - gen
+            async_demand = np.where(async_demand > 0, async_demand, 0)
+        residual_demand = residual_demand - gen
+        residual_demand = np.where(residual_demand > 0, residual_demand, 0)
+        prefix += 1
+
+    return prefix, residual_demand, async_demand
+
+
+def _prepass_network(context, gens, generation, spill, demand):
+    """
+    Dispatch the leading vectorised generators before a network run.
+
+    A generator that meets only the demand in its own polygon needs
+    no transfers, so in each hour the leading generators whose hours
+    are independent (see Generator.stateless_p) are dispatched over
+    all hours at once for as long as each of them can generate no
+    more than the residual demand in its polygon, or has no links to
+    other polygons (and so spills the rest). The rest of them are
+    dispatched in the hour loop unless they can generate nothing,
+    but are offered no more than they can generate, so that no
+    transfer capacity is reserved and released again.
+
+    demand[hour] is the demand in each polygon. Returns the number of
+    leading generators, the number dispatched in each hour, the
+    residual demand in each polygon and the non-synchronous demand
+    left for the rest, and the power each leading generator can
+    generate in each hour.
+    """
+    hours = len(demand)
+    residual_demand = demand.copy()
+    async_demand = demand.sum(axis=1) * context.nsp_limit
+    first = np.zeros(hours, dtype=int)
+    local = np.ones(hours, dtype=bool)
+    prefix = 0
+    for generator in gens:
+        if not (generator.vectorised_p and generator.stateless_p):
+            break
+        prefix += 1
+    potential = np.empty((hours, prefix))
+    network = context.network
+    profile = context.profile
+
+    for gidx, generator in enumerate(gens[:prefix]):
+        col = generator.polygon - 1
+        if profile is not None:
+            start = perf_counter()
+        potential[:, gidx], _ = generator.step_all(np.full(hours, np.inf))
+        if network.linked_p(generator.polygon):
+            local &= potential[:, gidx] <= residual_demand[:, col]
+        limit = np.where(local, residual_demand[:, col], 0)
+        if not generator.synchronous_p:
+            limit = np.where(async_demand < limit, async_demand, limit)
+        gen, spl = generator.step_all(np.where(limit < generator.capacity,
+                                               limit, generator.capacity))
+        if profile is not None:
+            profile.add('step_all', generator, perf_counter() - start)
+        # the other hours are dispatched in the hour loop
+        generation[:, gidx] = np.where(local, gen, 0)
+        spill[:, gidx] = np.where(local, spl, 0)
+
+        if not generator.synchronous_p:
+            async_demand = async_demand - generation[:, gidx]
+            async_demand = np.where(async_demand > 0, async_demand, 0)
+        residual_demand[:, col] -= generation[:, gidx]
+        first += local
+
+    return prefix, first, residual_demand, async_demand, potential
+
+
+def _store_prepass_spills(context, hour, gens, prefix, spill):
+    """
+    Store spills in hour from the first prefix generators in gens.
+
+    spill is the row of the spill matrix for hour.
+    """
+    if not context.storages:
+        return
+    profile = context.profile
+    for gidx in np.flatnonzero(spill[:prefix] > 0):
+        if profile is None:
+            spill[gidx] = _store_spills(context, hour, gens[gidx], gens,
+                                        spill[gidx])
+        else:
+            start = perf_counter()
+            spill[gidx] = _store_spills(context, hour, gens[gidx], gens,
+                                        spill[gidx])
+            profile.add_phase('store spills', perf_counter() - start)
 
 
 def _store_spills(context, hour, gen, generators, spl):
@@ -64,8 +309,44 @@ def _store_spills(context, hour, gen, generators, spl):
     if context.storages is None:
         # compute this just once and cache it in the context object
         context.storages = list(g for g in generators if g.storage_p)
+    profile = context.profile
+    network = context.network
     for other in context.storages:
-        stored = other.store(hour, spl)
+        offer = spl
+        if network is not None:
+            # Only store what can be transferred to the storage. No
+            # storage takes more than its charge capacity, so there is
+            # no need to find out whether more could be transferred.
+            if not isinstance(other, fleet.BatteryFleet):
+                offer = min(offer, other.charge_capacity(other, hour))
+                if offer <= 0:
+                    continue
+            offer = network.spare(gen.polygon, other.polygon, offer)
+            if offer <= 0:
+                continue
+        if isinstance(other, fleet.BatteryFleet):
+            # A battery fleet stores into its members in turn and
+            # returns the spill they leave.
+            if profile is None:
+                left = other.store(hour, offer)
+            else:
+                start = perf_counter()
+                left = other.store(hour, offer)
+                profile.add('store', other, perf_counter() - start)
+            if network is None:
+                spl = left
+                if spl == 0:
+                    break
+                continue
+            stored = offer - left
+        elif profile is None:
+            stored = other.store(hour, offer)
+        else:
+            start = perf_counter()
+            stored = other.store(hour, offer)
+            profile.add('store', other, perf_counter() - start)
+        if network is not None:
+            network.transfer(gen.polygon, other.polygon, stored)
         spl -= stored
         if spl < 0 and isclose(spl, 0, abs_tol=1e-6):
             spl = 0
@@ -82,24 +363,58 @@ def _store_spills(context, hour, gen, generators, spl):
     return spl
 
 
-def _dispatch(context, hour, residual_hour_demand, gens, generation, spill):
-    """Dispatch power from each generator in merit (list) order."""
+def _dispatch(context, hour, residual_hour_demand, gens, generation, spill,
+              first=0, async_demand=None, columns=None):
+    """
+    Dispatch power from each generator in merit (list) order.
+
+    generation and spill are the rows of the result matrices for
+    hour. If first is given, the generators before gens[first] have already
+    been dispatched and async_demand is what they left. If columns is
+    given, columns[i] is the column of gens[i] in the result matrices
+    (None for a battery fleet, which fills in its own columns).
+    """
     # async_demand is the maximum amount of the demand in this
     # hour that can be met from non-synchronous
     # generation. Non-synchronous generation in excess of this
     # value must be spilled.
-    async_demand = residual_hour_demand * context.nsp_limit
-
-    for gidx, generator in enumerate(gens):
+    if async_demand is None:
+        async_demand = residual_hour_demand * context.nsp_limit
+    profile = context.profile
+
+    if columns is None:
+        units = enumerate(gens[first:], first)
+    else:
+        units = zip(columns[first:], gens[first:])
+
+    for gidx, generator in units:
+        if gidx is None:
+            # A battery fleet dispatches its members in turn and
+            # returns the demand they leave (see nemo.fleet).
+            if profile is None:
+                residual_hour_demand = \
+                    generator.step(hour, residual_hour_demand)
+            else:
+                start = perf_counter()
+                residual_hour_demand = \
+                    generator.step(hour, residual_hour_demand)
+                profile.add('step', generator, perf_counter() - start)
+            continue
         if not generator.synchronous_p and async_demand < residual_hour_demand:
-            gen, spl = generator.step(hour, async_demand)
+            demand = async_demand
         else:
-            gen, spl = generator.step(hour, residual_hour_demand)
+            demand = residual_hour_demand
+        if profile is None:
+            gen, spl = generator.step(hour, demand)
+        else:
+            start = perf_counter()
+            gen, spl = generator.step(hour, demand)
+            profile.add('step', generator, perf_counter() - start)
         assert gen < residual_hour_demand or \
             isclose(gen, residual_hour_demand), \
             f"generation ({gen:.4f}) > demand " + \
             f"({residual_hour_demand:.4f}) for {generator}"
-        generation[hour, gidx] = gen
+        generation[gidx] = gen
 
         if not generator.synchronous_p:
             async_demand -= gen
@@ -122,12 +437,123 @@ def _dispatch(context, hour, residual_hour_demand, gens, generation, spill):
                   f'async-demand: {async_demand:.1f}')
 
         if spl > 0:
-            spill[hour, gidx] = \
-                _store_spills(context, hour, generator, gens, spl)
+            if profile is None:
+                spill[gidx] = \
+                    _store_spills(context, hour, generator, gens, spl)
+            else:
+                start = perf_counter()
+                spill[gidx] = \
+                    _store_spills(context, hour, generator, gens, spl)
+                profile.add_phase('store spills', perf_counter() - start)
+
+
+def _dispatch_network(context, hour, gens, generation, spill, first=0,
+                      async_demand=None, potential=None, columns=None):
+    """
+    Dispatch power from each generator subject to network limits.
+
+    Each generator is offered only the residual demand it can reach
+    over the network (see nemo.network). No generator is offered more
+    than its capacity. generation and spill are the rows of the result
+    matrices for hour. If first is given, the generators before
+    gens[first] have already been dispatched and async_demand is what
+    they left. potential[i] is the most that gens[i] can generate in
+    this hour, if known. columns is as for _dispatch().
+    """
+    network = context.network
+    residual_hour_demand = network.unmet
+    if async_demand is None:
+        async_demand = residual_hour_demand * context.nsp_limit
+    if potential is None:
+        potential = []
+    profile = context.profile
+
+    if columns is None:
+        units = enumerate(gens[first:], first)
+    else:
+        units = zip(columns[first:], gens[first:])
+
+    for gidx, generator in units:
+        if gidx is None:
+            # A battery fleet is in one polygon (see fleet.assemble),
+            # so it can be offered all the demand it can reach at once.
+            offer, moves = network.supply(generator.polygon,
+                                          residual_hour_demand)
+            if profile is None:
+                left = generator.step(hour, offer)
+            else:
+                start = perf_counter()
+                left = generator.step(hour, offer)
+                profile.add('step', generator, perf_counter() - start)
+            network.release(moves, left)
+            residual_hour_demand = network.unmet
+            residual_hour_demand = residual_hour_demand \
+                if residual_hour_demand > 0 else 0
+            continue
+        if gidx < len(potential) and potential[gidx] == 0:
+            # nothing to generate, as the pre-pass has recorded
+            continue
+        if not generator.synchronous_p and async_demand < residual_hour_demand:
+            demand = async_demand
+        else:
+            demand = residual_hour_demand
+        limit = min(demand, generator.capacity)
+        if gidx < len(potential) and potential[gidx] < limit:
+            # Offer no more than the generator can generate, but
+            # leave no spill if the network rounds the offer down.
+            limit = potential[gidx]
+            offer, moves = network.supply(generator.polygon, limit)
+            if isclose(offer, limit, abs_tol=1e-6):
+                offer = limit
+        else:
+            offer, moves = network.supply(generator.polygon, limit)
+        if profile is None:
+            gen, spl = generator.step(hour, offer)
+        else:
+            start = perf_counter()
+            gen, spl = generator.step(hour, offer)
+            profile.add('step', generator, perf_counter() - start)
+        assert gen < offer or isclose(gen, offer), \
+            f"generation ({gen:.4f}) > offer ({offer:.4f}) for {generator}"
+        network.release(moves, offer - gen)
+        generation[gidx] = gen
 
+        if not generator.synchronous_p:
+            async_demand -= gen
+            assert async_demand > 0 or isclose(async_demand, 0, abs_tol=1e-6)
+            async_demand = async_demand if async_demand > 0 else 0
 
-def run(context, starthour=None, endhour=None):
-    """Run the simulation."""
+        residual_hour_demand = network.unmet
+        residual_hour_demand = residual_hour_demand \
+            if residual_hour_demand > 0 else 0
+
+        if context.verbose:
+            print(f'GENERATOR: {generator},',
+                  f'generation: {gen:.1f}',
+                  f'spill: {spl:.1f}',
+                  f'residual-demand: {residual_hour_demand:.1f}',
+                  f'async-demand: {async_demand:.1f}')
+
+        if spl > 0:
+            if profile is None:
+                spill[gidx] = \
+                    _store_spills(context, hour, generator, gens, spl)
+            else:
+                start = perf_counter()
+                spill[gidx] = \
+                    _store_spills(context, hour, generator, gens, spl)
+                profile.add_phase('store spills', perf_counter() - start)
+
+
+def run(context, starthour=None, endhour=None, sink=None):
+    """
+    Run the simulation.
+
+    If sink is given (see nemo.export.ResultSink), the hourly results
+    are written to it in chunks as the simulation proceeds and are not
+    kept. context.generation and context.spill then hold just the
+    total generation and spill in each hour.
+    """
     if not isinstance(context.regions, list):
         raise TypeError
 
@@ -137,11 +563,21 @@ def run(context, starthour=None, endhour=None):
         endhour = context.demand.index.max()
     date_range = pd.date_range(starthour, endhour, freq='h')
 
-    _sim(context, date_range)
-
-    # Calculate unserved energy.
-    agg_demand = context.demand.sum(axis=1)
-    agg_generation = context.generation.sum(axis=1)
-    unserved = agg_demand - agg_generation
-    # Ignore unserved events very close to 0 (rounding errors)
-    context.unserved = unserved[~np.isclose(unserved, 0)]
+    if context.profile is not None:
+        context.profile.runs += 1
+
+    try:
+        _sim(context, date_range, sink)
+    finally:
+        if sink is not None:
+            sink.close()
+
+    with _phase(context, 'unserved'):
+        # Calculate unserved energy.
+        first = context.demand.index.get_loc(date_range[0])
+        agg_demand = \
+            context.demand.values[first:first + len(date_range)].sum(axis=1)
+        unserved = agg_demand - context.generation.values.sum(axis=1)
+        # Ignore unserved events very close to 0 (rounding errors)
+        mask = ~np.isclose(unserved, 0)
+        context.unserved = pd.Series(unserved[mask], index=date_range[mask])
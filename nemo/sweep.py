@@ -0,0 +1,141 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Simulate one portfolio against many demand traces.
+
+The portfolio (supply scenario, costs and capacities) comes from a
+results bundle, as written by evolve. Every demand trace is loaded
+once in the parent process before the worker processes are started,
+so that on platforms where workers are forked they share the loaded
+traces. Each worker builds its context just once and then switches
+between demand traces with Context.set_demand().
+"""
+
+import os
+from multiprocessing import Pool
+
+import pandas as pd
+
+import nemo
+from nemo import costs, nem, scenarios, utils
+
+# Set in each worker process by _init_worker().
+_context = None
+_plot_dir = None
+_renderer = None
+
+
+def make_context(bundle, demand=None):
+    """Return a context set up from the options in a results bundle."""
+    context = nemo.Context(demand)
+    scenario = bundle['options']['supply_scenario']
+    try:
+        scenarios.supply_scenarios[scenario](context)
+    except KeyError as exc:
+        raise ValueError(f'unknown scenario: {scenario}') from exc
+    configure_context(context, bundle)
+    return context
+
+
+def configure_context(context, bundle):
+    """
+    Apply the options and capacities in a results bundle to a context.
+
+    The context must already be set up with the bundle's supply
+    scenario. This allows a context to be reused for several bundles.
+    """
+    options = bundle['options']
+    context.nsp_limit = options['nsp_limit']
+    assert 0 <= context.nsp_limit <= 1
+    context.min_regional_generation = options['min_regional_generation']
+    assert 0 <= context.min_regional_generation <= 1
+    try:
+        cost_class = costs.cost_scenarios[options['costs']]
+    except KeyError as exc:
+        raise ValueError(f'unknown cost class: {options["costs"]}') \
+            from exc
+    context.costs = cost_class(options['discount_rate'],
+                               options['coal_price'], options['gas_price'],
+                               options['ccs_storage_costs'])
+    context.costs.carbon = options['carbon_price']
+    numparams = sum(len(gen.setters) for gen in context.generators)
+    if len(bundle['parameters']) != numparams:
+        raise ValueError(f'scenario {options["supply_scenario"]} expects '
+                         f'{numparams} parameters, '
+                         f'found {len(bundle["parameters"])}')
+    context.set_capacities(bundle['parameters'])
+
+
+def average_cost(context):
+    """Return the average cost of energy (in $/MWh) excluding penalties."""
+    total = 0
+    for gen in context.generators:
+        annuityf = context.costs.annuity_factor(gen.lifetime)
+        total += (gen.capcost(context.costs) / annuityf * context.years()) \
+            + gen.opcost(context.costs)
+    return total / context.total_demand()
+
+
+def _init_worker(bundle, demand, plot_dir):
+    """Set up the context (and renderer) in a worker process."""
+    # pylint: disable=global-statement
+    global _context, _plot_dir, _renderer
+    _context = make_context(bundle, demand)
+    _plot_dir = plot_dir
+    if plot_dir is not None:
+        _renderer = utils.Renderer()
+
+
+def plot_filename(plot_dir, path):
+    """Return the name of the plot file for a demand trace."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(plot_dir, f'{stem}.png')
+
+
+def _evaluate(path):
+    """Simulate the portfolio against the demand trace in path."""
+    _context.set_demand(path)
+    nemo.run(_context)
+    if _plot_dir is not None:
+        _renderer.render(_context, plot_filename(_plot_dir, path),
+                         resample='D')
+    return {'demand': _context.total_demand() / 10**6,
+            'cost': average_cost(_context),
+            'unserved': _context.unserved_percent(),
+            'unserved energy': _context.unserved_energy(),
+            'surplus': _context.surplus_energy() / 10**6}
+
+
+def sweep(bundle, paths, processes=None, plot_dir=None):
+    """
+    Simulate the portfolio in bundle against each demand trace in paths.
+
+    processes is the number of worker processes (by default, the
+    number of CPUs). If plot_dir is given, a plot of daily energy
+    balance for each trace is saved there (see plot_filename()).
+    Returns a DataFrame indexed by demand trace.
+    """
+    assert paths, 'no demand traces given'
+    for path in paths:
+        nem.load_demand(path)
+    # Check the bundle here: errors in a Pool initializer are not
+    # reported and the pool restarts the failed workers forever.
+    make_context(bundle, paths[0])
+    if plot_dir is not None:
+        os.makedirs(plot_dir, exist_ok=True)
+    with Pool(processes, initializer=_init_worker,
+              initargs=(bundle, paths[0], plot_dir)) as pool:
+        results = pool.map(_evaluate, paths, chunksize=1)
+    table = pd.DataFrame(results, index=[os.path.basename(path)
+                                         for path in paths])
+    table.index.name = 'trace'
+    return table.rename(columns={'demand': 'demand (TWh)',
+                                 'cost': 'cost ($/MWh)',
+                                 'unserved': 'unserved (%)',
+                                 'unserved energy': 'unserved (MWh)',
+                                 'surplus': 'surplus (TWh)'})
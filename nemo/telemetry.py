@@ -0,0 +1,119 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Performance telemetry for optimisation runs.
+
+Code running in a worker process wraps the interesting phases of an
+evaluation in timer() blocks. The accumulated times are collected
+(and reset) after each evaluation and sent back to the parent process
+along with the result, where a GenerationLog summarises them once per
+generation.
+"""
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # not available on Windows
+    resource = None
+
+# Accumulated time (in seconds) for each named phase in this process.
+_timings = {}
+
+
+@contextmanager
+def timer(name):
+    """Accumulate the time spent running a block under name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings[name] = _timings.get(name, 0) + \
+            time.perf_counter() - start
+
+
+def collect():
+    """Return the accumulated phase times and reset them."""
+    timings = dict(_timings)
+    _timings.clear()
+    return timings
+
+
+def max_rss():
+    """
+    Return the peak resident set size of this process (in bytes).
+
+    Returns None where this is not available.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, but in kilobytes elsewhere
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class GenerationLog():
+    """Record telemetry for each generation, optionally to a file."""
+
+    def __init__(self, filename=None):
+        """
+        Construct a generation log.
+
+        If filename is given, each generation is appended to it as a
+        line of JSON.
+        """
+        self.filename = filename
+        self.records = []
+
+    def record(self, stats):
+        """Record a scheduling.Utilisation object for one generation."""
+        sims = [t.get('sim', 0) for t in stats.timings]
+        nevals = len(stats.durations)
+        rss = [value for value in stats.rss.values() if value is not None]
+        rec = {'gen': len(self.records),
+               'wall': stats.wall,
+               'nevals': nevals,
+               'evals_per_sec': nevals / stats.wall if stats.wall else 0,
+               'sim_mean': sum(sims) / nevals if nevals else 0,
+               'sim_max': max(sims, default=0),
+               'cost': sum(t.get('cost', 0) for t in stats.timings),
+               'penalties': sum(t.get('penalties', 0)
+                                for t in stats.timings),
+               'idle': 1 - stats.utilisation(),
+               'worker_rss': max(rss, default=None)}
+        self.records.append(rec)
+        if self.filename is not None:
+            with open(self.filename, 'a', encoding='utf-8') as logfile:
+                print(json.dumps(rec), file=logfile)
+        return rec
+
+    def summary(self):
+        """Return a summary of the run."""
+        if not self.records:
+            return 'telemetry: no generations recorded'
+        wall = sum(rec['wall'] for rec in self.records)
+        nevals = sum(rec['nevals'] for rec in self.records)
+        sim = sum(rec['sim_mean'] * rec['nevals'] for rec in self.records)
+        idle = sum(rec['idle'] * rec['wall'] for rec in self.records)
+        rss = [rec['worker_rss'] for rec in self.records
+               if rec['worker_rss'] is not None]
+        lines = [f'telemetry: {len(self.records)} generations, '
+                 f'{nevals} evaluations in {wall:.1f}s '
+                 f'({nevals / wall if wall else 0:.1f}/s)',
+                 f'  simulation {sim:.1f}s, '
+                 f'cost {sum(rec["cost"] for rec in self.records):.1f}s, '
+                 'penalties '
+                 f'{sum(rec["penalties"] for rec in self.records):.1f}s',
+                 f'  pool idle {idle / wall if wall else 0:.0%}']
+        if rss:
+            lines[-1] += f', peak worker RSS {max(rss) / 2**20:.0f} MiB'
+        return '\n'.join(lines)
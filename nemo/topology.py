@@ -0,0 +1,308 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Polygon and region topologies loaded from data files.
+
+NEMO is built around the 43 polygons and the regions of the AEMO study
+(see nemo.polygons and nemo.regions). A Topology holds the same
+information in arrays so that other grids, with any number of zones,
+can be described in a data file and loaded without code changes:
+
+  topo = topology.load('mygrid.npz')
+  topology.install(topo)
+
+install() replaces the region and polygon tables used by the rest of
+NEMO (eg, polygons.NUMPOLYGONS, polygons.region() and regions.All)
+and discards any loaded demand traces, which are apportioned to
+polygons when they are loaded. To install a topology before anything
+else is loaded, name the file in the configuration file:
+
+  [topology]
+  file = mygrid.npz
+
+Topologies are stored in NumPy archives (.npz) or JSON files
+(.json). Use save(current(), filename) to write out the built-in NEM
+topology as a starting point. The scenarios in nemo.scenarios are
+specific to the NEM.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from nemo import nem, polygons, regions
+
+# Names of the per-polygon build limits (in GW).
+LIMITS = ['wind', 'pv', 'cst', 'rooftop', 'offshore_wind']
+
+# Region objects by ID, so that installing the NEM topology again
+# restores the objects in the regions module (eg, regions.nsw).
+_registry = {rgn.id: rgn for rgn in regions.All}
+_interconnectors = dict(regions.interconnectors)
+
+
+class Topology():
+    """Polygons, regions and links between polygons, kept in arrays."""
+
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+    def __init__(self, region_ids, polygon_region, weights, vertices,
+                 vertex_offsets, limits=None, links=None, link_limits=None,
+                 region_descriptions=None, wildcard=1):
+        """
+        Construct and validate a topology.
+
+        Polygons are numbered from 1. For the polygon numbered p,
+        polygon_region[p - 1] is the index of its region in
+        region_ids, weights[p - 1] is its share of the regional
+        demand and vertices[vertex_offsets[p - 1]:vertex_offsets[p]]
+        are the (longitude, latitude) vertices of its closed outline.
+        limits maps the names in LIMITS to arrays of build limits (in
+        GW, zero by default). links is an (L, 2) array of polygon
+        pairs and link_limits holds their transfer limits in MW (zero
+        means unknown). wildcard is the polygon for default plant.
+        Raises ValueError if the topology is inconsistent.
+        """
+        self.region_ids = [str(rid) for rid in region_ids]
+        if region_descriptions is None:
+            region_descriptions = self.region_ids
+        self.region_descriptions = [str(descr) for descr in
+                                    region_descriptions]
+        self.polygon_region = np.asarray(polygon_region, dtype=int)
+        self.weights = np.asarray(weights, dtype=float)
+        self.vertices = np.asarray(vertices, dtype=float)
+        self.vertex_offsets = np.asarray(vertex_offsets, dtype=int)
+        numpolygons = len(self.polygon_region)
+        limits = {} if limits is None else limits
+        self.limits = {name: np.asarray(limits.get(name,
+                                                   np.zeros(numpolygons)),
+                                        dtype=float)
+                       for name in LIMITS}
+        self.links = np.asarray(np.zeros((0, 2)) if links is None else links,
+                                dtype=int).reshape(-1, 2)
+        if link_limits is None:
+            link_limits = np.zeros(len(self.links))
+        self.link_limits = np.asarray(link_limits, dtype=float)
+        self.wildcard = int(wildcard)
+        self.validate()
+
+    @property
+    def numpolygons(self):
+        """Return the number of polygons."""
+        return len(self.polygon_region)
+
+    def validate(self):
+        """Raise ValueError if the topology is inconsistent."""
+        numregions, numpolygons = len(self.region_ids), self.numpolygons
+        if numregions == 0 or numpolygons == 0:
+            raise ValueError('topology needs at least one region and polygon')
+        if len(set(self.region_ids)) != numregions or \
+           len(self.region_descriptions) != numregions:
+            raise ValueError('region IDs must be unique and described')
+        out_of_range = (self.polygon_region < 0) | \
+            (self.polygon_region >= numregions)
+        if out_of_range.any():
+            raise ValueError('polygon region out of range')
+        if self.weights.shape != (numpolygons,) or (self.weights < 0).any():
+            raise ValueError('need a non-negative weight for each polygon')
+        sums = np.bincount(self.polygon_region, weights=self.weights,
+                           minlength=numregions)
+        populated = np.bincount(self.polygon_region,
+                                minlength=numregions) > 0
+        if not np.allclose(sums[populated], 1):
+            raise ValueError('polygon weights in each region must sum to 1')
+        offsets = self.vertex_offsets
+        if offsets.shape != (numpolygons + 1,) or offsets[0] != 0 or \
+           offsets[-1] != len(self.vertices) or \
+           (np.diff(offsets) < 4).any() or \
+           self.vertices.shape != (len(self.vertices), 2):
+            raise ValueError('each polygon needs at least 4 vertices')
+        if (self.vertices[offsets[:-1]] != self.vertices[offsets[1:] - 1]) \
+                .any():
+            raise ValueError('polygon outlines must be closed')
+        for name, limit in self.limits.items():
+            if limit.shape != (numpolygons,) or not (limit >= 0).all():
+                raise ValueError(f'need a non-negative {name} limit for '
+                                 'each polygon')
+        if ((self.links < 1) | (self.links > numpolygons)).any() or \
+           (self.links[:, 0] == self.links[:, 1]).any():
+            raise ValueError('links must join two different polygons')
+        if len(np.unique(self.links, axis=0)) != len(self.links):
+            raise ValueError('duplicate links')
+        if self.link_limits.shape != (len(self.links),) or \
+           not (self.link_limits >= 0).all():
+            raise ValueError('need a non-negative limit for each link')
+        if not 0 < self.wildcard <= numpolygons:
+            raise ValueError('wildcard polygon out of range')
+
+    def outlines(self):
+        """Return a list of the vertex arrays of each polygon."""
+        return np.split(self.vertices, self.vertex_offsets[1:-1])
+
+    def arrays(self):
+        """Return the topology as a dict of arrays (as saved to NPZ)."""
+        result = {'region_ids': np.array(self.region_ids),
+                  'region_descriptions': np.array(self.region_descriptions),
+                  'polygon_region': self.polygon_region,
+                  'weights': self.weights,
+                  'vertices': self.vertices,
+                  'vertex_offsets': self.vertex_offsets,
+                  'links': self.links,
+                  'link_limits': self.link_limits,
+                  'wildcard': np.array(self.wildcard)}
+        for name, limit in self.limits.items():
+            result[f'{name}_limit'] = limit
+        return result
+
+
+def _from_arrays(arrays):
+    """Construct a topology from a dict of arrays (see Topology.arrays)."""
+    try:
+        return Topology(arrays['region_ids'], arrays['polygon_region'],
+                        arrays['weights'], arrays['vertices'],
+                        arrays['vertex_offsets'],
+                        limits={name: arrays[f'{name}_limit']
+                                for name in LIMITS
+                                if f'{name}_limit' in arrays},
+                        links=arrays.get('links'),
+                        link_limits=arrays.get('link_limits'),
+                        region_descriptions=arrays.get('region_descriptions'),
+                        wildcard=arrays.get('wildcard', 1))
+    except KeyError as exc:
+        raise ValueError(f'topology is missing {exc}') from exc
+
+
+def load(filename):
+    """Load a topology from a .npz or .json file."""
+    suffix = os.path.splitext(filename)[1].lower()
+    if suffix == '.npz':
+        with np.load(filename) as npz:
+            return _from_arrays(dict(npz))
+    if suffix == '.json':
+        with open(filename, encoding='utf-8') as filehandle:
+            arrays = json.load(filehandle)
+        # vertices are listed per polygon in JSON files
+        outlines = arrays.pop('vertices', [])
+        arrays['vertex_offsets'] = np.cumsum([0] + [len(outline)
+                                                    for outline in outlines])
+        arrays['vertices'] = [vertex for outline in outlines
+                              for vertex in outline]
+        return _from_arrays(arrays)
+    raise ValueError(f'unsupported topology format: {filename}')
+
+
+def save(topology, filename):
+    """Save a topology to a .npz or .json file."""
+    suffix = os.path.splitext(filename)[1].lower()
+    arrays = topology.arrays()
+    if suffix == '.npz':
+        np.savez_compressed(filename, **arrays)
+    elif suffix == '.json':
+        arrays = {key: value.tolist() for key, value in arrays.items()}
+        arrays['vertices'] = [outline.tolist()
+                              for outline in topology.outlines()]
+        del arrays['vertex_offsets']
+        with open(filename, 'w', encoding='utf-8') as filehandle:
+            json.dump(arrays, filehandle)
+    else:
+        raise ValueError(f'unsupported topology format: {filename}')
+
+
+def current():
+    """Return the installed topology (by default, the NEM)."""
+    numpolygons = polygons.NUMPOLYGONS
+    # pylint: disable=protected-access
+    outlines = [polygons._polygons[poly] for poly in
+                range(1, numpolygons + 1)]
+    weights = np.zeros(numpolygons)
+    for rgn in regions.All:
+        for poly, weight in rgn.polygons.items():
+            weights[poly - 1] = weight
+    offshore = np.zeros(numpolygons)
+    for poly, limit in polygons.offshore_wind_limit.items():
+        offshore[poly - 1] = limit
+    links = [(p1, p2) for p1 in polygons.net for p2 in polygons.net[p1]]
+    link_limits = np.nan_to_num([polygons.existing_net[link]
+                                 for link in links])
+    return Topology([rgn.id for rgn in regions.All],
+                    polygons.polygon_region[1:], weights,
+                    [vertex for outline in outlines for vertex in outline],
+                    np.cumsum([0] + [len(outline) for outline in outlines]),
+                    limits={'wind': polygons.wind_limit[1:],
+                            'pv': polygons.pv_limit[1:],
+                            'cst': polygons.cst_limit[1:],
+                            'rooftop': polygons.rooftop_limit[1:],
+                            'offshore_wind': offshore},
+                    links=links, link_limits=link_limits,
+                    region_descriptions=[rgn.descr for rgn in regions.All],
+                    wildcard=polygons.WILDCARD)
+
+
+def _install_regions(topology):
+    """Replace the region table with the regions of topology."""
+    allregions = []
+    for num, (rid, descr) in enumerate(zip(topology.region_ids,
+                                           topology.region_descriptions)):
+        rgn = _registry.setdefault(rid, regions.Region(num, rid, descr))
+        rgn.num, rgn.descr = num, descr
+        members = np.flatnonzero(topology.polygon_region == num)
+        rgn.polygons = {int(poly) + 1: float(topology.weights[poly])
+                        for poly in members}
+        allregions.append(rgn)
+    regions.All = allregions
+    regions.NUMREGIONS = len(allregions)
+    regions.interconnectors = \
+        {(rgn1, rgn2): limit
+         for (rgn1, rgn2), limit in _interconnectors.items()
+         if rgn1 in allregions and rgn2 in allregions}
+
+
+def install(topology):
+    """
+    Use topology for all subsequent simulations.
+
+    This replaces the tables in nemo.regions and nemo.polygons and
+    discards any loaded demand traces.
+    """
+    _install_regions(topology)
+    numpolygons = topology.numpolygons
+    polygons.NUMPOLYGONS = numpolygons
+    polygons.WILDCARD = topology.wildcard
+    outlines = topology.outlines()
+    # pylint: disable=protected-access
+    polygons._polygons = {poly + 1: [tuple(vertex) for vertex in outline]
+                          for poly, outline in enumerate(outlines)}
+    polygons._region_table = {poly + 1: regions.All[rnum] for poly, rnum in
+                              enumerate(topology.polygon_region)}
+    polygons.polygon_region = np.concatenate(([-1],
+                                              topology.polygon_region))
+    for name in ['wind', 'pv', 'cst', 'rooftop']:
+        setattr(polygons, f'{name}_limit',
+                [None] + topology.limits[name].tolist())
+    polygons.offshore_wind_limit = \
+        {int(poly) + 1: float(topology.limits['offshore_wind'][poly])
+         for poly in np.flatnonzero(topology.limits['offshore_wind'])}
+
+    centroids = np.full((numpolygons + 1, 2), np.nan)
+    centroids[1:] = polygons.polygon_centroids(outlines)
+    polygons.centroid_array = centroids
+    polygons.centroids = {poly: tuple(centroids[poly].tolist())
+                          for poly in range(1, numpolygons + 1)}
+    polygons.distances = np.trunc(polygons.haversine(
+        centroids[:, np.newaxis], centroids))
+
+    net = {poly: {} for poly in range(1, numpolygons + 1)}
+    existing = np.zeros((numpolygons + 1, numpolygons + 1))
+    existing[0] = existing[:, 0] = np.nan
+    for (p1, p2), limit in zip(topology.links.tolist(),
+                               topology.link_limits):
+        net[p1][p2] = int(polygons.distances[p1, p2])
+        existing[p1, p2] = limit
+    polygons.net = net
+    polygons.existing_net = existing
+    nem.clear_cache()
@@ -5,17 +5,23 @@
 # the Free Software Foundation; either version 3 of the License, or
 # (at your option) any later version.
 
-"""Utility functions (eg, plotting)."""
+"""
+Utility functions (eg, plotting).
 
+Matplotlib and Pint are slow to import and are not needed to run a
+simulation, so they are imported when first used. This keeps the
+start up of worker processes that only run simulations fast.
+"""
+
+import json
 import locale
 from datetime import timedelta
+from functools import lru_cache
 from itertools import tee
+from multiprocessing import Pool
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-import pint
-from matplotlib.patches import Patch
-from pandas.plotting import register_matplotlib_converters
 
 from nemo import configfile
 from nemo.configfile import configparser
@@ -23,11 +29,6 @@ from nemo.configfile import configparser
 # Needed for currency formatting.
 locale.setlocale(locale.LC_ALL, '')
 
-# Default to abbreviated units when formatting.
-# Caching is not yet the default.
-ureg = pint.UnitRegistry(cache_folder=':auto:')
-ureg.default_format = '.2f~P'
-
 # The maximum number of generators before we only show a consolidated
 # list of generator types and not individual generator names.
 MAX_LEGEND_GENERATORS = 20
@@ -37,9 +38,96 @@ MAX_LEGEND_GENERATORS = 20
 # speeds up the plotting dramatically.
 MAX_PLOT_GENERATORS = 50
 
-# Future versions of pandas will require us to explicitly register
-# matplotlib converters, so do it here now.
-register_matplotlib_converters()
+# The approximate number of time buckets when plotting with min/max
+# decimation (a little more than the width of a figure in pixels).
+DECIMATE_BUCKETS = 2000
+
+
+@lru_cache(maxsize=None)
+def _unit_registry():
+    """Return the Pint unit registry (created on first use)."""
+    # pylint: disable=import-outside-toplevel
+    import pint
+
+    # Default to abbreviated units when formatting.
+    # Caching is not yet the default.
+    registry = pint.UnitRegistry(cache_folder=':auto:')
+    registry.default_format = '.2f~P'
+    return registry
+
+
+def __getattr__(name):
+    """Import pyplot (plt) or create the unit registry (ureg) on use."""
+    if name == 'ureg':
+        return _unit_registry()
+    if name == 'plt':
+        # pylint: disable=import-outside-toplevel
+        import matplotlib.pyplot as plt
+        return plt
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+class LazyPatch():
+    """
+    A matplotlib Patch that is only created when it is first used.
+
+    Generator classes use this to declare their plotting colour
+    without importing matplotlib.
+    """
+
+    def __init__(self, **kwargs):
+        """Record the keyword arguments for the Patch."""
+        self.kwargs = kwargs
+        self.patch = None
+
+    def __get__(self, obj, objtype=None):
+        """Return the Patch, creating it if necessary."""
+        if self.patch is None:
+            # pylint: disable=import-outside-toplevel
+            from matplotlib.patches import Patch
+            self.patch = Patch(**self.kwargs)
+        return self.patch
+
+
+class HourlySeries(dict):
+    """
+    A time series of hourly values, keyed by hour.
+
+    Generators record their power, spills, etc in these. When results
+    are streamed (see export.ResultSink), the hours that have been
+    written out are folded into a running total by fold(). len() and
+    values() still count the folded hours, so that sums and hour
+    counts (eg, in Generator.capfactor) are unchanged, but the folded
+    hours can no longer be looked up.
+    """
+
+    def __init__(self):
+        """Construct an empty series."""
+        dict.__init__(self)
+        self.folded_hours = 0
+        self.folded_total = 0
+
+    def fold(self):
+        """Fold all of the hours held into the running total."""
+        self.folded_total += sum(dict.values(self))
+        self.folded_hours += dict.__len__(self)
+        dict.clear(self)
+
+    def values(self):
+        """Return the values, with any folded hours as their total."""
+        if not self.folded_hours:
+            return dict.values(self)
+        return [self.folded_total] + list(dict.values(self))
+
+    def __len__(self):
+        """Return the number of hours, including folded hours."""
+        return dict.__len__(self) + self.folded_hours
+
+    def clear(self):
+        """Remove all hours, including folded hours."""
+        dict.clear(self)
+        self.folded_hours = 0
+        self.folded_total = 0
 
 
 def thousands(value):
@@ -62,10 +150,38 @@ def currency(value):
     return locale.currency(round(value), grouping=True).replace(cents, '')
 
 
+def read_bundles(filename):
+    """
+    Yield each results bundle in a results file.
+
+    As in replay, blank lines, comment lines (starting with #) and
+    malformed lines are skipped.
+    """
+    with open(filename, 'r', encoding='utf-8') as filehandle:
+        for line in filehandle:
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def _generator_columns(context):
+    """
+    Return the generators of interest in this run and their columns.
+
+    The columns are those of the generators in context.generation and
+    context.spill.
+    """
+    dispatched = [context.generators[gidx] for gidx in context.dispatched()]
+    columns = [col for col, g in enumerate(dispatched) if g.capacity > 0]
+    return [dispatched[col] for col in columns], columns
+
+
 def _generator_list(context):
     """Return a list of the generators of interest in this run."""
-    return [g for g in context.generators
-            if g.region() in context.regions and g.capacity > 0]
+    return _generator_columns(context)[0]
 
 
 def _pairwise(lst):
@@ -100,10 +216,12 @@ def _legend(fig, context):
                 patches.append(gen.patch)
     else:
         for gen in gens:
-            capacity = (gen.capacity * ureg.MW).to_compact()
+            capacity = (gen.capacity * _unit_registry().MW).to_compact()
             labels.append(gen.label + f' ({capacity:.2f~P})')
             patches.append(gen.patch)
 
+    # pylint: disable=import-outside-toplevel
+    from matplotlib.patches import Patch
     red_patch = Patch(facecolor='red', edgecolor='black')
     fig.legend([red_patch] + patches,
                ['unserved'] + labels,
@@ -111,39 +229,118 @@ def _legend(fig, context):
                loc='upper right')
 
 
-def _plot_areas(axes, context, category, prev=None, alpha=None):
+def _decimate(columns, buckets):
+    """
+    Return the rows to plot for min/max decimation of columns.
+
+    The rows are divided into about buckets equal-sized buckets and
+    the rows holding the minimum and maximum of each column in each
+    bucket are kept.
+
+    >>> _decimate([np.array([1, 5, 2, 3, 9, 4, 0, 6])], 2).tolist()
+    [0, 1, 4, 6]
+    """
+    nrows = len(columns[0])
+    size = -(-nrows // buckets)
+    if size <= 2:
+        return np.arange(nrows)
+    nbuckets = -(-nrows // size)
+    offsets = np.arange(nbuckets) * size
+    rows = []
+    for column in columns:
+        padded = np.full(nbuckets * size, np.nan)
+        padded[:nrows] = column
+        blocks = padded.reshape(nbuckets, size)
+        rows.append(offsets + np.nanargmin(blocks, axis=1))
+        rows.append(offsets + np.nanargmax(blocks, axis=1))
+    return np.unique(np.concatenate(rows))
+
+
+def _plot_data(context, xlim, resample):
+    """
+    Return the demand, generation and spill series to plot.
+
+    The series are limited to the time range xlim (if given) before
+    being resampled according to resample: None (hourly), 'minmax'
+    (min/max decimation of demand and total generation into about
+    DECIMATE_BUCKETS buckets) or a pandas frequency string such as
+    'D' or 'W' (mean power in each period).
+    """
+    generation = context.generation
+    spill = context.spill
+    demand = context.demand.sum(axis=1).reindex(generation.index)
+    if xlim is not None:
+        window = slice(*xlim)
+        generation = generation.loc[window]
+        spill = spill.loc[window]
+        demand = demand.loc[window]
+    if resample == 'minmax':
+        rows = _decimate([demand.values, generation.values.sum(axis=1)],
+                         DECIMATE_BUCKETS)
+        generation = generation.iloc[rows]
+        spill = spill.iloc[rows]
+        demand = demand.iloc[rows]
+    elif resample is not None:
+        generation = generation.resample(resample).mean()
+        spill = spill.resample(resample).mean()
+        demand = demand.resample(resample).mean()
+    return {'demand': demand, 'generation': generation, 'spill': spill}
+
+
+def _plot_areas(axes, context, category, data, prev=None, alpha=None):
     assert category in ['generation', 'spill']
 
-    demand = context.demand.sum(axis=1)
-    timeseries = getattr(context, category)
-    genlist = _generator_list(context)
+    demand = data['demand']
+    timeseries = data[category]
+    genlist, columns = _generator_columns(context)
     numgens = len(genlist)
 
-    accum = prev.copy()
-    for gen, nextgen in _pairwise(genlist + [None]):
-        index = context.generators.index(gen)
-        accum += timeseries[index]
+    # Stack the generators in merit order.
+    lower = prev.values
+    stack = lower[:, np.newaxis] + \
+        np.cumsum(timeseries.values[:, columns], axis=1)
+    for num, (gen, nextgen) in enumerate(_pairwise(genlist + [None])):
         if type(gen) is type(nextgen) and numgens > MAX_PLOT_GENERATORS:
             # don't plot individual traces lines when there are too
             # many generators
             continue
-        axes.plot(accum.index, accum, color='black', linewidth=0.4,
+        upper = stack[:, num]
+        axes.plot(timeseries.index, upper, color='black', linewidth=0.4,
                   linestyle='--')
-        axes.fill_between(prev.index, prev, accum,
+        axes.fill_between(timeseries.index, lower, upper,
                           facecolor=gen.patch.get_fc(), alpha=alpha)
-        prev = accum.copy()
+        lower = upper
 
     # Unmet demand is shaded red.
     if category == 'generation':
-        axes.fill_between(accum.index, accum, demand, facecolor='red')
+        axes.fill_between(timeseries.index, lower, demand, facecolor='red')
+
+
+def _figure(context, spills, showlegend, xlim, resample=None, fig=None):
+    """
+    Provide a helper function for plot() to faciltiate testing.
+
+    The plot is drawn on fig (after clearing it) if given, otherwise
+    on a new pyplot figure. Returns the figure.
+    """
+    # pylint: disable=import-outside-toplevel
+    from pandas.plotting import register_matplotlib_converters
 
+    # Future versions of pandas will require us to explicitly register
+    # matplotlib converters.
+    register_matplotlib_converters()
 
-def _figure(context, spills, showlegend, xlim):
-    """Provide a helper function for plot() to faciltiate testing."""
+    data = _plot_data(context, xlim, resample)
     # aggregate demand
-    demand = context.demand.sum(axis=1)
+    demand = data['demand']
 
-    fig, axes = plt.subplots()
+    if fig is None:
+        # pylint: disable=import-outside-toplevel
+        import matplotlib.pyplot as plt
+        fig, axes = plt.subplots()
+    else:
+        fig.clear()
+        axes = fig.add_subplot()
     axes.set_ylabel('Power (MW)')
     try:
         title = configfile.get('plot', 'title')
@@ -164,36 +361,143 @@ def _figure(context, spills, showlegend, xlim):
 
     # Plot generation.
     zeros = pd.Series(data=0, index=demand.index)
-    _plot_areas(axes, context, 'generation', prev=zeros)
+    _plot_areas(axes, context, 'generation', data, prev=zeros)
 
     # Optionally plot spills.
     if spills:
-        _plot_areas(axes, context, 'spill', prev=demand, alpha=0.3)
+        _plot_areas(axes, context, 'spill', data, prev=demand, alpha=0.3)
 
     axes.set_xlim(xlim)  # set_xlim accepts None
     axes.xaxis_date()
     fig.autofmt_xdate()
 
     _, ymax = axes.get_ylim()
-    axes.plot(context.unserved.index, [ymax] * len(context.unserved),
+    unserved = context.unserved
+    if xlim is not None:
+        unserved = unserved.loc[slice(*xlim)]
+    axes.plot(unserved.index, [ymax] * len(unserved),
               "v", markersize=10, color='red', markeredgecolor='black')
+    return fig
+
+
+def _timerange(context, xlim, resample):
+    """Return the time range to plot (the first 90 days by default)."""
+    if xlim is not None:
+        return xlim
+    if resample is not None:
+        return None
+    starttime = context.demand.index[0]
+    ninety_days = 24 * 90
+    if context.timesteps() > ninety_days:
+        endtime = starttime + timedelta(days=90)
+    else:
+        endtime = context.demand.index[-1]
+    return (starttime, endtime)
 
 
-def plot(context, spills=False, filename=None, showlegend=True, xlim=None):
-    """Produce a pretty plot of supply and demand."""
-    if xlim is None:
-        starttime = context.demand.index[0]
-        ninety_days = 24 * 90
-        if context.timesteps() > ninety_days:
-            endtime = starttime + timedelta(days=90)
-        else:
-            endtime = context.demand.index[-1]
-        timerange = (starttime, endtime)
-    else:
-        timerange = xlim
+def plot(context, spills=False, filename=None, showlegend=True, xlim=None,
+         resample=None):
+    """
+    Produce a pretty plot of supply and demand.
+
+    By default, the first 90 days are plotted hourly. To plot longer
+    periods, set resample to 'minmax' (keep the hours with the lowest
+    and highest demand and generation in each small time bucket) or a
+    pandas frequency string such as 'D' or 'W' (plot daily or weekly
+    mean power). The whole simulation is then plotted unless xlim is
+    given.
+    """
+    if filename:
+        with Renderer() as renderer:
+            renderer.render(context, filename, spills=spills,
+                            showlegend=showlegend, xlim=xlim,
+                            resample=resample)
+        return
 
-    _figure(context, spills, showlegend, timerange)
-    if not filename:
-        plt.show()
-    else:
-        plt.savefig(filename)
+    # pylint: disable=import-outside-toplevel
+    import matplotlib.pyplot as plt
+    _figure(context, spills, showlegend,
+            _timerange(context, xlim, resample), resample)
+    plt.show()
+
+
+class Renderer():
+    """
+    Render plots to files without pyplot.
+
+    A renderer draws every plot on the same figure, using the Agg
+    backend directly, so rendering many plots neither depends on the
+    interactive backend nor accumulates pyplot figures. Use it as a
+    context manager (or call close()) to release the figure:
+
+      with Renderer() as renderer:
+          for ctx, filename in plots:
+              renderer.render(ctx, filename)
+    """
+
+    def __init__(self):
+        """Construct a renderer."""
+        # pylint: disable=import-outside-toplevel
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        self.fig = Figure()
+        FigureCanvasAgg(self.fig)
+
+    def render(self, context, filename, spills=False, showlegend=True,
+               xlim=None, resample=None):
+        """Render a plot of context to filename (see plot())."""
+        _figure(context, spills, showlegend,
+                _timerange(context, xlim, resample), resample, fig=self.fig)
+        self.fig.savefig(filename)
+        self.fig.clear()
+
+    def close(self):
+        """Release the figure."""
+        if self.fig is not None:
+            self.fig.clear()
+            self.fig = None
+
+    def __enter__(self):
+        """Enter a with block."""
+        return self
+
+    def __exit__(self, *exc):
+        """Close the renderer on leaving a with block."""
+        self.close()
+
+
+# Set in each worker process by _init_renderer().
+_renderer = None
+_options = None
+
+
+def _init_renderer(options):
+    """Set up a renderer in a worker process."""
+    global _renderer, _options  # pylint: disable=global-statement
+    _renderer = Renderer()
+    _options = options
+
+
+def _render_item(item):
+    """Render one item in a worker process."""
+    context, filename, xlim = item
+    _renderer.render(context, filename, xlim=xlim, **_options)
+    return filename
+
+
+def render_batch(items, processes=None, **options):
+    """
+    Render many plots to files in a pool of worker processes.
+
+    items is a list of (context, filename, xlim) tuples, so that many
+    contexts, or many time windows of one context, can be rendered in
+    one batch. options are passed on to Renderer.render() (spills,
+    showlegend and resample). Each item is sent only to the worker
+    that renders it, and each worker reuses one figure for all of its
+    plots. Returns the list of filenames.
+    """
+    if not items:
+        return []
+    with Pool(processes, initializer=_init_renderer,
+              initargs=(options,)) as pool:
+        return list(pool.imap(_render_item, items))
@@ -32,7 +32,7 @@ setup(name='nemopt',
           'Topic :: Scientific/Engineering',
       ],
       data_files=[('etc', ['nemo.cfg'])],
-      scripts=['evolve', 'replay', 'summary'],
+      scripts=['evolve', 'replay', 'summary', 'sweep'],
       install_requires=[
           'deap',
           'Gooey>=1.0.4',
@@ -0,0 +1,141 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the broker module."""
+
+import socket
+import threading
+import time
+import unittest
+from multiprocessing.connection import Client
+
+from nemo import broker
+
+AUTHKEY = b'secret'
+
+# Set by the worker initializer.
+initialised = []
+
+
+def init(value):
+    """Record that a worker has been initialised."""
+    initialised.append(value)
+
+
+def square(value):
+    """Square a number."""
+    return value * value
+
+
+def fail(_):
+    """Raise an exception."""
+    raise ValueError('bad candidate')
+
+
+class TestBroker(unittest.TestCase):
+    """Tests for the Broker and Worker classes."""
+
+    def setUp(self):
+        """Start a broker on localhost."""
+        initialised.clear()
+        self.broker = broker.Broker(('localhost', 0), AUTHKEY,
+                                    initargs=(42,), timeout=1)
+        self.duds = []
+
+    def tearDown(self):
+        """Shut down the broker."""
+        self.broker.close()
+        for conn in self.duds:
+            conn.close()
+
+    def start_worker(self):
+        """Start a worker thread."""
+        count = self.broker.num_workers() + 1
+        worker = broker.Worker(self.broker.address, AUTHKEY,
+                               initializer=init, heartbeat=0.1)
+        thread = threading.Thread(target=worker.run, daemon=True)
+        thread.start()
+        self.wait_for_workers(count)
+
+    def start_dud(self):
+        """Connect a worker that never replies."""
+        count = self.broker.num_workers() + 1
+        conn = Client(self.broker.address, authkey=AUTHKEY)
+        self.duds.append(conn)
+        self.wait_for_workers(count)
+        return conn
+
+    def wait_for_workers(self, count):
+        """Wait until count workers are connected."""
+        deadline = time.monotonic() + 5
+        while self.broker.num_workers() < count:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_parse_address(self):
+        """Test parse_address() function."""
+        self.assertEqual(broker.parse_address('example.com:80'),
+                         ('example.com', 80))
+
+    def test_map(self):
+        """Test map() preserves order."""
+        self.start_worker()
+        self.start_worker()
+        self.assertEqual(self.broker.map(square, range(10)),
+                         [n * n for n in range(10)])
+        # workers are kept warm between calls to map()
+        self.assertEqual(self.broker.map(square, [3]), [9])
+        self.assertEqual(initialised, [42, 42])
+
+    def test_map_empty(self):
+        """Test map() with nothing to do."""
+        self.assertEqual(self.broker.map(square, []), [])
+
+    def test_error(self):
+        """Test exceptions in workers are raised by map()."""
+        self.start_worker()
+        with self.assertRaisesRegex(ValueError, 'bad candidate'):
+            self.broker.map(fail, [1])
+
+    def test_lost_worker(self):
+        """Test that tasks from a disconnected worker are re-dispatched."""
+        dud = self.start_dud()
+
+        def disconnect():
+            dud.recv()  # init
+            dud.recv()  # task
+            dud.close()
+
+        thread = threading.Thread(target=disconnect, daemon=True)
+        thread.start()
+        self.start_worker()
+        self.assertEqual(self.broker.map(square, [2, 3]), [4, 9])
+        self.assertEqual(self.broker.num_workers(), 1)
+
+    def test_silent_worker(self):
+        """Test that tasks from a silent worker are re-dispatched."""
+        self.start_dud()
+        self.start_worker()
+        self.assertEqual(self.broker.map(square, [2, 3]), [4, 9])
+        self.assertEqual(self.broker.num_workers(), 1)
+
+    def test_early_worker(self):
+        """Test a worker started before its broker is listening."""
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            address = sock.getsockname()
+        worker = broker.Worker(address, AUTHKEY, initializer=init,
+                               heartbeat=0.1, connect_timeout=0.1)
+        with self.assertRaises(ConnectionRefusedError):
+            worker.run()
+        worker.connect_timeout = 5
+        thread = threading.Thread(target=worker.run, daemon=True)
+        thread.start()
+        time.sleep(0.3)
+        with broker.Broker(address, AUTHKEY, initargs=(7,)) as late:
+            self.assertEqual(late.map(square, [4]), [16])
+        self.assertEqual(initialised, [7])
@@ -13,7 +13,7 @@ import numpy as np
 import pandas as pd
 
 import nemo
-from nemo import regions
+from nemo import generators, regions
 
 
 class TestContextMethods(unittest.TestCase):
@@ -23,6 +23,18 @@ class TestContextMethods(unittest.TestCase):
         """Test harness setup."""
         self.context = nemo.Context()
 
+    def test_set_demand(self):
+        """Test Context with a different demand trace."""
+        path = 'data/1year/2020demand_S1_Base.csv'
+        other = nemo.Context(demand=path)
+        self.assertEqual(other.demand_trace.path, path)
+        self.assertNotEqual(other.total_demand(),
+                            self.context.total_demand())
+        self.context.set_demand(other.demand_trace)
+        self.assertEqual(other.total_demand(), self.context.total_demand())
+        # the context has its own copy of the demand
+        self.assertIsNot(self.context.demand, other.demand)
+
     def test_total_demand(self):
         """Test total_demand() method."""
         self.assertTrue(self.context.total_demand() > 0)
@@ -55,6 +67,24 @@ class TestContextMethods(unittest.TestCase):
         self.assertEqual(self.context.generators[0].capacity, 100)
         self.assertEqual(self.context.generators[1].capacity, 200)
 
+    def test_region_lookups(self):
+        """Test the generator region lookups."""
+        tas = generators.OCGT(40, 100)
+        qld = generators.CCGT(1, 100)
+        self.context.generators = [tas, qld, generators.OCGT(31, 100)]
+        np.testing.assert_array_equal(
+            self.context.generator_region,
+            [regions.tas.num, regions.qld.num, regions.nsw.num])
+        np.testing.assert_array_equal(
+            self.context.region_generators[regions.qld], [1])
+        self.assertEqual(len(self.context.region_generators[regions.sa]), 0)
+        self.context.regions = [regions.qld, regions.tas]
+        np.testing.assert_array_equal(self.context.dispatched(), [0, 1])
+        # changes made in place are picked up by index_regions()
+        self.context.generators.append(generators.CCGT(32, 100))
+        self.context.index_regions()
+        self.assertEqual(self.context.generator_region[-1], regions.sa.num)
+
     def test_str_no_unserved(self):
         """Test __str__ method (no unserved energy)."""
         output = str(self.context)
@@ -90,4 +120,5 @@ class TestContextMethods(unittest.TestCase):
         self.assertIn('WARNING: reliability standard exceeded', output)
         self.assertIn('Unserved total hours: 25', output)
         self.assertIn('Number of unserved energy events: 1', output)
+        self.assertIn('Longest unserved energy event: 25 h', output)
         self.assertIn('Shortfalls (min, max): (0.00 MW, 24.00 MW)', output)
@@ -0,0 +1,198 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# pylint: disable=protected-access,no-member
+
+"""A testsuite for the evolution module."""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from deap import base, creator, tools
+
+from nemo import evolution
+
+creator.create("SphereFitness", base.Fitness, weights=(-1.0,))
+creator.create("SphereIndividual", list, fitness=creator.SphereFitness)
+
+
+def sphere(individual):
+    """Evaluate the sphere function."""
+    return (sum(x * x for x in individual),)
+
+
+def flat(_):
+    """Evaluate a function with no gradient."""
+    return (1,)
+
+
+class TestEvolution(unittest.TestCase):
+    """Tests for the island model."""
+
+    def setUp(self):
+        """Test harness setup."""
+        self.toolbox = base.Toolbox()
+        self.toolbox.register("map", map)
+        self.toolbox.register("evaluate", sphere)
+
+    def individual(self, values):
+        """Return an evaluated individual."""
+        ind = creator.SphereIndividual(values)
+        ind.fitness.values = sphere(ind)
+        return ind
+
+    def test_make_islands(self):
+        """Test make_islands() function."""
+        islands = evolution.make_islands([1, 2], 1.0, 1)
+        self.assertEqual(len(islands), 1)
+        self.assertEqual(islands[0].sigma, 1.0)
+        self.assertEqual(list(islands[0].centroid), [1, 2])
+
+    def test_migrate(self):
+        """Test _migrate() function."""
+        pop1 = [self.individual([1]), self.individual([5])]
+        pop2 = [self.individual([2]), self.individual([3])]
+        evolution._migrate([pop1, pop2], 1)
+        # best of pop2 replaces worst of pop1 and vice versa
+        self.assertEqual(pop1, [[1], [2]])
+        self.assertEqual(pop2, [[2], [1]])
+        self.assertIsNot(pop1[1], pop2[0])
+        self.assertEqual(pop1[1].fitness.values, (4,))
+
+    def test_ea_islands(self):
+        """Test ea_islands() converges on the sphere function."""
+        islands = evolution.make_islands([5, 5], 1.0, 3, lambda_=6)
+        hof = tools.HallOfFame(1)
+        stats = tools.Statistics(lambda ind: ind.fitness.values)
+        stats.register("min", min)
+        pops, logbook = evolution.ea_islands(islands,
+                                             creator.SphereIndividual,
+                                             self.toolbox, 40,
+                                             halloffame=hof, stats=stats,
+                                             migration_interval=5,
+                                             seeds=[1, 2, 3], verbose=False)
+        self.assertEqual(len(pops), 3)
+        self.assertEqual(len(logbook), 40)
+        self.assertEqual(logbook[0]['nevals'], 18)
+        self.assertLess(hof[0].fitness.values[0], 0.01)
+
+    def test_ea_islands_migrants(self):
+        """Test ea_islands() rejects too many migrants."""
+        islands = evolution.make_islands([5, 5], 1.0, 2, lambda_=4)
+        for migrants in [-1, 4]:
+            with self.assertRaisesRegex(ValueError, 'migrants'):
+                evolution.ea_islands(islands, creator.SphereIndividual,
+                                     self.toolbox, 5, migrants=migrants,
+                                     verbose=False)
+
+    def test_ea_islands_seeded(self):
+        """Test ea_islands() is repeatable given seeds."""
+        results = []
+        for _ in range(2):
+            islands = evolution.make_islands([5, 5], 1.0, 2, lambda_=4)
+            hof = tools.HallOfFame(1)
+            evolution.ea_islands(islands, creator.SphereIndividual,
+                                 self.toolbox, 5, halloffame=hof,
+                                 seeds=[7, 8], verbose=False)
+            results.append(list(hof[0]))
+        self.assertEqual(results[0], results[1])
+
+
+class TestRestarts(unittest.TestCase):
+    """Tests for restart strategies and warm starts."""
+
+    def setUp(self):
+        """Test harness setup."""
+        self.toolbox = base.Toolbox()
+        self.toolbox.register("map", map)
+        self.toolbox.register("evaluate", flat)
+        np.random.seed(1)
+
+    def test_load_centroid(self):
+        """Test load_centroid() function."""
+        bundle = {'options': {}, 'parameters': [1.5, 0, 2]}
+        with tempfile.NamedTemporaryFile('w', suffix='.json',
+                                         delete=False) as tmp:
+            tmp.write('# comment line\n\nmalformed line\n')
+            tmp.write(json.dumps(bundle) + '\n')
+        try:
+            self.assertEqual(evolution.load_centroid(tmp.name, 3),
+                             [1.5, 0, 2])
+            with self.assertRaisesRegex(ValueError, 'expected 2'):
+                evolution.load_centroid(tmp.name, 2)
+        finally:
+            os.unlink(tmp.name)
+
+    def test_load_centroid_empty(self):
+        """Test load_centroid() with no bundles."""
+        with tempfile.NamedTemporaryFile('w', suffix='.json',
+                                         delete=False) as tmp:
+            tmp.write('# nothing here\n')
+        try:
+            with self.assertRaisesRegex(ValueError, 'no parameters'):
+                evolution.load_centroid(tmp.name, 3)
+        finally:
+            os.unlink(tmp.name)
+
+    def test_restart_params_ipop(self):
+        """Test IPOP doubles the population size."""
+        budgets = {'large': 0, 'small': 0, 'restarts': 0}
+        lambdas = []
+        for restart in range(3):
+            lam, sigma, kind = evolution._restart_params('ipop', restart, 6,
+                                                         2.0, budgets)
+            lambdas.append(lam)
+            self.assertEqual((sigma, kind), (2.0, 'large'))
+        self.assertEqual(lambdas, [12, 24, 48])
+
+    def test_restart_params_bipop(self):
+        """Test BIPOP chooses the regime with the smaller budget."""
+        budgets = {'large': 100, 'small': 0, 'restarts': 0}
+        self.assertEqual(evolution._restart_params('bipop', 0, 6, 2.0,
+                                                   budgets),
+                         (12, 2.0, 'large'))
+        lam, sigma, kind = evolution._restart_params('bipop', 1, 6, 2.0,
+                                                     budgets)
+        self.assertEqual(kind, 'small')
+        self.assertTrue(2 <= lam <= 6)
+        self.assertTrue(0.02 <= sigma <= 2.0)
+
+    def test_ea_restarts(self):
+        """Test ea_restarts() restarts on stagnation."""
+        hof = tools.HallOfFame(1)
+        _, logbook = evolution.ea_restarts([0, 0], 1.0,
+                                           creator.SphereIndividual,
+                                           self.toolbox, 12, halloffame=hof,
+                                           regime='ipop', stagnation=3,
+                                           lambda_=4, verbose=False)
+        # each run takes one generation to set its best fitness
+        self.assertEqual(logbook.select('restart'),
+                         [0] * 4 + [1] * 4 + [2] * 4)
+        self.assertEqual(logbook.select('lambda'),
+                         [4] * 4 + [8] * 4 + [16] * 4)
+
+    def test_ea_restarts_per_run(self):
+        """Test a run is judged against its own best fitness."""
+        ncalls = []
+
+        def evaluate(_, population):
+            # the first run stagnates at zero; the second keeps
+            # improving, but never beats the first
+            ncalls.append(1)
+            fitness = 0 if len(ncalls) <= 4 else 100 - len(ncalls)
+            return [(fitness,)] * len(population)
+
+        self.toolbox.register("map", evaluate)
+        _, logbook = evolution.ea_restarts([0, 0], 1.0,
+                                           creator.SphereIndividual,
+                                           self.toolbox, 12,
+                                           regime='ipop', stagnation=3,
+                                           lambda_=4, verbose=False)
+        self.assertEqual(logbook.select('restart'), [0] * 4 + [1] * 8)
@@ -0,0 +1,178 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the export module."""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from nemo import configfile, export, generators, sim, storage
+from nemo.context import Context
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class TestExport(unittest.TestCase):
+    """Tests for the export module."""
+
+    def setUp(self):
+        """Run a small simulation with storage."""
+        self.context = Context()
+        battery = storage.BatteryStorage(800)
+        cfg = configfile.get('generation', 'pv1axis-trace')
+        pv = generators.PV1Axis(31, 100000, cfg, 30)
+        self.context.generators = [pv,
+                                   generators.BatteryLoad(1, 400, battery),
+                                   generators.Battery(1, 400, 2, battery),
+                                   generators.CCGT(1, 20000)]
+        self.start = self.context.demand.index[24]
+        self.end = self.context.demand.index[24 * 8 - 1]
+        sim.run(self.context, self.start, self.end)
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Remove temporary files."""
+        self.tmpdir.cleanup()
+
+    def test_results(self):
+        """Test results() follows the horizon of the run."""
+        arrays = export.results(self.context)
+        self.assertEqual(len(arrays['timestamps']), 24 * 7)
+        self.assertEqual(arrays['timestamps'][0], np.datetime64(self.start))
+        self.assertEqual(arrays['power'].shape, (24 * 7, 4))
+        self.assertEqual(list(arrays['technology']),
+                         ['PV1Axis', 'BatteryLoad', 'Battery', 'CCGT'])
+        self.assertTrue(np.allclose(arrays['power'].sum(axis=1),
+                                    arrays['demand'] - arrays['unserved']))
+        # only the battery load stores energy
+        self.assertGreater(arrays['charge'][:, 1].sum(), 0)
+        self.assertEqual(arrays['charge'][:, [0, 2, 3]].sum(), 0)
+        self.assertEqual(arrays['soc'][:, 1].max(), 1)
+
+    def test_results_not_run(self):
+        """Test results() before the context is run."""
+        with self.assertRaises(ValueError):
+            export.results(Context())
+
+    def test_save_npz(self):
+        """Test saving to an NPZ file."""
+        filename = os.path.join(self.tmpdir.name, 'results.npz')
+        export.save(self.context, filename)
+        arrays = export.results(self.context)
+        with np.load(filename) as npz:
+            self.assertEqual(sorted(npz.files), sorted(arrays))
+            for key, value in arrays.items():
+                np.testing.assert_array_equal(npz[key], value)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow not installed')
+    def test_save_parquet(self):
+        """Test saving to a Parquet file."""
+        filename = os.path.join(self.tmpdir.name, 'results.parquet')
+        export.save(self.context, filename)
+        parquet = pyarrow.parquet.ParquetFile(filename)
+        # the same layout as a file written by a ParquetSink
+        self.assertEqual(parquet.schema_arrow.names,
+                         ['timestamp'] + export.columns(4))
+        table = parquet.read().to_pandas()
+        self.assertEqual(table['timestamp'][0], self.start)
+        self.assertEqual(len(table), 24 * 7)
+        np.testing.assert_array_equal(table[export.columns(4)[:4]].values,
+                                      self.context.generation.values)
+        generators_ = json.loads(parquet.schema_arrow.metadata[b'generators'])
+        self.assertEqual(generators_[3],
+                         {'label': 'CCGT', 'technology': 'CCGT',
+                          'polygon': 1, 'capacity': 20000.0})
+
+    def test_save_unknown(self):
+        """Test saving to an unsupported format."""
+        with self.assertRaises(ValueError):
+            export.save(self.context, 'results.xls')
+
+
+class TestSinks(unittest.TestCase):
+    """Tests for the result sinks."""
+
+    def setUp(self):
+        """Test harness setup."""
+        self.context = Context()
+        battery = storage.BatteryStorage(800)
+        cfg = configfile.get('generation', 'pv1axis-trace')
+        pv = generators.PV1Axis(31, 100000, cfg, 30)
+        self.context.generators = [pv,
+                                   generators.BatteryLoad(1, 400, battery),
+                                   generators.Battery(1, 400, 2, battery),
+                                   generators.CCGT(1, 2000)]
+        self.start = self.context.demand.index[0]
+        self.end = self.context.demand.index[24 * 10 - 1]
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Remove temporary files."""
+        self.tmpdir.cleanup()
+
+    def check(self, table):
+        """Check the streamed results match the whole-run results."""
+        # only the hourly totals are kept when streaming
+        self.assertEqual(self.context.generation.shape, (24 * 10, 1))
+        totals = self.context.generation[0].values
+        supplied = [sum(gen.series_power.values())
+                    for gen in self.context.generators]
+        sim.run(self.context, self.start, self.end)
+        arrays = export.results(self.context)
+        np.testing.assert_allclose(totals, arrays['power'].sum(axis=1))
+        np.testing.assert_allclose(supplied,
+                                   [sum(gen.series_power.values())
+                                    for gen in self.context.generators])
+        self.assertEqual(len(table), 24 * 10)
+        for quantity in export.GENERATOR_QUANTITIES:
+            columns = [f'{quantity}/{n}' for n in range(4)]
+            np.testing.assert_allclose(table[columns].values,
+                                       arrays[quantity])
+        np.testing.assert_allclose(table['demand'], arrays['demand'])
+        np.testing.assert_allclose(table['unserved'], arrays['unserved'],
+                                   atol=1e-6)
+        self.assertGreater(table['unserved'].sum(), 0)
+
+    def test_csv_sink(self):
+        """Test streaming to a CSV file in uneven chunks."""
+        filename = os.path.join(self.tmpdir.name, 'results.csv')
+        sink = export.CSVSink(filename)
+        sink.chunksize = 100
+        sim.run(self.context, self.start, self.end, sink=sink)
+        self.assertIsNone(sink.file)
+        table = pd.read_csv(filename, index_col='timestamp',
+                            parse_dates=True)
+        self.assertEqual(table.index[0], self.start)
+        # every hour has been folded out of the generator series
+        self.assertEqual(dict.__len__(self.context.generators[0]
+                                      .series_power), 0)
+        self.assertEqual(len(self.context.generators[0].series_power),
+                         24 * 10)
+        self.check(table)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow not installed')
+    def test_parquet_sink(self):
+        """Test streaming to a Parquet file."""
+        filename = os.path.join(self.tmpdir.name, 'results.parquet')
+        sim.run(self.context, self.start, self.end,
+                sink=export.ParquetSink(filename))
+        parquet = pyarrow.parquet.ParquetFile(filename)
+        # one row group per week
+        self.assertEqual(parquet.num_row_groups, 2)
+        table = parquet.read().to_pandas()
+        self.check(table)
+        generators_ = json.loads(parquet.schema_arrow.metadata[b'generators'])
+        self.assertEqual(generators_[0]['technology'], 'PV1Axis')
@@ -0,0 +1,116 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# pylint: disable=protected-access
+
+"""A testsuite for the fleet module."""
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from nemo import configfile, fleet, generators, scenarios, sim, storage
+from nemo.context import Context
+
+
+def battery_pair(capacity, shours, hours=None):
+    """Return a battery and its load sharing one storage."""
+    stg = storage.BatteryStorage(capacity * shours)
+    return [generators.Battery(24, capacity, shours, stg,
+                               discharge_hours=hours),
+            generators.BatteryLoad(24, capacity, stg, discharge_hours=hours)]
+
+
+class TestFleet(unittest.TestCase):
+    """Tests for the BatteryFleet class."""
+
+    def test_assemble(self):
+        """Test that runs of batteries are replaced by fleets."""
+        ccgt = generators.CCGT(1, 100)
+        pair1, pair2 = battery_pair(100, 2), battery_pair(100, 4)
+        extra = generators.Battery(24, 100, 2, pair1[0].battery)
+        # a single battery is not a fleet and pair1 shares its
+        # storage with a battery outside the run
+        gens = pair1 + [ccgt, extra]
+        self.assertEqual(fleet.assemble(gens, np.zeros((1, 4))),
+                         (gens, None, []))
+        gens = pair1 + [ccgt] + pair2
+        units, columns, fleets = fleet.assemble(gens, np.zeros((1, 5)))
+        self.assertEqual(len(fleets), 2)
+        self.assertEqual(units, [fleets[0], ccgt, fleets[1]])
+        self.assertEqual(columns, [None, 2, None])
+        self.assertEqual(fleets[1].columns, [3])
+        self.assertTrue(fleets[0].storage_p)
+
+    def test_step(self):
+        """Test discharging in merit order."""
+        gens = battery_pair(100, 2) + battery_pair(100, 1)
+        generation = np.zeros((24, 4))
+        batteries = fleet.BatteryFleet(gens, range(4), generation)
+        # not a discharge hour
+        self.assertEqual(batteries.step(12, 150), 150)
+        self.assertEqual(batteries.step(18, 150), 0)
+        np.testing.assert_array_equal(generation[18], [100, 0, 50, 0])
+        self.assertEqual(batteries.storage, [0, 0])
+        self.assertEqual(batteries.step(19, 150), 150)
+        batteries.finish()
+        self.assertEqual(gens[0].battery.storage, 0)
+        self.assertEqual(gens[0].runhours, 1)
+        self.assertEqual(gens[2].series_power[18], 50)
+
+    def test_store(self):
+        """Test charging in merit order until the fleet is full."""
+        gens = battery_pair(100, 2) + battery_pair(100, 1)
+        batteries = fleet.BatteryFleet(gens, range(4), np.zeros((24, 4)))
+        # not a charging hour
+        self.assertEqual(batteries.store(18, 100), 100)
+        self.assertAlmostEqual(batteries.store(12, 100), 0)
+        self.assertAlmostEqual(gens[1].series_charge[12], 100)
+        # the first load is at its charging limit for this hour, so
+        # the second is filled (at a round trip efficiency of 0.95)
+        self.assertAlmostEqual(batteries.store(12, 400), 400 - 50 / 0.95)
+        self.assertEqual(gens[3].series_soc[12], 1)
+        self.assertTrue(batteries._saturated)
+        self.assertEqual(batteries.store(12, 100), 100)
+
+    def test_run(self):
+        """Test that a simulation gives the same results with fleets."""
+        context = Context()
+        cfg = configfile.get('generation', 'pv1axis-trace')
+        batt1, load1 = scenarios._batterySet(24, 400, 2, 'first')
+        # two PV plants so that the batteries charge twice an hour
+        context.generators = [batt1, load1,
+                              generators.PV1Axis(31, 60000, cfg, 30),
+                              generators.PV1Axis(1, 20000, cfg, 0),
+                              generators.CCGT(1, 30000)] + \
+            battery_pair(300, 4) + battery_pair(200, 1, range(16, 22))
+        end = context.demand.index[24 * 14 - 1]
+        results = []
+        for fleets in [True, False]:
+            if fleets:
+                sim.run(context, endhour=end)
+            else:
+                with mock.patch.object(fleet, 'assemble',
+                                       lambda gens, *_: (gens, None, [])):
+                    sim.run(context, endhour=end)
+            gens = context.generators
+            result = [context.generation.values.copy(),
+                      context.spill.values.copy()]
+            result += [(dict(gen.series_power), gen.runhours,
+                        gen.battery.storage)
+                       for gen in gens if isinstance(gen, generators.Battery)]
+            result += [(dict(gen.series_charge), dict(gen.series_soc))
+                       for gen in gens
+                       if isinstance(gen, generators.BatteryLoad)]
+            results.append(result)
+        self.assertGreater(results[0][0][:, 0].sum(), 0)
+        self.assertGreater((results[0][1][:, 2:4] > 0).all(axis=1).sum(), 0)
+        self.assertGreater(len(results[0][-1][0]), 0)
+        np.testing.assert_array_equal(results[0][0], results[1][0])
+        np.testing.assert_array_equal(results[0][1], results[1][1])
+        self.assertEqual(results[0][2:], results[1][2:])
@@ -64,7 +64,7 @@ classlist = [generators.Battery, generators.BatteryLoad,
              generators.Geothermal_EGS, generators.Geothermal_HSA,
              generators.Hydro, generators.HydrogenGT, generators.OCGT,
              generators.PV, generators.PV1Axis,
-             generators.ParabolicTrough, generators.Patch,
+             generators.ParabolicTrough, generators.LazyPatch,
              generators.PumpedHydroPump,
              generators.PumpedHydroTurbine, generators.Storage,
              generators.TraceGenerator, generators.Wind,
@@ -133,6 +133,25 @@ class TestGenerators(unittest.TestCase):
             for hour in range(0, 10):
                 gen.step(hour, 20)
 
+    def test_step_all(self):
+        """Test step_all() method against step()."""
+        gen = generators.Generator(1, 0, 'label')
+        with self.assertRaises(NotImplementedError):
+            gen.step_all(np.zeros(10))
+        # demand both above and below the 100 MW capacity
+        demand = np.random.default_rng(0).uniform(0, 200, 100)
+        for gen in self.generators:
+            if not gen.vectorised_p:
+                continue
+            gen.reset()
+            expected = np.array([gen.step(hour, demand[hour])
+                                 for hour in range(100)])
+            series = gen.series_power.copy(), gen.series_spilled.copy()
+            gen.reset()
+            result = gen.step_all(demand)
+            np.testing.assert_array_equal(result, expected.T, str(gen))
+            self.assertEqual((gen.series_power, gen.series_spilled), series)
+
     def test_store(self):
         """Test store() method."""
         for gen in self.generators:
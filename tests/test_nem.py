@@ -8,7 +8,6 @@
 """A testsuite for the nem module."""
 
 import configparser
-import importlib
 import unittest
 
 import tcpserver
@@ -51,7 +50,7 @@ class TestDemandError(unittest.TestCase):
     def test_http_error(self):
         """Test fetching demand data from a dud server."""
         with self.assertRaisesRegex(ConnectionError, "HTTP 400"):
-            importlib.reload(nem)
+            nem.load_demand()
 
 
 class TestDemandTimeout(unittest.TestCase):
@@ -71,7 +70,7 @@ class TestDemandTimeout(unittest.TestCase):
     def test_timeout(self):
         """Test fetching demand data from a dud server."""
         with self.assertRaises(TimeoutError):
-            importlib.reload(nem)
+            nem.load_demand()
 
 
 class TestDemandNoSuchFile(unittest.TestCase):
@@ -89,4 +88,35 @@ class TestDemandNoSuchFile(unittest.TestCase):
     def test_timeout(self):
         """Test fetching demand data from a dud server."""
         with self.assertRaises(FileNotFoundError):
-            importlib.reload(nem)
+            nem.load_demand()
+
+
+class TestLoadDemand(unittest.TestCase):
+    """Test the demand loader."""
+
+    s1_base = 'data/1year/2020demand_S1_Base.csv'
+
+    def test_default(self):
+        """Test the configured demand trace is the default."""
+        trace = nem.load_demand()
+        self.assertEqual(trace.path,
+                         nem.configfile.get('demand', 'demand-trace'))
+        self.assertIs(nem.hourly_demand, trace.hourly_demand)
+        self.assertEqual(nem.startdate, trace.startdate)
+        with self.assertRaises(AttributeError):
+            _ = nem.nosuchattribute
+
+    def test_cache(self):
+        """Test traces are cached by path."""
+        trace = nem.load_demand(self.s1_base)
+        self.assertIs(nem.load_demand(self.s1_base), trace)
+        nem.clear_cache()
+        self.assertIsNot(nem.load_demand(self.s1_base), trace)
+
+    def test_year_first_dates(self):
+        """Test a trace with year/month/day dates."""
+        trace = nem.load_demand(self.s1_base)
+        self.assertEqual(str(trace.startdate), '2020-01-01 00:30:00')
+        self.assertEqual(len(trace.hourly_regional_demand), 8760)
+        self.assertEqual(trace.hourly_demand.shape, (8760, 43))
+        self.assertIn('S1_Base', repr(trace))
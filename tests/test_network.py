@@ -0,0 +1,252 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the network module."""
+
+import contextlib
+import io
+import unittest
+
+import numpy as np
+
+from nemo import configfile, generators, polygons, regions, sim, storage
+from nemo.context import Context
+from nemo.network import Network, RegionNetwork
+
+SIZE = polygons.NUMPOLYGONS + 1
+
+
+def demand(**kwargs):
+    """Return a demand vector with demand in the given polygons."""
+    result = np.zeros(polygons.NUMPOLYGONS)
+    for poly, value in kwargs.items():
+        result[int(poly[1:]) - 1] = value
+    return result
+
+
+class TestNetwork(unittest.TestCase):
+    """Tests for the Network class."""
+
+    def setUp(self):
+        """Build a chain of polygons 1 -> 2 -> 3."""
+        limits = np.zeros((SIZE, SIZE))
+        limits[1, 2] = 100
+        limits[2, 3] = 50
+        self.net = Network(limits)
+
+    def test_bad_limits(self):
+        """Test invalid limit matrices."""
+        with self.assertRaises(ValueError):
+            Network(np.zeros((3, 3)))
+        limits = np.zeros((SIZE, SIZE))
+        limits[1, 2] = -1
+        with self.assertRaises(ValueError):
+            Network(limits)
+
+    def test_existing_net(self):
+        """Test the existing network (with NaNs in row and column 0)."""
+        net = Network(polygons.existing_net)
+        self.assertIn((7, 4), net.links)
+        self.assertEqual(len(net.links), len(net.limits))
+
+    def test_uniform(self):
+        """Test a network with equal limits."""
+        net = Network.uniform(500)
+        self.assertTrue((net.limits == 500).all())
+        self.assertIn((1, 4), net.links)
+        self.assertIn((4, 1), net.links)
+
+    def test_local(self):
+        """Test that local demand is served first."""
+        self.net.begin(demand(p1=30, p2=40))
+        offered, _ = self.net.supply(1, 50)
+        self.assertEqual(offered, 50)
+        self.assertEqual(self.net.residual[1], 0)
+        self.assertEqual(self.net.residual[2], 20)
+        self.assertEqual(self.net.unmet, 20)
+
+    def test_limit(self):
+        """Test that transfers are capped by link limits."""
+        self.net.begin(demand(p3=200))
+        offered, _ = self.net.supply(1, 200)
+        self.assertEqual(offered, 50)
+        np.testing.assert_array_equal(self.net.flows(), [50, 50])
+
+    def test_isolated(self):
+        """Test that links are directional."""
+        self.net.begin(demand(p1=100))
+        offered, _ = self.net.supply(3, 100)
+        self.assertEqual(offered, 0)
+        self.assertEqual(self.net.unmet, 100)
+
+    def test_release(self):
+        """Test that releasing a reservation restores capacity."""
+        self.net.begin(demand(p2=30, p3=40))
+        offered, moves = self.net.supply(1, 70)
+        self.assertEqual(offered, 70)
+        self.net.release(moves, 50)
+        self.assertEqual(self.net.unmet, 50)
+        np.testing.assert_array_equal(self.net.flows(), [20, 0])
+        # the released capacity can be used by another generator
+        offered, _ = self.net.supply(1, 100)
+        self.assertEqual(offered, 50)
+
+    def test_transfer(self):
+        """Test transfers to storage."""
+        self.net.begin(demand())
+        self.assertEqual(self.net.transfer(2, 2, 500), (500, []))
+        offered, moves = self.net.transfer(1, 3, 500)
+        self.assertEqual(offered, 50)
+        self.assertEqual(self.net.unmet, 0)
+        self.net.release(moves, 50)
+        np.testing.assert_array_equal(self.net.flows(), [0, 0])
+
+
+class TestRegionNetwork(unittest.TestCase):
+    """Tests for the RegionNetwork class."""
+
+    def setUp(self):
+        """Use the default interconnectors."""
+        self.net = RegionNetwork()
+
+    def test_bad_limits(self):
+        """Test invalid interconnector limits."""
+        for limits in [{(regions.nsw, regions.nsw): 100},
+                       {(regions.nsw, regions.qld): -1},
+                       {(regions.nsw, 'QLD1'): 100}]:
+            with self.assertRaises(ValueError):
+                RegionNetwork(limits)
+
+    def test_begin(self):
+        """Test that demand is aggregated by region."""
+        self.net.begin(demand(p1=10, p17=20, p40=5))
+        self.assertEqual(self.net.residual[regions.qld], 30)
+        self.assertEqual(self.net.residual[regions.tas], 5)
+        self.assertEqual(self.net.unmet, 35)
+
+    def test_limit(self):
+        """Test that transfers are capped along the whole route."""
+        self.net.begin(demand(p1=100, p32=1000, p40=1000))
+        # from VIC, SA and TAS are one interconnector away and QLD
+        # is two
+        offered, moves = self.net.supply(37, 5000)
+        self.assertEqual(offered, 870 + 478 + 100)
+        self.net.release(moves, offered)
+        # from QLD, TAS is reached through NSW and VIC
+        offered, _ = self.net.supply(1, 100 + 300)
+        self.assertEqual(offered, 100 + 300)
+        self.assertEqual(self.net.residual[regions.tas], 1000)
+        offered, _ = self.net.supply(1, 5000)
+        self.assertEqual(offered, 1185 - 300)
+        flows = dict(zip(self.net.links, self.net.flows()))
+        self.assertEqual(flows[('QLD1', 'NSW1')], 1185)
+        self.assertEqual(flows[('NSW1', 'VIC1')], 1185)
+        self.assertEqual(flows[('VIC1', 'SA1')], 870)
+        self.assertEqual(flows[('VIC1', 'TAS1')], 1185 - 870)
+
+    def test_transfer(self):
+        """Test transfers to storage in other regions."""
+        self.net.begin(demand())
+        self.assertEqual(self.net.transfer(1, 17, 5000)[0], 5000)
+        offered, moves = self.net.transfer(40, 1, 5000)
+        self.assertEqual(offered, 594)
+        self.net.release(moves, offered)
+        self.assertEqual(self.net.flows().sum(), 0)
+
+    def test_spare(self):
+        """Test that spare() reserves no transfer capacity."""
+        self.net.begin(demand())
+        self.assertEqual(self.net.spare(1, 17, 5000), 5000)
+        self.assertEqual(self.net.spare(40, 1, 5000), 594)
+        self.assertEqual(self.net.flows().sum(), 0)
+        self.assertEqual(self.net.transfer(40, 1, 500)[0], 500)
+        self.assertEqual(self.net.spare(40, 1, 5000), 94)
+        self.assertTrue(self.net.linked_p(40))
+        isolated = RegionNetwork({(regions.nsw, regions.qld): 100})
+        self.assertTrue(isolated.linked_p(31))
+        self.assertFalse(isolated.linked_p(40))
+
+
+class TestDispatch(unittest.TestCase):
+    """Tests for network-constrained dispatch."""
+
+    def setUp(self):
+        """Test harness setup."""
+        self.context = Context()
+        self.context.generators = [generators.CCGT(1, 100000)]
+        self.start = self.context.demand.index[0]
+        self.end = self.context.demand.index[23]
+
+    def test_isolated(self):
+        """Test that an isolated generator only meets local demand."""
+        self.context.network = Network(np.zeros((SIZE, SIZE)))
+        sim.run(self.context, self.start, self.end)
+        np.testing.assert_allclose(self.context.generation[0],
+                                   self.context.demand[0][:24])
+        self.assertEqual(self.context.flows.shape, (24, 0))
+
+    def test_copper_plate(self):
+        """Test that unlimited links give the copper plate result."""
+        sim.run(self.context, self.start, self.end)
+        copper = self.context.generation.copy()
+        self.context.network = Network.uniform(1e9)
+        sim.run(self.context, self.start, self.end)
+        np.testing.assert_allclose(self.context.generation, copper)
+        self.assertEqual(len(self.context.unserved), 0)
+        flows = self.context.flows
+        self.assertEqual(list(flows.columns),
+                         self.context.network.links)
+        # all demand outside polygon 1 flows out of polygon 1
+        outflow = flows.loc[:, 1].sum(axis=1)
+        np.testing.assert_allclose(
+            outflow, self.context.demand.iloc[:24, 1:].sum(axis=1))
+
+    def test_prepass(self):
+        """Test that the pre-pass and fleets do not change the results."""
+        cfg = configfile.get('generation', 'pv1axis-trace')
+        battery1 = storage.BatteryStorage(800)
+        battery2 = storage.BatteryStorage(800)
+        self.context.generators = [
+            generators.PV1Axis(31, 50000, cfg, 30),
+            generators.PV1Axis(1, 20000, cfg, 0),
+            generators.BatteryLoad(1, 400, battery1),
+            generators.Battery(1, 400, 2, battery1),
+            generators.BatteryLoad(2, 400, battery2),
+            generators.Battery(2, 400, 2, battery2),
+            generators.CCGT(1, 20000)]
+        self.context.network = Network.uniform(500)
+        end = self.context.demand.index[24 * 7 - 1]
+        results = []
+        for verbose in [False, True]:
+            # verbose runs dispatch every generator in the hour loop
+            self.context.verbose = verbose
+            with contextlib.redirect_stdout(io.StringIO()):
+                sim.run(self.context, endhour=end)
+            results.append((self.context.generation.values.copy(),
+                            self.context.spill.values.copy(),
+                            self.context.flows.values.copy(),
+                            list(self.context.generators[2].series_soc
+                                 .values())))
+        # PV spills, some of which charges the batteries
+        self.assertGreater(results[0][1][:, 0].sum(), 0)
+        self.assertGreater(max(results[0][3]), 0)
+        for first, second in zip(*results):
+            np.testing.assert_allclose(first, second, atol=1e-6)
+
+    def test_regions(self):
+        """Test dispatch between regions."""
+        self.context.network = RegionNetwork()
+        sim.run(self.context, self.start, self.end)
+        flows = self.context.flows
+        self.assertTrue((flows[('QLD1', 'NSW1')] <= 1185 + 1e-6).all())
+        self.assertEqual(flows[('SA1', 'VIC1')].sum(), 0)
+        self.assertGreater(self.context.unserved.sum(), 0)
+
+        limits = {link: 1e9 for link in regions.interconnectors}
+        self.context.network = RegionNetwork(limits)
+        sim.run(self.context, self.start, self.end)
+        self.assertEqual(len(self.context.unserved), 0)
@@ -12,6 +12,7 @@
 import unittest
 
 import numpy as np
+import pandas as pd
 
 import nemo
 from nemo import generators, penalties, regions, storage
@@ -27,6 +28,8 @@ class Args:
     bioenergy_limit = 1e-6  # 1 MWh
     hydro_limit = 1e-6  # 1 MWh
     reserves = 50  # MW
+    max_unserved_events = 1  # per year
+    max_unserved_hours = 2
 
 
 args = Args()
@@ -49,6 +52,33 @@ class TestPenalties(unittest.TestCase):
         self.assertEqual(penalties.unserved(self.context, 0),
                          (pow(0.01, 3), reasons['unserved']))
 
+    def set_unserved(self):
+        """Set up two unserved energy events (of 3 h and 1 h) in a year."""
+        self.context.years = lambda: 1
+        hours = pd.to_datetime(['2020-01-01 01:00', '2020-01-01 02:00',
+                                '2020-01-01 03:00', '2020-01-02 00:00'])
+        self.context.unserved = pd.Series([1, 2, 3, 4], index=hours)
+
+    def test_unserved_events(self):
+        """Test unserved_events() function."""
+        self.set_unserved()
+        # the smallest event is the excess event
+        self.assertEqual(penalties.unserved_events(self.context, args),
+                         (pow(4, 3), reasons['unserved-events']))
+        self.context.years = lambda: 2
+        self.assertEqual(penalties.unserved_events(self.context, args),
+                         (0, 0))
+
+    def test_unserved_duration(self):
+        """Test unserved_duration() function."""
+        self.set_unserved()
+        # only the first event is longer than 2 hours
+        self.assertEqual(penalties.unserved_duration(self.context, args),
+                         (pow(6, 3), reasons['unserved-duration']))
+        self.context.unserved = pd.Series(dtype=float)
+        self.assertEqual(penalties.unserved_duration(self.context, args),
+                         (0, 0))
+
     def test_calculate_reserve(self):
         """Test _calculate_reserve() function."""
         self.context.generators[0].series_power = {n: 1 for n in range(1000)}
@@ -76,12 +106,10 @@ class TestPenalties(unittest.TestCase):
         self.context.generators[0].series_power = {n: 1 for n in range(1000)}
         self.context.generators[1].series_power = {n: 1 for n in range(1000)}
         # both generators are in NSW
-        self.assertEqual(
-            penalties._regional_generation(regions.nsw,
-                                           self.context.generators), 2000)
-        self.assertEqual(
-            penalties._regional_generation(regions.sa,
-                                           self.context.generators), 0)
+        generation = penalties._regional_generation(self.context)
+        self.assertEqual(generation[regions.nsw], 2000)
+        self.assertEqual(generation[regions.sa], 0)
+        self.assertEqual(generation.sum(), 2000)
 
     def test_regional_demand(self):
         """Test _regional_demand() function."""
@@ -0,0 +1,54 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the polygons module."""
+
+import unittest
+
+import numpy as np
+
+from nemo import polygons
+
+
+class TestPolygons(unittest.TestCase):
+    """Tests for the polygons module."""
+
+    def test_polygon_centroids(self):
+        """Test the centroids of a square and a triangle."""
+        square = ((0, 0), (2, 0), (2, 2), (0, 2), (0, 0))
+        triangle = ((0, 0), (3, 0), (0, 3), (0, 0))
+        np.testing.assert_allclose(
+            polygons.polygon_centroids([square, triangle]),
+            [[1, 1], [1, 1]])
+        centroid = polygons.polygon_centroids([triangle[::-1]])
+        np.testing.assert_allclose(centroid, [[1, 1]])
+
+    def test_distances(self):
+        """Test the distance matrix."""
+        dists = polygons.distances[1:, 1:]
+        self.assertEqual(dists.shape, (polygons.NUMPOLYGONS,) * 2)
+        self.assertTrue(np.isnan(polygons.distances[0]).all())
+        np.testing.assert_array_equal(dists, dists.T)
+        self.assertTrue((np.diag(dists) == 0).all())
+        self.assertEqual(polygons.dist(1, 43), 2910)
+        self.assertEqual(polygons.net[1][2], polygons.dist(1, 2))
+
+    def test_net(self):
+        """Test that each link in net is as long as it should be."""
+        self.assertEqual(polygons.net[24][31], polygons.dist(24, 31))
+        for p1, neighbours in polygons.net.items():
+            for p2, length in neighbours.items():
+                self.assertEqual(length, polygons.dist(p1, p2), (p1, p2))
+
+    def test_haversine(self):
+        """Test haversine() broadcasts like the distance matrix."""
+        points = polygons.centroid_array[1:]
+        self.assertAlmostEqual(polygons.haversine(points[0], points[42]),
+                               polygons.distances[1, 43], delta=1)
+        row = polygons.haversine(points[0], points)
+        np.testing.assert_array_equal(np.trunc(row),
+                                      polygons.distances[1, 1:])
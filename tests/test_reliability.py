@@ -0,0 +1,53 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the reliability module."""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from nemo import reliability
+
+
+class TestFindEvents(unittest.TestCase):
+    """Tests for the find_events() function."""
+
+    def test_no_events(self):
+        """Test an empty series."""
+        events = reliability.find_events(pd.Series(dtype=float))
+        self.assertEqual(len(events), 0)
+        self.assertEqual(events.max_duration(), 0)
+        self.assertEqual(events.energy.sum(), 0)
+
+    def test_events(self):
+        """Test a series with several events."""
+        rng = pd.date_range('2020-01-01', periods=10, freq='h')
+        # hours 0-2, 5 and 8-9
+        hours = rng[[0, 1, 2, 5, 8, 9]]
+        unserved = pd.Series([1, 5, 2, 7, 3, 4], index=hours)
+        events = reliability.find_events(unserved)
+        self.assertEqual(len(events), 3)
+        self.assertEqual(list(events.starts), list(rng[[0, 5, 8]]))
+        np.testing.assert_array_equal(events.durations, [3, 1, 2])
+        np.testing.assert_array_equal(events.peaks, [5, 7, 4])
+        np.testing.assert_array_equal(events.energy, [8, 7, 7])
+        self.assertEqual(events.max_duration(), 3)
+        self.assertEqual(repr(events), 'Events(3 events, 22.0 MWh unserved)')
+
+    def test_matches_groupby(self):
+        """Test against grouping by the offset from a date range."""
+        rng = pd.date_range('2020-01-01', periods=1000, freq='h')
+        rng = rng[np.random.default_rng(1).random(1000) < 0.3]
+        unserved = pd.Series(1.0, index=rng)
+        date_range = pd.date_range(rng[0], periods=len(rng), freq='h')
+        groups = unserved.groupby(rng - date_range)
+        events = reliability.find_events(unserved)
+        self.assertEqual(len(events), len(groups))
+        np.testing.assert_array_equal(events.durations,
+                                      groups.size().values)
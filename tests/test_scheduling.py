@@ -0,0 +1,77 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the scheduling module."""
+
+import unittest
+from multiprocessing.pool import Pool
+
+from nemo import generators, scheduling, storage, telemetry
+from nemo.polygons import WILDCARD
+
+
+def square(value):
+    """Square a number."""
+    with telemetry.timer('sim'):
+        return value * value
+
+
+class TestScheduler(unittest.TestCase):
+    """Tests for the Scheduler class."""
+
+    def setUp(self):
+        """Start a pool."""
+        self.pool = Pool(2)  # pylint: disable=consider-using-with
+        self.reports = []
+
+    def tearDown(self):
+        """Shut down the pool."""
+        self.pool.close()
+        self.pool.join()
+
+    def test_map(self):
+        """Test map() preserves order."""
+        sched = scheduling.Scheduler(self.pool, 2, chunksize=3,
+                                     key=lambda x: x % 4,
+                                     report=self.reports.append)
+        self.assertEqual(sched.map(square, range(10)),
+                         [n * n for n in range(10)])
+        self.assertEqual(len(self.reports), 1)
+        stats = self.reports[0]
+        self.assertEqual(len(stats.durations), 10)
+        self.assertTrue(0 <= stats.utilisation() <= 1)
+        self.assertIn('of 2 workers', str(stats))
+        self.assertEqual(len(stats.timings), 10)
+        self.assertTrue(all('sim' in phases for phases in stats.timings))
+        self.assertTrue(all(rss > 0 for rss in stats.rss.values()))
+
+    def test_map_empty(self):
+        """Test map() with nothing to do."""
+        sched = scheduling.Scheduler(self.pool, 2)
+        self.assertEqual(sched.map(square, []), [])
+        self.assertEqual(str(sched.history[0]), 'utilisation: no tasks')
+
+    def test_order(self):
+        """Test expensive items are dispatched first."""
+        sched = scheduling.Scheduler(self.pool, 2, key=lambda x: x)
+        self.assertEqual(sched.order([1, 3, 2]), [1, 2, 0])
+        sched = scheduling.Scheduler(self.pool, 2)
+        self.assertEqual(sched.order([1, 3, 2]), [0, 1, 2])
+
+
+class TestStorageKey(unittest.TestCase):
+    """Tests for the storage_key() function."""
+
+    def test_storage_key(self):
+        """Test only storage capacity is counted."""
+        battery = storage.BatteryStorage(800)
+        gens = [generators.CCGT(WILDCARD, 100),
+                generators.Battery(WILDCARD, 400, 2, battery),
+                generators.BatteryLoad(WILDCARD, 400, battery)]
+        key = scheduling.storage_key(gens)
+        self.assertEqual(key([10, 2, 3]), 5)
+        self.assertEqual(key([10, -1, 3]), 3)
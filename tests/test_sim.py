@@ -9,12 +9,14 @@
 
 """A testsuite for the sim module."""
 
+import os
+import tempfile
 import unittest
 
 import numpy as np
 import pandas as pd
 
-from nemo import configfile, generators, sim, storage
+from nemo import configfile, generators, profiling, sim, storage
 from nemo.context import Context
 
 
@@ -39,7 +41,7 @@ class TestSim(unittest.TestCase):
         """Test _dispatch() function."""
         self.context.verbose = True
         sim._dispatch(self.context, 0, 10000, self.context.generators,
-                      self.generation, self.spill)
+                      self.generation[0], self.spill[0])
         self.assertEqual(self.spill.sum(), 0)
 
     def test_dispatch_pv(self):
@@ -53,12 +55,13 @@ class TestSim(unittest.TestCase):
         self.spill = np.zeros((len(self.date_range),
                                len(self.context.generators)))
         sim._dispatch(self.context, 0, 10000, self.context.generators,
-                      self.generation, self.spill)
+                      self.generation[0], self.spill[0])
         self.assertEqual(self.spill.sum(), 0)
 
     def test_store_spills(self):
         """Test _store_spills()."""
-        self.context = type('context', (), {'verbose': 0, 'storages': None})
+        self.context = type('context', (), {'verbose': 0, 'storages': None,
+                                            'profile': None, 'network': None})
         self.context.verbose = True
         hydro = generators.Hydro(1, 100)
         h2store = storage.HydrogenStorage(400)
@@ -105,3 +108,80 @@ class TestSim(unittest.TestCase):
     def test_run_2(self):
         """Test run() normally."""
         sim.run(self.context)
+
+    def test_run_profile(self):
+        """Test run() with profiling enabled."""
+        h2store = storage.HydrogenStorage(400)
+        electrolyser = generators.Electrolyser(h2store, 1, 100,
+                                               efficiency=1.0)
+        cfg = configfile.get('generation', 'pv1axis-trace')
+        pv = generators.PV1Axis(31, 100000, cfg, 30)
+        self.context.generators = [pv, electrolyser]
+        self.context.profile = profiling.Profile()
+        sim.run(self.context)
+        profile = self.context.profile
+        self.assertEqual(profile.runs, 1)
+        self.assertEqual(sorted(profile.phases),
+                         ['dataframes', 'hour loop', 'prepass', 'setup',
+                          'store spills', 'unserved'])
+        timesteps = self.context.timesteps()
+        self.assertEqual(profile.calls['step_all', 'PV1Axis'][1], 1)
+        self.assertEqual(profile.calls['step', 'Electrolyser'][1], timesteps)
+        self.assertGreater(profile.calls['store', 'Electrolyser'][1], 0)
+        self.context.verbose = True
+        self.assertIn('step_all PV1Axis:', str(self.context))
+        profile.reset()
+        self.assertEqual((profile.runs, profile.phases, profile.calls),
+                         (0, {}, {}))
+
+    def test_run_prepass(self):
+        """Test that the pre-pass does not change the results."""
+        battery = storage.BatteryStorage(800)
+        cfg = configfile.get('generation', 'pv1axis-trace')
+        pv = generators.PV1Axis(31, 50000, cfg, 30)
+        cst = generators.CentralReceiver(31, 2000, 2.5, 8, cfg, 30)
+        self.context.generators = [pv, cst,
+                                   generators.BatteryLoad(1, 400, battery),
+                                   generators.Battery(1, 400, 2, battery),
+                                   generators.CCGT(1, 20000)]
+        self.context.nsp_limit = 0.7
+        end = self.context.demand.index[24 * 7 - 1]
+        results = []
+        for vectorised in [True, False]:
+            pv.vectorised_p = cst.vectorised_p = vectorised
+            sim.run(self.context, endhour=end)
+            results.append((self.context.generation.values.copy(),
+                            self.context.spill.values.copy(),
+                            dict(self.context.generators[2].series_soc),
+                            cst.stored))
+        # PV spills, some of which charges the battery
+        self.assertGreater(results[0][1][:, 0].sum(), 0)
+        self.assertGreater(max(results[0][2].values()), 0)
+        for first, second in zip(*results):
+            np.testing.assert_array_equal(first, second)
+
+    def test_run_scratch(self):
+        """Test run() with memory-mapped result matrices."""
+        battery = storage.BatteryStorage(800)
+        cfg = configfile.get('generation', 'pv1axis-trace')
+        pv = generators.PV1Axis(31, 100000, cfg, 30)
+        self.context.generators = [pv,
+                                   generators.BatteryLoad(1, 400, battery),
+                                   generators.Battery(1, 400, 2, battery)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.context.scratch = os.path.join(tmpdir, 'run')
+            end = self.context.demand.index[24 * 7 - 1]
+            sim.run(self.context, endhour=end)
+            generation = self.context.generation
+            mapped = np.load(os.path.join(tmpdir, 'run', 'generation.npy'),
+                             mmap_mode='r')
+            np.testing.assert_array_equal(generation.values, mapped)
+            soc = np.load(os.path.join(tmpdir, 'run', 'soc.npy'))
+            self.assertEqual(soc.shape, (24 * 7, 3))
+            self.assertEqual(soc[:, 1].max(), 1)
+            # a second run must not disturb the first run's results
+            first = generation.values.copy()
+            self.context.generators[0].set_capacity(0)
+            sim.run(self.context, endhour=end)
+            np.testing.assert_array_equal(generation.values, first)
+            self.assertEqual(self.context.generation.values[:, 0].sum(), 0)
@@ -0,0 +1,72 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the sweep module."""
+
+import copy
+import os
+import tempfile
+import unittest
+
+from nemo import sweep
+
+TRACES = ['data/1year/2020demand_S1_Base.csv',
+          'data/1year/2020demand_S2_Elec.csv']
+
+
+class TestSweep(unittest.TestCase):
+    """Tests for the sweep module."""
+
+    def setUp(self):
+        """Test harness setup."""
+        self.bundle = {'options': {'carbon_price': 0,
+                                   'ccs_storage_costs': 27,
+                                   'gas_price': 11, 'coal_price': 2,
+                                   'costs': 'Null', 'discount_rate': 0.05,
+                                   'supply_scenario': '__one_ccgt__',
+                                   'nsp_limit': 0.75,
+                                   'min_regional_generation': 0},
+                       'parameters': [30]}
+
+    def test_make_context(self):
+        """Test make_context() function."""
+        context = sweep.make_context(self.bundle, TRACES[0])
+        self.assertEqual(context.generators[0].capacity, 30000)
+        self.assertEqual(context.demand_trace.path, TRACES[0])
+
+    def test_make_context_errors(self):
+        """Test make_context() with bad bundles."""
+        for key, value, msg in [('supply_scenario', 'noexist', 'scenario'),
+                                ('costs', 'noexist', 'cost class')]:
+            bundle = copy.deepcopy(self.bundle)
+            bundle['options'][key] = value
+            with self.assertRaisesRegex(ValueError, msg):
+                sweep.make_context(bundle)
+        self.bundle['parameters'] = [1, 2]
+        with self.assertRaisesRegex(ValueError, 'expects 1 parameters'):
+            sweep.make_context(self.bundle)
+
+    def test_sweep(self):
+        """Test sweep() function."""
+        table = sweep.sweep(self.bundle, TRACES, processes=2)
+        self.assertEqual(list(table.index), ['2020demand_S1_Base.csv',
+                                             '2020demand_S2_Elec.csv'])
+        self.assertEqual(list(table.columns),
+                         ['demand (TWh)', 'cost ($/MWh)', 'unserved (%)',
+                          'unserved (MWh)', 'surplus (TWh)'])
+        demand = table['demand (TWh)']
+        self.assertLess(demand.iloc[0], demand.iloc[1])
+        self.assertTrue((table['unserved (%)'] > 0).all())
+
+    def test_sweep_plots(self):
+        """Test sweep() saving plots."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            plot_dir = os.path.join(tmpdir, 'plots')
+            sweep.sweep(self.bundle, TRACES, processes=2, plot_dir=plot_dir)
+            self.assertEqual(sorted(os.listdir(plot_dir)),
+                             ['2020demand_S1_Base.png',
+                              '2020demand_S2_Elec.png'])
@@ -0,0 +1,75 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the telemetry module."""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from nemo import scheduling, telemetry
+
+
+class TestTelemetry(unittest.TestCase):
+    """Tests for the telemetry module."""
+
+    def setUp(self):
+        """Test harness setup."""
+        telemetry.collect()
+
+    def test_timer(self):
+        """Test timer() accumulates and collect() resets."""
+        with telemetry.timer('sim'):
+            pass
+        with telemetry.timer('sim'):
+            pass
+        timings = telemetry.collect()
+        self.assertEqual(list(timings), ['sim'])
+        self.assertGreaterEqual(timings['sim'], 0)
+        self.assertEqual(telemetry.collect(), {})
+
+    def test_max_rss(self):
+        """Test max_rss() function."""
+        self.assertGreater(telemetry.max_rss(), 2**20)
+        usage = mock.Mock(ru_maxrss=2**30)
+        with mock.patch.object(telemetry.resource, 'getrusage',
+                               return_value=usage):
+            # macOS reports bytes, Linux reports kilobytes
+            with mock.patch.object(telemetry.sys, 'platform', 'darwin'):
+                self.assertEqual(telemetry.max_rss(), 2**30)
+            with mock.patch.object(telemetry.sys, 'platform', 'linux'):
+                self.assertEqual(telemetry.max_rss(), 2**40)
+
+    def test_generation_log(self):
+        """Test GenerationLog class."""
+        stats = scheduling.Utilisation(2.0, [1.0, 1.0], {1: 1.5, 2: 0.5}, 2,
+                                       [{'sim': 0.5, 'cost': 0.1},
+                                        {'sim': 0.7, 'penalties': 0.2}],
+                                       {1: 2**20, 2: 2**21})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'log.jsonl')
+            log = telemetry.GenerationLog(filename)
+            log.record(stats)
+            log.record(stats)
+            with open(filename, encoding='utf-8') as logfile:
+                records = [json.loads(line) for line in logfile]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1]['gen'], 1)
+        self.assertEqual(records[0]['evals_per_sec'], 1)
+        self.assertAlmostEqual(records[0]['sim_mean'], 0.6)
+        self.assertEqual(records[0]['sim_max'], 0.7)
+        self.assertEqual(records[0]['idle'], 0.5)
+        self.assertEqual(records[0]['worker_rss'], 2**21)
+        summary = log.summary()
+        self.assertIn('2 generations, 4 evaluations', summary)
+        self.assertIn('pool idle 50%, peak worker RSS 2 MiB', summary)
+
+    def test_empty_log(self):
+        """Test GenerationLog with no generations."""
+        self.assertIn('no generations', telemetry.GenerationLog().summary())
@@ -0,0 +1,149 @@
+# Copyright (C) 2024 Ben Elliston
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+"""A testsuite for the topology module."""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import nemo
+from nemo import (generators, network, polygons, regions, scenarios,
+                  topology)
+
+# A synthetic grid of 5 regions, each a row of 100 square zones.
+NUMREGIONS, ROWLENGTH = 5, 100
+
+
+def grid():
+    """Return the topology of the synthetic grid."""
+    numpolygons = NUMREGIONS * ROWLENGTH
+    square = np.array([(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]) * 0.1
+    origins = np.array([(100 + 0.1 * (poly % ROWLENGTH),
+                         -30 - 0.1 * (poly // ROWLENGTH))
+                        for poly in range(numpolygons)])
+    vertices = (origins[:, np.newaxis] + square).reshape(-1, 2)
+    # link neighbours along each row
+    first = np.array([poly for poly in range(1, numpolygons + 1)
+                      if poly % ROWLENGTH != 0])
+    links = np.concatenate([np.column_stack([first, first + 1]),
+                            np.column_stack([first + 1, first])])
+    return topology.Topology([f'Z{n}' for n in range(NUMREGIONS)],
+                             np.repeat(np.arange(NUMREGIONS), ROWLENGTH),
+                             np.full(numpolygons, 1 / ROWLENGTH),
+                             vertices, np.arange(numpolygons + 1) * 5,
+                             limits={'wind': np.ones(numpolygons)},
+                             links=links,
+                             link_limits=np.full(len(links), 100),
+                             wildcard=numpolygons)
+
+
+class TestTopology(unittest.TestCase):
+    """Tests for the topology module."""
+
+    def setUp(self):
+        """Save the installed topology."""
+        self.saved = topology.current()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Restore the installed topology."""
+        topology.install(self.saved)
+        self.tmpdir.cleanup()
+
+    def test_current(self):
+        """Test the built-in topology."""
+        self.assertEqual(self.saved.numpolygons, polygons.NUMPOLYGONS)
+        self.assertEqual(self.saved.region_ids[self.saved.polygon_region[0]],
+                         'QLD1')
+        self.assertEqual(self.saved.limits['offshore_wind'][30], 10)
+
+    def test_save_load(self):
+        """Test saving and loading in both formats."""
+        expected = self.saved.arrays()
+        for suffix in ['npz', 'json']:
+            filename = os.path.join(self.tmpdir.name, f'nem.{suffix}')
+            topology.save(self.saved, filename)
+            arrays = topology.load(filename).arrays()
+            self.assertEqual(sorted(arrays), sorted(expected))
+            for key, value in expected.items():
+                np.testing.assert_array_equal(arrays[key], value, key)
+        with self.assertRaises(ValueError):
+            topology.save(self.saved, 'nem.xml')
+        with self.assertRaises(ValueError):
+            topology.load('nem.xml')
+
+    def test_install_nem(self):
+        """Test that installing the built-in topology changes nothing."""
+        distances = polygons.distances.copy()
+        net = polygons.net
+        topology.install(self.saved)
+        np.testing.assert_array_equal(polygons.distances, distances)
+        self.assertEqual(polygons.net, net)
+        self.assertIs(polygons.region(1), regions.qld)
+        self.assertIn(regions.nsw, regions.All)
+        self.assertEqual(len(regions.interconnectors), 8)
+
+    def test_validation(self):
+        """Test inconsistent topologies."""
+        arrays = grid().arrays()
+        for key, value in [('polygon_region', np.full(500, NUMREGIONS)),
+                           ('weights', np.full(500, 0.5)),
+                           ('vertex_offsets', np.arange(501) * 4),
+                           ('wind_limit', -np.ones(500)),
+                           ('links', [[1, 1]]),
+                           ('links', [[1, 2], [1, 2]]),
+                           ('link_limits', [1]),
+                           ('wildcard', 501)]:
+            bad = dict(arrays)
+            bad[key] = value
+            if key == 'links':
+                bad['link_limits'] = np.zeros(len(value))
+            with self.assertRaises(ValueError, msg=key):
+                topology._from_arrays(bad)
+        del arrays['weights']
+        with self.assertRaises(ValueError):
+            topology._from_arrays(arrays)
+
+    def test_large_grid(self):
+        """Test simulating a grid of 500 zones."""
+        filename = os.path.join(self.tmpdir.name, 'grid.npz')
+        topology.save(grid(), filename)
+        topology.install(topology.load(filename))
+        self.assertEqual(polygons.NUMPOLYGONS, 500)
+        self.assertEqual(regions.NUMREGIONS, NUMREGIONS)
+        self.assertEqual(repr(polygons.region(500)), 'Z4')
+        self.assertEqual(polygons.wind_limit[500], 1)
+        self.assertEqual(polygons.dist(1, 2), 9)
+
+        # one day of half-hourly demand of 1 GW in each region
+        times = pd.date_range('2020-01-01 00:30', periods=48, freq='30min')
+        demand = pd.DataFrame({'Date': times.strftime('%Y/%m/%d'),
+                               'Time': times.strftime('%H:%M:%S')})
+        for rgn in regions.All:
+            demand[rgn.id] = 1000
+        path = os.path.join(self.tmpdir.name, 'demand.csv')
+        demand.to_csv(path, index=False)
+        context = nemo.Context(demand=path)
+        self.assertEqual(context.demand.shape, (24, 500))
+        self.assertEqual(context.generator_region.tolist(), [4, 4])
+        nemo.run(context)
+        self.assertEqual(len(context.unserved), 0)
+
+        # scenarios place plant in the installed wildcard polygon
+        scenarios.ccgt(context)
+        self.assertEqual(context.generators[0].polygon, 500)
+
+        # with limited links, the gas plant in the last zone can only
+        # serve its own zone and the zone before it
+        context.generators = [generators.CCGT(500, 5000)]
+        context.network = network.Network(polygons.existing_net)
+        nemo.run(context)
+        np.testing.assert_allclose(context.generation[0], 10 + 100)
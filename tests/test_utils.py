@@ -11,12 +11,16 @@
 # pylint: disable=protected-access
 
 import os
+import subprocess
+import sys
+import tempfile
 import unittest
 from datetime import timedelta
 
 import pytest
 
-from nemo import context, scenarios, sim, utils
+from nemo import (context, generators, polygons, regions, scenarios, sim,
+                  utils)
 
 
 class TestUtils(unittest.TestCase):
@@ -89,3 +93,121 @@ class TestUtils(unittest.TestCase):
         utils.plot(self.context, filename=fname)
         self.assertTrue(self.exists(fname))
         os.unlink(fname)
+
+    def test_plot_resample(self):
+        """Test plotting a whole run with resampling."""
+        fname = 'test_plot_resample.png'
+        for resample in ['minmax', 'W']:
+            self.unlink(fname)
+            utils.plot(self.context, filename=fname, resample=resample)
+            self.assertTrue(self.exists(fname))
+            os.unlink(fname)
+
+    def test_plot_no_leak(self):
+        """Test plot() to a file leaves no pyplot figures behind."""
+        fname = 'test_plot_leak.png'
+        figures = utils.plt.get_fignums()
+        utils.plot(self.context, filename=fname)
+        self.assertEqual(utils.plt.get_fignums(), figures)
+        os.unlink(fname)
+
+    def test_renderer(self):
+        """Test rendering several plots on one figure."""
+        start = self.context.demand.index[0]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.Renderer() as renderer:
+                fig = renderer.fig
+                for week in range(2):
+                    xlim = (start + timedelta(days=7 * week),
+                            start + timedelta(days=7 * (week + 1)))
+                    renderer.render(self.context,
+                                    os.path.join(tmpdir, f'{week}.png'),
+                                    xlim=xlim)
+                    self.assertIs(renderer.fig, fig)
+                    self.assertEqual(fig.axes, [])
+            self.assertIsNone(renderer.fig)
+            self.assertEqual(sorted(os.listdir(tmpdir)), ['0.png', '1.png'])
+
+    def test_render_batch(self):
+        """Test rendering time windows in a pool of workers."""
+        start = self.context.demand.index[0]
+        self.assertEqual(utils.render_batch([]), [])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            items = [(self.context, os.path.join(tmpdir, f'{month}.png'),
+                      (start + timedelta(days=30 * month),
+                       start + timedelta(days=30 * (month + 1))))
+                     for month in range(3)]
+            filenames = utils.render_batch(items, processes=2, spills=True)
+            self.assertEqual(filenames, [item[1] for item in items])
+            self.assertTrue(all(self.exists(name) for name in filenames))
+
+    def test_generator_columns(self):
+        """Test _generator_columns() skips idle and out of region plant."""
+        idle = generators.CCGT(polygons.WILDCARD, 0)
+        ocgt = generators.OCGT(40, 100)  # in SA
+        ccgt = generators.CCGT(polygons.WILDCARD, 100)
+        self.context.generators = [ocgt, idle, ccgt]
+        self.context.regions = [regions.nsw]
+        # results only have columns for generators in NSW
+        self.assertEqual(utils._generator_columns(self.context),
+                         ([ccgt], [1]))
+        self.assertEqual(utils._generator_list(self.context), [ccgt])
+
+    def test_plot_data(self):
+        """Test _plot_data() function."""
+        start = self.context.demand.index[0]
+        end = start + timedelta(days=7)
+        data = utils._plot_data(self.context, (start, end), None)
+        self.assertEqual(len(data['demand']), 7 * 24 + 1)
+        self.assertEqual(data['generation'].shape,
+                         (7 * 24 + 1, len(self.context.generators)))
+        data = utils._plot_data(self.context, (start, end), 'D')
+        self.assertEqual(len(data['spill']), 8)
+        # peak demand survives decimation
+        data = utils._plot_data(self.context, None, 'minmax')
+        self.assertLess(len(data['demand']), self.context.timesteps())
+        self.assertEqual(data['demand'].max(),
+                         self.context.demand.sum(axis=1).max())
+
+    def test_hourly_series(self):
+        """Test HourlySeries keeps the sum and count of folded hours."""
+        series = utils.HourlySeries()
+        series.update({0: 1, 1: 2})
+        series.fold()
+        series[2] = 4
+        self.assertEqual((sum(series.values()), len(series)), (7, 3))
+        self.assertNotIn(0, series)
+        series.clear()
+        self.assertEqual((sum(series.values()), len(series)), (0, 0))
+
+
+class TestLazyImports(unittest.TestCase):
+    """Test that plotting and HTTP support are imported on demand."""
+
+    def test_import_nemo(self):
+        """Test that importing nemo does not import the heavy modules."""
+        code = 'import sys, nemo; ' + \
+            'print(*sorted(set(sys.modules) & ' + \
+            '{"matplotlib", "pint", "requests"}))'
+        result = subprocess.run([sys.executable, '-c', code], check=True,
+                                capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_lazy_patch(self):
+        """Test LazyPatch class."""
+        # pylint: disable=too-few-public-methods
+        class Dummy:
+            """A class with a lazy patch."""
+
+            patch = utils.LazyPatch(facecolor='red')
+
+        self.assertEqual(Dummy.patch.get_fc(), (1, 0, 0, 1))
+        self.assertIs(Dummy().patch, Dummy.patch)
+
+    def test_ureg(self):
+        """Test the unit registry is created on demand."""
+        self.assertIs(utils.ureg, utils.ureg)
+        self.assertEqual(str((1500 * utils.ureg.MW).to_compact()),
+                         '1.50 GW')
+        with self.assertRaises(AttributeError):
+            _ = utils.nosuchattribute